@@ -44,6 +44,24 @@ using UnityEngine;
                     }
                 }
             }
+
+            private JSONObject agent_state(GameObject go, Vector3 velocity, Vector3 angular_velocity)
+            {
+                var tr = go.transform ;
+                var _transform = new JSONObject();
+                _transform.Add("position", tr.position);
+                _transform.Add("rotation", tr.rotation.eulerAngles);
+                var state = new JSONObject();
+                var uid = ApiManager.Instance.Agents.FirstOrDefault(item => item.Value == go).Key ;
+                if(uid != null)
+                    state.Add("agent_id", uid);
+                else
+                    state.Add("agent_id", null);
+                state.Add("transform", _transform);
+                state.Add("velocity", velocity);
+                state.Add("angular_velocity", angular_velocity);
+                return state ;
+            }
               
             public void update()
             {     
@@ -62,19 +80,14 @@ using UnityEngine;
                 }
 
                 check_active_npcs(ApiManager.Instance.Agents) ;                            
-                var ego_state = new JSONObject();
                 var npcs_state = new JSONArray();
-                var ego_tr = ego_go.transform ; 
-                var rb = ego_go.GetComponent<Rigidbody>(); 
-                var _transform = new JSONObject();
-                _transform.Add("position", ego_tr.position);
-                _transform.Add("rotation", ego_tr.rotation.eulerAngles);
-                var ego_uid = ApiManager.Instance.Agents.FirstOrDefault(item => item.Value == ego_go).Key ;
-                if(ego_uid != null)
-                    ego_state.Add("agent_id", ego_uid); 
-                ego_state.Add("transform", _transform);
-                ego_state.Add("velocity", rb.velocity);
-                ego_state.Add("angular_velocity", rb.angularVelocity);
+                // every ego vehicle, the first one is also sent as ego_state
+                var egos_state = new JSONArray();
+                foreach(var ego in GameObject.FindGameObjectsWithTag("Player"))
+                {
+                    var rb = ego.GetComponent<Rigidbody>(); 
+                    egos_state.Add(agent_state(ego, rb.velocity, rb.angularVelocity));
+                }
                 List<GameObject> npcs_go = new List<GameObject>();
                 npcs_go = agents_go.Skip(1).ToList(); 
                 foreach(var npc in npcs_go)
@@ -112,7 +125,9 @@ using UnityEngine;
                     }
                     npcs_state.Add(state); 
                 }
-            //    EpisodeState.Add("ego_state", ego_state);
+                if(egos_state.Count > 0)
+                    EpisodeState.Add("ego_state", egos_state[0]);
+                EpisodeState.Add("egos_state", egos_state);
                 EpisodeState.Add("npcs_state", npcs_state);
                 var game_time = new JSONObject();
                 game_time.Add("current_time",  ApiManager.Instance.CurrentTime);
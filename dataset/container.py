@@ -0,0 +1,313 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Memory-mapped dataset container
+
+Instead of one small file per frame and modality, a container keeps one data
+file per modality (the KITTI sub directories: image_2, velodyne, label_2 and
+calib) with all frames appended back to back, and a fixed size index record per
+frame:
+
+    <path>/meta.json          modalities and their file extension
+    <path>/<modality>.dat     concatenated frame payloads
+    <path>/<modality>.idx     INDEX_DTYPE records (frame id, offset, length, sim time, seed)
+
+meta.json also lists the hashes of the sensor rigs the frames were calibrated
+with. Calibration payloads are identical for all frames of a rig and stored once.
+
+Payloads are the exact bytes of the corresponding KITTI files, so conversion in
+both directions is lossless. Both files are append only; a crash while writing
+leaves at most a partial record, which is dropped when the container is opened
+again. The reader memory maps everything and returns views into the maps.
+
+Usage: python -m dataset.container {pack,unpack} KITTI_PATH CONTAINER_PATH
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from lgsvl.sensor import decode_image
+
+INDEX_DTYPE = np.dtype([
+    ("idx", "<i8"),
+    ("offset", "<u8"),
+    ("length", "<u8"),
+    ("time", "<f8"),
+    ("seed", "<i8"),  # -1 if the frame was not generated from a seed
+])
+
+# KITTI sub directory of every modality, in the order frames are written
+MODALITIES = ("image_2", "velodyne", "label_2", "calib")
+
+META = "meta.json"
+
+# Modalities whose payload repeats across frames; identical payloads are stored once and shared by their index records
+SHARED = ("calib",)
+
+
+def _read_index(path):
+    if not os.path.exists(path):
+        return np.zeros(0, INDEX_DTYPE)
+    count = os.path.getsize(path) // INDEX_DTYPE.itemsize
+    return np.fromfile(path, INDEX_DTYPE, count)
+
+
+class ContainerWriter(object):
+    """
+    Appends frames to a container, creating it if needed. Frames already in the
+    container are kept, so generation can resume into the same container.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta = {"version": 1, "modalities": {}}
+        if os.path.exists(os.path.join(path, META)):
+            with open(os.path.join(path, META)) as f:
+                self.meta = json.load(f)
+        self._files = {}
+        self._shared = {}  # modality -> {sha1 of payload: (offset, length)}
+        self.frames = {}  # modality -> set of frame ids in the container
+        for modality in self.meta["modalities"]:
+            self._open(modality)
+
+    def _open(self, modality):
+        data_path = os.path.join(self.path, modality + ".dat")
+        index_path = os.path.join(self.path, modality + ".idx")
+        index = _read_index(index_path)
+        end = int((index["offset"] + index["length"]).max()) if len(index) else 0
+        # drop what a crash left behind after the last complete record
+        for path, size in ((index_path, len(index) * INDEX_DTYPE.itemsize), (data_path, end)):
+            with open(path, "ab") as f:
+                f.truncate(size)
+        self._files[modality] = (open(data_path, "ab"), open(index_path, "ab"), end)
+        self.frames[modality] = set(int(i) for i in index["idx"])
+        if modality in SHARED:
+            self._shared[modality] = {}
+            if end > 0:
+                data = np.memmap(data_path, np.uint8, mode="r", shape=(end,))
+                for offset, length in set(zip(index["offset"].tolist(), index["length"].tolist())):
+                    self._shared[modality][hashlib.sha1(data[offset:offset + length]).hexdigest()] = (offset, length)
+
+    def __contains__(self, idx):
+        return all(idx in frames for frames in self.frames.values()) and len(self.frames) > 0
+
+    def append(self, modality, idx, data, time=0.0, seed=None, ext=None):
+        """Appends the payload of one frame of a modality"""
+        if modality not in self._files:
+            self.meta["modalities"][modality] = {"ext": ext}
+            self._write_meta()
+            self._open(modality)
+        elif ext is not None and self.meta["modalities"][modality]["ext"] != ext:
+            raise ValueError("container stores {} as .{}, got .{}".format(modality, self.meta["modalities"][modality]["ext"], ext))
+
+        data_file, index_file, end = self._files[modality]
+        offset = None
+        if modality in self._shared:
+            key = hashlib.sha1(data).hexdigest()
+            offset, _ = self._shared[modality].get(key, (None, None))
+        if offset is None:
+            offset = end
+            data_file.write(data)
+            data_file.flush()
+            end += len(data)
+            if modality in self._shared:
+                self._shared[modality][key] = (offset, len(data))
+        record = np.array([(idx, offset, len(data), time, -1 if seed is None else seed)], dtype=INDEX_DTYPE)
+        index_file.write(record.tobytes())
+        index_file.flush()
+        self._files[modality] = (data_file, index_file, end)
+        self.frames[modality].add(idx)
+
+    def add(self, frame):
+        """Pipeline sink: appends frame.files (list of (KITTI relative path, bytes)), see pack_frame"""
+        if frame.rig_hash is not None and frame.rig_hash not in self.meta.setdefault("rigs", []):
+            self.meta["rigs"].append(frame.rig_hash)
+            self._write_meta()
+        for name, data in frame.files:
+            modality, filename = os.path.split(name)
+            ext = filename.rsplit(".", 1)[1]
+            if ext == "jpg" and modality in self.meta["modalities"] and self.meta["modalities"][modality]["ext"] != "jpg":
+                continue  # lossy copies are not stored
+            self.append(modality, frame.idx, data, frame.time, frame.seed, ext)
+        frame.files = None
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def close(self):
+        for data_file, index_file, _ in self._files.values():
+            data_file.close()
+            index_file.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ContainerReader(object):
+    """Random access to the frames of a container, payloads are views into memory maps"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        self.index = {}
+        self.data = {}
+        self._order = {}
+        for modality in self.meta["modalities"]:
+            index = _read_index(os.path.join(path, modality + ".idx"))
+            self.index[modality] = index
+            self._order[modality] = np.argsort(index["idx"], kind="stable")
+            data_path = os.path.join(path, modality + ".dat")
+            size = os.path.getsize(data_path)
+            self.data[modality] = np.memmap(data_path, np.uint8, mode="r") if size > 0 else np.zeros(0, np.uint8)
+
+    @property
+    def modalities(self):
+        return list(self.meta["modalities"])
+
+    def ext(self, modality):
+        return self.meta["modalities"][modality]["ext"]
+
+    def frames(self, modality=None):
+        """Sorted frame ids present in a modality (in all modalities if None)"""
+        modalities = [modality] if modality else self.modalities
+        ids = [np.unique(self.index[m]["idx"]) for m in modalities]
+        if not ids:
+            return np.zeros(0, np.int64)
+        result = ids[0]
+        for other in ids[1:]:
+            result = np.intersect1d(result, other)
+        return result
+
+    def __len__(self):
+        return len(self.frames())
+
+    def record(self, modality, idx):
+        """Index record of a frame, the last one written if the frame was written twice"""
+        index, order = self.index[modality], self._order[modality]
+        ids = index["idx"][order]
+        pos = np.searchsorted(ids, idx, side="right") - 1
+        if pos < 0 or ids[pos] != idx:
+            raise KeyError("frame {} is not in {}".format(idx, modality))
+        return index[order[pos]]
+
+    def get(self, modality, idx):
+        """Payload of a frame as a uint8 view into the memory mapped data file"""
+        r = self.record(modality, idx)
+        return self.data[modality][int(r["offset"]):int(r["offset"] + r["length"])]
+
+    def velodyne(self, idx):
+        """(N, 4) float32 x, y, z, intensity view of a KITTI velodyne scan"""
+        return self.get("velodyne", idx).view(np.float32).reshape(-1, 4)
+
+    def image(self, idx, modality="image_2"):
+        """Camera image as (H, W, C) uint8 array; a view for .npy images, decoded otherwise"""
+        data = self.get(modality, idx)
+        if self.ext(modality) == "npy":
+            return _npy_view(data)
+        return decode_image(data.tobytes())
+
+    def labels(self, idx):
+        return self.get("label_2", idx).tobytes().decode("ascii").splitlines()
+
+    def calib(self, idx):
+        """Calibration of a frame as a dict of key -> float array"""
+        calib = {}
+        for line in self.get("calib", idx).tobytes().decode("ascii").splitlines():
+            if ":" in line:
+                key, values = line.split(":", 1)
+                calib[key] = np.array(values.split(), dtype=np.float64)
+        return calib
+
+
+def _npy_view(data):
+    header = io.BytesIO(data[:4096].tobytes())
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(header)
+    array = data[header.tell():].view(dtype)
+    return array.reshape(shape, order="F" if fortran else "C")
+
+
+# Packs a KITTI directory tree (and its manifest.jsonl, if any) into a container
+def from_kitti(kitti_path, container_path):
+    manifest = {}
+    manifest_path = os.path.join(kitti_path, "manifest.jsonl")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                manifest[entry["idx"]] = entry
+
+    count = 0
+    with ContainerWriter(container_path) as writer:
+        for modality in MODALITIES:
+            directory = os.path.join(kitti_path, modality)
+            if not os.path.isdir(directory):
+                continue
+            files = {}
+            for filename in sorted(os.listdir(directory)):
+                stem, _, ext = filename.partition(".")
+                if not stem.isdigit():
+                    continue
+                # keep the lossless image when a JPG copy exists next to it
+                if int(stem) not in files or files[int(stem)][1] == "jpg":
+                    files[int(stem)] = (filename, ext)
+            for idx, (filename, ext) in sorted(files.items()):
+                if idx in writer.frames.get(modality, ()):
+                    continue
+                with open(os.path.join(directory, filename), "rb") as f:
+                    data = f.read()
+                entry = manifest.get(idx, {})
+                writer.append(modality, idx, data, entry.get("time", 0.0), entry.get("seed"), ext)
+                count += 1
+    return count
+
+
+# Unpacks a container into a KITTI directory tree
+def to_kitti(container_path, kitti_path):
+    reader = ContainerReader(container_path)
+    count = 0
+    for modality in reader.modalities:
+        os.makedirs(os.path.join(kitti_path, modality), exist_ok=True)
+        for idx in reader.frames(modality):
+            filename = "{:06d}.{}".format(int(idx), reader.ext(modality))
+            with open(os.path.join(kitti_path, modality, filename), "wb") as f:
+                f.write(reader.get(modality, idx))
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between KITTI directory trees and dataset containers")
+    parser.add_argument("direction", choices=["pack", "unpack"], help="pack: KITTI tree to container, unpack: container to KITTI tree")
+    parser.add_argument("kitti_path")
+    parser.add_argument("container_path")
+    args = parser.parse_args()
+
+    if args.direction == "pack":
+        print("{} files packed".format(from_kitti(args.kitti_path, args.container_path)))
+    else:
+        print("{} files unpacked".format(to_kitti(args.container_path, args.kitti_path)))
@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Camera image encoders for dataset writers
+
+Images arrive from the simulator either raw ((H, W, 3) uint8 arrays) or already
+PNG encoded. Encoding happens in the frame stages, so it runs in the worker
+processes of the pipeline. PNG input is written as is when the output codec is
+PNG, anything else is decoded once and encoded directly into the output codec.
+"""
+
+import io
+import time
+
+import numpy as np
+
+from lgsvl.sensor import decode_image
+
+# codec -> file extension
+CODECS = {
+    "png": "png",
+    "webp": "webp",  # lossless WebP
+    "npy": "npy",  # raw array in NumPy format, no compression
+}
+
+PNG_SIGNATURE = b"\x89PNG"
+
+
+class ImageEncoder(object):
+    """
+    codec: "png", "webp" (lossless) or "npy"
+    compression: PNG zlib level (0-9) or WebP method (0-6), ignored for npy
+    jpg_quality: if set, a lossy JPG copy is encoded as well
+    """
+
+    def __init__(self, codec="png", compression=6, jpg_quality=None):
+        if codec not in CODECS:
+            raise ValueError("unsupported codec '{}', expected one of {}".format(codec, ", ".join(sorted(CODECS))))
+        self.codec = codec
+        self.compression = compression
+        self.jpg_quality = jpg_quality
+
+    @property
+    def ext(self):
+        return CODECS[self.codec]
+
+    def encode(self, image):
+        """
+        Encodes a raw array or PNG bytes, returns a list of (extension, bytes),
+        the lossless image first followed by the JPG copy if requested
+        """
+        if isinstance(image, bytes):
+            if self.codec == "png" and image.startswith(PNG_SIGNATURE) and self.jpg_quality is None:
+                return [(self.ext, image)]
+            image = decode_image(image)
+
+        images = [(self.ext, self.encode_array(image))]
+        if self.jpg_quality is not None:
+            images.append(("jpg", self.pil_encode(image, "JPEG", quality=self.jpg_quality)))
+        return images
+
+    def encode_array(self, image):
+        if self.codec == "npy":
+            out = io.BytesIO()
+            np.save(out, np.ascontiguousarray(image), allow_pickle=False)
+            return out.getvalue()
+        if self.codec == "webp":
+            return self.pil_encode(image, "WEBP", lossless=True, method=self.compression)
+        return self.pil_encode(image, "PNG", compress_level=self.compression)
+
+    @staticmethod
+    def pil_encode(image, fmt, **options):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError("PIL is required to encode images, use codec 'npy' instead")
+        out = io.BytesIO()
+        Image.fromarray(image).save(out, format=fmt, **options)
+        return out.getvalue()
+
+    def timed_encode(self, image):
+        """Returns encode's result and the seconds spent encoding"""
+        t0 = time.perf_counter()
+        images = self.encode(image)
+        return images, time.perf_counter() - t0
+
+
+class WriterStats(object):
+    """Bytes written and encode time of the frames a dataset writer produced"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes_written = 0
+        self.encode_time = 0.0
+
+    def add(self, frame):
+        self.frames += 1
+        self.bytes_written += frame.bytes_written
+        self.encode_time += frame.encode_time
+
+    def __repr__(self):
+        if self.frames == 0:
+            return "no frames written"
+        return "{} frames, {:.1f} MB written ({:.1f} kB/frame), encode {:.2f} ms/frame".format(
+            self.frames, self.bytes_written / 1e6, self.bytes_written / self.frames / 1e3,
+            self.encode_time / self.frames * 1e3)
@@ -0,0 +1,264 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Columnar ground truth export
+
+LabelExporter is a pipeline sink collecting the LABEL_DTYPE arrays computed by
+the convert stage and writing them in batches as parts of columnar tables:
+
+    <base>/labels/part-<first>-<last>.parquet   one row per object (needs pyarrow)
+    <base>/labels/part-<first>-<last>.npy       the same table as a NumPy structured array
+    <base>/labels/part-<first>-<last>.json      COCO style detection annotations
+
+where first and last are the frame ids in the part. Only objects visible in
+the image are exported (non empty 2D box, not fully truncated). Parts are
+written atomically, frames are passed on (for example to the manifest) only
+once the part containing them is on disk, so resumed runs never miss labels.
+Labels of frames that are generated again are removed from the existing parts
+first (discard_frames), so they are never exported twice.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from dataset.kitti import LABEL_DTYPE, KittiLayout
+
+FORMATS = ("parquet", "npy", "coco")
+
+# One row per object: frame id and simulation time followed by the label fields
+TABLE_DTYPE = np.dtype([("frame", "<i8"), ("time", "<f8")] + [(name, LABEL_DTYPE.fields[name][0]) for name in LABEL_DTYPE.names])
+
+
+def visible(labels):
+    """Mask of the LABEL_DTYPE rows with a non empty 2D box that are not fully truncated"""
+    bbox = labels["bbox"]
+    return (bbox[:, 2] > bbox[:, 0]) & (bbox[:, 3] > bbox[:, 1]) & (labels["truncated"] < 1)
+
+
+def label_table(frames):
+    """Concatenates the visible objects of (frame id, time, LABEL_DTYPE array) triples into one TABLE_DTYPE array"""
+    frames = [(idx, t, labels[visible(labels)]) for idx, t, labels in frames]
+    counts = [len(labels) for _, _, labels in frames]
+    table = np.zeros(sum(counts), dtype=TABLE_DTYPE)
+    if len(table) == 0:
+        return table
+    table["frame"] = np.repeat([idx for idx, _, _ in frames], counts)
+    table["time"] = np.repeat([t for _, t, _ in frames], counts)
+    labels = np.concatenate([labels for _, _, labels in frames])
+    for name in LABEL_DTYPE.names:
+        table[name] = labels[name]
+    return table
+
+
+def table_columns(table):
+    """Flat columns (vector fields split into scalars) of a TABLE_DTYPE array"""
+    columns = {
+        "frame": table["frame"],
+        "time": table["time"],
+        "type": table["type"].astype(str),
+        "truncated": table["truncated"],
+        "occluded": table["occluded"],
+        "alpha": table["alpha"],
+    }
+    for i, name in enumerate(("left", "top", "right", "bottom")):
+        columns["bbox_" + name] = table["bbox"][:, i]
+    for i, name in enumerate(("height", "width", "length")):
+        columns[name] = table["dimensions"][:, i]
+    for i, name in enumerate(("x", "y", "z")):
+        columns[name] = table["location"][:, i]
+    columns["rotation_y"] = table["rotation_y"]
+    return columns
+
+
+def write_parquet(path, table):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet export, use the 'npy' format instead")
+    columns = table_columns(table)
+    pyarrow.parquet.write_table(pyarrow.table({name: pyarrow.array(column) for name, column in columns.items()}), path)
+
+
+def coco_json(table, frames, image_ext, width, height):
+    """COCO detection dict of a TABLE_DTYPE array, frames are the (frame id, time) of all images"""
+    categories = sorted(set(table["type"].tolist()))
+    category_ids = {name: i + 1 for i, name in enumerate(categories)}
+
+    left, top, right, bottom = table["bbox"].astype(np.float64).T
+    boxes = np.stack([left, top, right - left, bottom - top], axis=1).round(2).tolist()
+    areas = ((right - left) * (bottom - top)).round(2).tolist()
+
+    images = [{"id": int(idx), "file_name": os.path.join("image_2", KittiLayout.filename(idx, image_ext)),
+        "width": width, "height": height, "time": float(t)} for idx, t in frames]
+    annotations = []
+    for i, row in enumerate(table):
+        annotations.append({
+            "id": i + 1,
+            "image_id": int(row["frame"]),
+            "category_id": category_ids[str(row["type"])],
+            "bbox": boxes[i],
+            "area": areas[i],
+            "iscrowd": 0,
+            # KITTI 3D fields
+            "truncated": round(float(row["truncated"]), 2),
+            "occluded": int(row["occluded"]),
+            "alpha": round(float(row["alpha"]), 2),
+            "dimensions": row["dimensions"].astype(np.float64).round(2).tolist(),
+            "location": row["location"].astype(np.float64).round(2).tolist(),
+            "rotation_y": round(float(row["rotation_y"]), 2),
+        })
+    return {
+        "images": images,
+        "annotations": annotations,
+        "categories": [{"id": category_ids[name], "name": name} for name in categories],
+    }
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class LabelExporter(object):
+    def __init__(self, base_path, calibration, formats=("npy", "coco"), image_ext="png", batch_size=256, on_flush=None):
+        """
+        formats: any of FORMATS
+        image_ext: extension of the images referenced from COCO annotations
+        batch_size: frames per part
+        on_flush: called with every frame once its part is written
+        """
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError("unsupported label format '{}', expected one of {}".format(fmt, ", ".join(FORMATS)))
+        self.path = os.path.join(base_path, "labels")
+        self.formats = formats
+        self.image_ext = image_ext
+        self.width = calibration.camera_intrinsics["image_width"]
+        self.height = calibration.camera_intrinsics["image_height"]
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self._frames = []
+        os.makedirs(self.path, exist_ok=True)
+
+    def add(self, frame):
+        """Pipeline sink"""
+        self._frames.append(frame)
+        if len(self._frames) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._frames:
+            return
+        frames = sorted(self._frames, key=lambda f: f.idx)
+        table = label_table([(f.idx, f.time, f.label_array) for f in frames])
+        part = os.path.join(self.path, "part-{:06d}-{:06d}".format(frames[0].idx, frames[-1].idx))
+
+        if "parquet" in self.formats:
+            _atomic_write(part + ".parquet", lambda path: write_parquet(path, table))
+        if "npy" in self.formats:
+            def save(path):
+                with open(path, "wb") as f:
+                    np.save(f, table, allow_pickle=False)
+            _atomic_write(part + ".npy", save)
+        if "coco" in self.formats:
+            coco = coco_json(table, [(f.idx, f.time) for f in frames], self.image_ext, self.width, self.height)
+            def dump(path):
+                with open(path, "w") as f:
+                    json.dump(coco, f)
+            _atomic_write(part + ".json", dump)
+
+        self._frames = []
+        for frame in frames:
+            frame.label_array = None
+            if self.on_flush is not None:
+                self.on_flush(frame)
+
+    def close(self):
+        self.flush()
+
+
+def _label_parts(base_path):
+    path = os.path.join(base_path, "labels")
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.startswith("part-") and not name.endswith(".tmp")]
+
+
+def _rewrite_part(path, keep, write):
+    """Rewrites a part with the rows selected by keep (a mask), removes it if none is left"""
+    if keep.all():
+        return
+    if keep.any():
+        _atomic_write(path, write)
+    else:
+        os.remove(path)
+
+
+def discard_frames(base_path, indices):
+    """Removes the labels of the given frames from the parts of a dataset, returns the number of parts changed"""
+    indices = np.asarray(sorted(indices), dtype=np.int64)
+    changed = 0
+    for path in _label_parts(base_path):
+        if path.endswith(".npy"):
+            table = np.load(path)
+            keep = ~np.isin(table["frame"], indices)
+            def save(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, table[keep], allow_pickle=False)
+            _rewrite_part(path, keep, save)
+        elif path.endswith(".json"):
+            with open(path) as f:
+                coco = json.load(f)
+            keep = ~np.isin([image["id"] for image in coco["images"]], indices)
+            coco["images"] = [image for image, k in zip(coco["images"], keep) if k]
+            dropped = set(indices.tolist())
+            coco["annotations"] = [a for a in coco["annotations"] if a["image_id"] not in dropped]
+            def dump(tmp):
+                with open(tmp, "w") as f:
+                    json.dump(coco, f)
+            _rewrite_part(path, keep, dump)
+        elif path.endswith(".parquet"):
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(path)
+            keep = ~np.isin(table.column("frame").to_numpy(), indices)
+            _rewrite_part(path, keep, lambda tmp: pyarrow.parquet.write_table(table.filter(pyarrow.array(keep)), tmp))
+        else:
+            continue
+        changed += int(not keep.all())
+    return changed
+
+
+def read_labels(base_path):
+    """Reads all npy parts of a dataset as one TABLE_DTYPE array sorted by frame"""
+    path = os.path.join(base_path, "labels")
+    parts = sorted(name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".npy"))
+    if not parts:
+        return np.zeros(0, TABLE_DTYPE)
+    table = np.concatenate([np.load(os.path.join(path, name)) for name in parts])
+    return table[np.argsort(table["frame"], kind="stable")]
+
+
+def read_coco(base_path):
+    """Combines the COCO parts of a dataset into one COCO dict with unique annotation ids"""
+    path = os.path.join(base_path, "labels")
+    combined = {"images": [], "annotations": [], "categories": []}
+    names = {}
+    for part in sorted(name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".json")):
+        with open(os.path.join(path, part)) as f:
+            coco = json.load(f)
+        categories = {c["id"]: names.setdefault(c["name"], len(names) + 1) for c in coco["categories"]}
+        combined["images"] += coco["images"]
+        for annotation in coco["annotations"]:
+            annotation["id"] = len(combined["annotations"]) + 1
+            annotation["category_id"] = categories[annotation["category_id"]]
+            combined["annotations"].append(annotation)
+    combined["categories"] = [{"id": i, "name": name} for name, i in sorted(names.items(), key=lambda item: item[1])]
+    return combined
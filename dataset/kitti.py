@@ -0,0 +1,827 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+KITTI dataset generation
+
+KittiParser spawns the EGO vehicle in a random position, randomly places NPC
+vehicles in front of it and captures camera, lidar and ground truth of a single
+simulation frame. Everything that does not need the simulator (image encoding,
+point cloud conversion, label projection and file writes) is done by the frame
+stages below, which dataset.pipeline runs in worker processes.
+
+Data is saved in the KITTI format. For more information on KITTI please see: http://www.cvlibs.net/datasets/kitti/index.php
+The data format is defined in a readme.txt downloadable from: https://s3.eu-central-1.amazonaws.com/avg-kitti/devkit_object.zip
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import time
+from functools import partial
+
+import numpy as np
+
+import lgsvl
+import lgsvl.pcd
+from lgsvl.utils import transform_to_matrix, transforms_to_matrices
+from dataset.container import ContainerWriter
+from dataset.encoding import ImageEncoder, WriterStats
+from dataset.pipeline import Pipeline, Stage
+
+# Minimum distance along x and z between placed agents
+MIN_AGENT_DISTANCE = 5.0
+
+
+class KittiLayout(object):
+    """Folder hierarchy of a KITTI object detection dataset"""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.calib = os.path.join(base_path, "calib")
+        self.image = os.path.join(base_path, "image_2")
+        self.velodyne = os.path.join(base_path, "velodyne")
+        self.label = os.path.join(base_path, "label_2")
+
+    def makedirs(self):
+        for path in (self.calib, self.image, self.velodyne, self.label):
+            os.makedirs(path, exist_ok=True)
+
+    # Serialised calibration of a sensor rig, per frame calib files are links to it
+    def rig_calib(self, rig_hash):
+        return os.path.join(self.base_path, "rig_{}.txt".format(rig_hash))
+
+    # Writes the domain randomisation settings, frames record their sampled configuration in the manifest
+    def write_sampler(self, sampler):
+        with open(os.path.join(self.base_path, "sampler.json"), "w") as f:
+            json.dump(sampler.to_json(), f, indent=2, sort_keys=True)
+
+    # Writes the calibration blob of a rig once per dataset and adds it to rig.json (calibrations by rig hash)
+    def write_rig(self, calibration):
+        blob = self.rig_calib(calibration.rig_hash)
+        if not os.path.exists(blob):
+            with open(blob, "wb") as f:
+                f.write(calibration.blob)
+        path = os.path.join(self.base_path, "rig.json")
+        rigs = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                rigs = json.load(f)
+        if calibration.rig_hash not in rigs:
+            rigs[calibration.rig_hash] = calibration.to_json()
+            with open(path, "w") as f:
+                json.dump(rigs, f, indent=2, sort_keys=True)
+
+    # Returns the filename of a frame given an extension
+    @staticmethod
+    def filename(idx, ext):
+        return "{:06d}.{}".format(idx, ext)
+
+
+class Calibration(object):
+    """
+    Intrinsic and extrinsic sensor calibration written to calib/*.txt
+    The calibration is the same for every frame of a rig, so it is serialised once.
+    """
+
+    def __init__(self, camera_intrinsics, projection_matrix, rectification_matrix, tr_velo_to_cam, tr_imu_to_velo, rig_hash=None):
+        self.camera_intrinsics = camera_intrinsics
+        self.projection_matrix = projection_matrix
+        self.rectification_matrix = rectification_matrix
+        self.tr_velo_to_cam = tr_velo_to_cam
+        self.tr_imu_to_velo = tr_imu_to_velo
+        self._text = None
+        self._blob = None
+        self._checksum = None
+        # identifies the sensor rig (mounts and calibration), defaults to a hash of the calibration itself
+        self.rig_hash = rig_hash or hashlib.sha1(self.blob).hexdigest()[:16]
+
+    def to_text(self):
+        if self._text is None:
+            lines = []
+            for key in ("P0", "P1", "P2", "P3"):
+                lines.append("{}: {}".format(key, " ".join(str(e) for e in self.projection_matrix)))
+            lines.append("R0_rect: {}".format(" ".join(str(e) for e in self.rectification_matrix)))
+            lines.append("Tr_velo_to_cam: {}".format(" ".join(str(e) for e in self.tr_velo_to_cam)))
+            lines.append("Tr_imu_to_velo: {}".format(" ".join(str(e) for e in self.tr_imu_to_velo)))
+            self._text = "\n".join(lines) + "\n"
+        return self._text
+
+    @property
+    def blob(self):
+        if self._blob is None:
+            self._blob = self.to_text().encode("ascii")
+            self._checksum = hashlib.sha1(self._blob).hexdigest()
+        return self._blob
+
+    @property
+    def checksum(self):
+        return self._checksum if self._blob is not None else hashlib.sha1(self.blob).hexdigest()
+
+    def to_json(self):
+        return {
+            "rig_hash": self.rig_hash,
+            "camera_intrinsics": self.camera_intrinsics,
+            "projection_matrix": [float(e) for e in self.projection_matrix],
+            "rectification_matrix": [float(e) for e in self.rectification_matrix],
+            "tr_velo_to_cam": [float(e) for e in self.tr_velo_to_cam],
+            "tr_imu_to_velo": [float(e) for e in self.tr_imu_to_velo],
+            "calib": self.to_text(),
+        }
+
+    @staticmethod
+    def from_json(j):
+        calibration = Calibration(j["camera_intrinsics"], j["projection_matrix"], j["rectification_matrix"],
+            np.array(j["tr_velo_to_cam"]), np.array(j["tr_imu_to_velo"]), j["rig_hash"])
+        # keep the exact serialisation the frames were written with
+        calibration._text = j["calib"]
+        return calibration
+
+
+class Frame(object):
+    """
+    Everything captured for one dataset sample. Only plain data is kept so
+    frames can be sent to worker processes.
+    """
+
+    def __init__(self, idx, time, frame, image, points, ego_transform, camera_transform, npcs):
+        self.idx = idx
+        self.time = time
+        self.frame = frame
+        self.image = image  # (H, W, 3) uint8 array or encoded image bytes
+        self.points = points  # lgsvl.pcd.POINT_DTYPE array in lidar coordinates
+        self.ego_transform = ego_transform
+        self.camera_transform = camera_transform  # camera mount relative to the EGO
+        self.npcs = npcs  # list of (lgsvl.Transform, lgsvl.BoundingBox)
+        self.seed = None  # random seed the frame was generated with, if any
+        self.rig_hash = None  # sensor rig of the calibration the frame was written with
+        self.environment = None  # sampled environment configuration (dict), if randomised
+        # filled in by convert_frame
+        self.images = None  # list of (extension, bytes), see ImageEncoder.encode
+        self.encode_time = 0.0
+        self.velodyne = None
+        self.label_array = None  # LABEL_DTYPE array, for columnar exports
+        self.labels = None
+        # filled in by write_frame: sha1 of every written file, by path relative to the dataset root
+        self.checksums = None
+        self.bytes_written = 0
+        self.files = None  # (relative path, bytes) for a container sink, see pack_frame
+
+
+# Calculates various camera properties
+def get_camera_intrinsics(sensor_camera):
+    image_width = sensor_camera.width
+    image_height = sensor_camera.height
+    aspect_ratio = image_width / image_height
+    vertical_fov = sensor_camera.fov
+    horizon_fov = 2 * math.degrees(math.atan(math.tan(math.radians(vertical_fov) / 2) * aspect_ratio))
+    fx = image_width / (2 * math.tan(0.5 * math.radians(horizon_fov)))
+    fy = image_height / (2 * math.tan(0.5 * math.radians(vertical_fov)))
+    cx = image_width / 2
+    cy = image_height / 2
+
+    camera_info = {}
+    camera_info["image_width"] = image_width
+    camera_info["image_height"] = image_height
+    camera_info["aspect_ratio"] = aspect_ratio
+    camera_info["vertical_fov"] = vertical_fov
+    camera_info["horizontal_fov"] = horizon_fov
+    camera_info["fx"] = fx
+    camera_info["fy"] = fy
+    camera_info["cx"] = cx
+    camera_info["cy"] = cy
+
+    projection_matrix = [
+        camera_info["fx"], 0.0, camera_info["cx"], 0.0,
+        0.0, camera_info["fy"], camera_info["cy"], 0.0,
+        0.0, 0.0, 1.0, 0.0,
+    ]
+
+    rectification_matrix = [
+        1.0, 0.0, 0.0,
+        0.0, 1.0, 0.0,
+        0.0, 0.0, 1.0,
+    ]
+
+    return camera_info, projection_matrix, rectification_matrix
+
+
+# Unity axes to the Kitti axes of the camera and of the velodyne (and GPS/IMU)
+UNITY_TO_CAMERA = np.diag([1.0, -1.0, 1.0])
+UNITY_TO_VELODYNE = np.array([[0.0, 0.0, 1.0], [-1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+
+# Flattened 3x4 Kitti transform of a rig extrinsic between sensors with the given axes
+def kitti_extrinsic(extrinsic, source_axes, target_axes):
+    rotation = target_axes.dot(extrinsic[:3, :3].T).dot(source_axes.T)
+    translation = target_axes.dot(extrinsic[3, :3])
+    return np.hstack([rotation, translation[:, None]]).flatten()
+
+
+# Calculates the calibration values between various sensors
+def calibrate(sensor_camera, sensor_lidar, sensor_imu):
+    camera_intrinsics, projection_matrix, rectification_matrix = get_camera_intrinsics(sensor_camera)
+
+    # Coordinate systems
+    # - Unity:    x: right,   y: up,    z: forward (left-handed)
+    # - Kitti: (right-handed)
+    #   - Camera:   x: right,   y: down,  z: forward
+    #   - Velodyne: x: forward, y: left,  z: up
+    #   - GPS/IMU:  x: forward, y: left,  z: up
+    # The rig maps Unity row vectors between sensor frames, Kitti matrices map column vectors in Kitti axes
+    rig = lgsvl.SensorRig([sensor_camera, sensor_lidar, sensor_imu])
+
+    # Velodyne to Camera
+    tr_velo_to_cam = kitti_extrinsic(rig.extrinsic(sensor_lidar, sensor_camera), UNITY_TO_VELODYNE, UNITY_TO_CAMERA)
+
+    # IMU to Velodyne
+    tr_imu_to_velo = kitti_extrinsic(rig.extrinsic(sensor_imu, sensor_lidar), UNITY_TO_VELODYNE, UNITY_TO_VELODYNE)
+
+    calibration = Calibration(camera_intrinsics, projection_matrix, rectification_matrix, tr_velo_to_cam, tr_imu_to_velo)
+    calibration.rig_hash = rig_hash([sensor_camera, sensor_lidar, sensor_imu], calibration)
+    return calibration
+
+
+# Hash of the sensor mounts and the calibration derived from them
+def rig_hash(sensors, calibration):
+    sha = hashlib.sha1(calibration.blob)
+    for sensor in sensors:
+        sha.update(json.dumps({"name": sensor.name, "transform": sensor.transform.to_json()}, sort_keys=True).encode("utf-8"))
+    return sha.hexdigest()[:16]
+
+
+# Per object label fields of a frame, one row per NPC
+LABEL_DTYPE = np.dtype([
+    ("type", "U16"),
+    ("truncated", "<f4"),  # 0 (inside the image) to 1 (leaving the image)
+    ("occluded", "i1"),  # 0 fully visible, 1 partly occluded, 2 largely occluded, 3 unknown
+    ("alpha", "<f4"),
+    ("bbox", "<f4", (4,)),  # left, top, right, bottom in pixels, clipped to the image
+    ("dimensions", "<f4", (3,)),  # height, width, length
+    ("location", "<f4", (3,)),
+    ("rotation_y", "<f4"),
+])
+
+# Occluded fraction of a 2D box above which an object counts as partly / largely occluded
+OCCLUSION_LEVELS = (0.1, 0.5)
+
+# Corners closer to the camera than this are treated as behind it
+NEAR_PLANE = 0.1
+
+# Unit box corners (length, height, width) in the object frame, scaled by the dimensions
+BOX_CORNERS = np.array([
+    [0.5, 0, 0.5], [0.5, 0, -0.5], [-0.5, 0, -0.5], [-0.5, 0, 0.5],
+    [0.5, -1, 0.5], [0.5, -1, -0.5], [-0.5, -1, -0.5], [-0.5, -1, 0.5],
+])
+
+
+# Returns (N, 4, 4) NPC transforms relative to the EGO camera
+def get_npc_matrices(frame):
+    camera_mat = transform_to_matrix(frame.camera_transform)
+    ego_mat = transform_to_matrix(frame.ego_transform)
+    tf_mat = np.dot(np.linalg.inv(ego_mat), np.linalg.inv(camera_mat))
+
+    position = [(tr.position.x, tr.position.y, tr.position.z) for tr, _ in frame.npcs]
+    rotation = [(tr.rotation.x, tr.rotation.y, tr.rotation.z) for tr, _ in frame.npcs]
+    return np.matmul(transforms_to_matrices(position, rotation), tf_mat)
+
+
+# Returns (N, 3) vectors from the EGO camera to the NPCs
+def get_locations(transforms):
+    locations = transforms[:, 3, :3].copy()
+    locations[:, 1] *= -1
+    return locations
+
+
+# Returns the rotations along the y axis (up) of NPCs in the camera space. 0 is when the NPC is facing to the right
+def get_rotations_y(transforms):
+    rotation_y = np.arctan2(transforms[:, 2, 0], transforms[:, 0, 0]) - (np.pi / 2)
+    rotation_y[rotation_y < -np.pi] += 2 * np.pi
+    return rotation_y
+
+
+# Alpha takes into account the relative position of the NPC and it's rotation to calculate a different kind of rotation
+# KITTI expects alpha and rotation_y separately. See KITTI readme.txt for a more detailed explanation
+def get_alphas(locations, rotations_y):
+    # angle between the camera forward axis and the (x, 0, z) direction of the NPC
+    theta = np.arctan2(np.abs(locations[:, 0]), locations[:, 2])
+    theta[locations[:, 0] > 0] *= -1
+    return rotations_y + theta
+
+
+# Returns (N, 3) height, width and length of the given bounding boxes
+def get_dimensions(bboxes):
+    return np.array([(bbox.size.y, bbox.size.x, bbox.size.z) for bbox in bboxes], dtype=np.float64).reshape(-1, 3)
+
+
+# Returns (N, 8, 3) bounding box corners around NPCs in the camera space
+def get_corners_3D(locations, rotations_y, dimensions):
+    h, w, l = dimensions[:, 0], dimensions[:, 1], dimensions[:, 2]
+    corners = BOX_CORNERS * np.stack([l, h, w], axis=1)[:, None, :]
+
+    c, s = np.cos(rotations_y), np.sin(rotations_y)
+    x = c[:, None] * corners[:, :, 0] + s[:, None] * corners[:, :, 2]
+    z = -s[:, None] * corners[:, :, 0] + c[:, None] * corners[:, :, 2]
+    return np.stack([x, corners[:, :, 1], z], axis=2) + locations[:, None, :]
+
+
+# Projects (N, 8, 3) bounding box corners to (N, 8, 2) pixels of the camera image
+def project_3D_to_2D(corners_3D, calibration):
+    proj_mat = np.array(calibration.projection_matrix).reshape((3, 4))
+
+    rect_3x3 = np.array(calibration.rectification_matrix).reshape((3, 3))
+    rect_mat = np.zeros([4, 4], dtype=rect_3x3.dtype)
+    rect_mat[3, 3] = 1
+    rect_mat[:3, :3] = rect_3x3
+
+    homogeneous = np.concatenate([corners_3D, np.ones(corners_3D.shape[:-1] + (1,))], axis=-1)
+    corners_2D = np.matmul(homogeneous, np.dot(proj_mat, rect_mat).T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return corners_2D[..., :2] / corners_2D[..., 2:]
+
+
+# Returns (N, 4) 2D boxes clipped to the image and the truncation of every box
+# Truncation is the fraction of the unclipped box outside the image; boxes with
+# corners behind the camera are truncated at least by the fraction of those corners
+def get_boxes_2D(corners_3D, corners_2D, width, height):
+    in_front = corners_3D[:, :, 2] > NEAR_PLANE
+    u = np.where(in_front, corners_2D[:, :, 0], np.nan)
+    v = np.where(in_front, corners_2D[:, :, 1], np.nan)
+    visible = in_front.any(axis=1)
+
+    boxes = np.zeros((len(corners_3D), 4))
+    with np.errstate(invalid="ignore"):
+        boxes[visible] = np.stack([
+            np.nanmin(u[visible], axis=1), np.nanmin(v[visible], axis=1),
+            np.nanmax(u[visible], axis=1), np.nanmax(v[visible], axis=1),
+        ], axis=1)
+
+    clipped = np.clip(boxes, 0, [width, height, width, height])
+    area = box_area(boxes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inside = np.where(area > 0, box_area(clipped) / area, 0)
+    truncated = np.maximum(1 - inside, 1 - in_front.mean(axis=1))
+    truncated[~visible] = 1
+    return clipped, truncated
+
+
+def box_area(boxes):
+    return np.maximum(boxes[..., 2] - boxes[..., 0], 0) * np.maximum(boxes[..., 3] - boxes[..., 1], 0)
+
+
+# Returns KITTI occlusion levels from the fraction of every 2D box covered by the boxes of nearer NPCs
+def get_occlusion(boxes, distances):
+    lo = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    hi = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    overlap = np.prod(np.maximum(hi - lo, 0), axis=2)
+    overlap[distances[None, :] >= distances[:, None]] = 0  # only nearer NPCs occlude
+
+    area = box_area(boxes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.minimum(overlap.sum(axis=1) / area, 1)
+    occluded = np.digitize(fraction, OCCLUSION_LEVELS).astype(np.int8)
+    occluded[~(area > 0)] = 3
+    return occluded
+
+
+# Computes the labels of the NPCs of a frame in one batched pass, returns a LABEL_DTYPE array
+# NPCs with no part inside the image (an empty clipped 2D box) get no label
+def compute_labels(frame, calibration):
+    labels = np.zeros(len(frame.npcs), dtype=LABEL_DTYPE)
+    if len(frame.npcs) == 0:
+        return labels
+
+    transforms = get_npc_matrices(frame)
+    locations = get_locations(transforms)
+    rotations_y = get_rotations_y(transforms)
+    dimensions = get_dimensions([bbox for _, bbox in frame.npcs])
+
+    corners_3D = get_corners_3D(locations, rotations_y, dimensions)
+    corners_2D = project_3D_to_2D(corners_3D, calibration)
+    width, height = calibration.camera_intrinsics["image_width"], calibration.camera_intrinsics["image_height"]
+    boxes, truncated = get_boxes_2D(corners_3D, corners_2D, width, height)
+
+    labels["type"] = "Car"
+    labels["truncated"] = truncated
+    labels["occluded"] = get_occlusion(boxes, np.linalg.norm(locations, axis=1))
+    labels["alpha"] = get_alphas(locations, rotations_y)
+    labels["bbox"] = boxes
+    labels["dimensions"] = dimensions
+    labels["location"] = locations
+    labels["rotation_y"] = rotations_y
+    return labels[box_area(boxes) > 0]
+
+
+# Formats LABEL_DTYPE rows as lines of a KITTI label file
+def format_labels(labels):
+    lines = []
+    for label in labels:
+        lines.append("{} {:.2f} {:d} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f}".format(
+            label["type"], label["truncated"], label["occluded"], label["alpha"], *label["bbox"], *label["dimensions"],
+            *label["location"], label["rotation_y"]))
+    return lines
+
+
+# Converts the ground truth boxes of every NPC in KITTI format
+def parse_ground_truth(frame, calibration):
+    return format_labels(compute_labels(frame, calibration))
+
+
+# Frame stage: image encoding, point cloud conversion and label projection
+def convert_frame(frame, calibration, encoder):
+    frame.images, frame.encode_time = encoder.timed_encode(frame.image)
+    frame.image = None
+    frame.velodyne = lgsvl.pcd.to_xyzi(frame.points)
+    frame.points = None
+    frame.label_array = compute_labels(frame, calibration)
+    frame.labels = format_labels(frame.label_array)
+    return frame
+
+
+# Returns the files of a converted frame as (path relative to the dataset root, bytes)
+# Records their checksums and size in the frame and drops the image and point data
+def frame_files(frame, calibration):
+    files = [(os.path.join("image_2", KittiLayout.filename(frame.idx, ext)), data) for ext, data in frame.images]
+    files += [
+        (os.path.join("velodyne", KittiLayout.filename(frame.idx, "bin")), frame.velodyne.tobytes()),
+        (os.path.join("label_2", KittiLayout.filename(frame.idx, "txt")), "".join("{}\n".format(label) for label in frame.labels).encode("ascii")),
+    ]
+    frame.checksums = {name: hashlib.sha1(data).hexdigest() for name, data in files}
+    frame.bytes_written = sum(len(data) for _, data in files)
+    # the calibration is serialised and hashed once per rig
+    calib = os.path.join("calib", KittiLayout.filename(frame.idx, "txt"))
+    frame.checksums[calib] = calibration.checksum
+    frame.rig_hash = calibration.rig_hash
+    files.append((calib, calibration.blob))
+    frame.images = None
+    frame.velodyne = None
+    return files
+
+
+# Frame stage: writes image, point cloud and labels of a converted frame, the calib file is a link to the rig
+# calibration (see KittiLayout.write_rig)
+# Only the frame record is passed on, with the file contents if keep_files is set (for a container sink)
+def write_frame(frame, layout, calibration, keep_files=False):
+    files = frame_files(frame, calibration)
+    blob = layout.rig_calib(calibration.rig_hash)
+    for name, data in files:
+        if data is calibration.blob:
+            link_or_copy(blob, os.path.join(layout.base_path, name))
+            continue
+        with open(os.path.join(layout.base_path, name), "wb") as f:
+            f.write(data)
+    if keep_files:
+        frame.files = files
+    return frame
+
+
+# Hard links source to target if possible (replacing target), copies otherwise
+def link_or_copy(source, target, link=True):
+    if os.path.lexists(target):
+        os.remove(target)
+    if link:
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+# Frame stage: serialises a converted frame for a container sink without writing files
+def pack_frame(frame, calibration):
+    frame.files = frame_files(frame, calibration)
+    return frame
+
+
+class PlacementStats(object):
+    """Counts of NPC candidates surviving each placement check"""
+
+    def __init__(self):
+        self.rounds = 0  # batches drawn (simulator raycast round trips)
+        self.drawn = 0
+        self.in_fov = 0
+        self.spaced = 0  # in view and far enough from placed agents
+        self.visible = 0  # also not obscured
+        self.accepted = 0
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.drawn if self.drawn else 0.0
+
+    def __repr__(self):
+        return "{} candidates in {} rounds: {} in view, {} spaced, {} visible, {} placed ({:.1%} accepted)".format(
+            self.drawn, self.rounds, self.in_fov, self.spaced, self.visible, self.accepted, self.acceptance_rate)
+
+
+class KittiParser(object):
+    def __init__(self, scene_name="BorregasAve", agent_name="Jaguar2015XE (Apollo 3.5)", start_idx=0, address=None, port=8181, capture_encoding="raw", sampler=None):
+        self.scene_name = scene_name
+        self.agent_name = agent_name
+        self.address = address or os.environ.get("SIMULATOR_HOST", "127.0.0.1")
+        self.port = port
+        self.capture_encoding = capture_encoding  # camera images are received "raw" or as "png"
+        self.sim = None
+        self.ego = None
+        self.ego_state = None
+        self.sensor_camera = None
+        self.sensor_lidar = None
+        self.sensor_imu = None
+        self.npcs = []
+        self.npcs_state = []
+        self.occupied = np.zeros((0, 2))  # x/z positions of the EGO and placed NPCs for proximity checks
+        self.idx = start_idx
+        self.calibration = None
+        self.placement_stats = PlacementStats()
+        self.writer_stats = WriterStats()
+        self.sampler = sampler  # dataset.sampler.EnvironmentSampler, environment is left alone if None
+        self.environment = None  # EnvironmentConfig currently applied
+
+    # Starts the simulator and loads the EGO with its sensors
+    def bootstrap(self):
+        self.sim = lgsvl.Simulator(self.address, self.port)
+        self.load_scene()
+        self.sim.reset()
+        self.ego = self.sim.add_agent(self.agent_name, lgsvl.AgentType.EGO)
+        self.load_sensors()
+        self.calibrate()
+
+        print("\nBootstrap success!")
+
+    # Loads the scene specified when KittiParser is created. To save time, the scene is loaded only if it has not already be loaded
+    def load_scene(self):
+        if self.sim.current_scene != self.scene_name:
+            print("Loading {} scene...".format(self.scene_name))
+            self.sim.load(self.scene_name)
+        print("\n{} scene has been loaded!".format(self.scene_name))
+
+    # Saves the sensor objects for later use
+    def load_sensors(self):
+        print("\nAvailable sensors:")
+        for sensor in self.ego.get_sensors():
+            print("{}: {}".format(sensor.name, sensor.transform))
+            if sensor.name == "Main Camera":
+                self.sensor_camera = sensor
+            if sensor.name == "Lidar":
+                self.sensor_lidar = sensor
+            if sensor.name == "IMU":
+                self.sensor_imu = sensor
+
+    def calibrate(self):
+        if self.sensor_camera and self.sensor_lidar and self.sensor_imu:
+            self.calibration = calibrate(self.sensor_camera, self.sensor_lidar, self.sensor_imu)
+        else:
+            raise RuntimeError("Sensors for calibration are not available!")
+
+    # Finds a random point on the map to spawn the EGO
+    def get_ego_random_transform(self):
+        origin = lgsvl.Transform()
+        sx = origin.position.x
+        sy = origin.position.y
+        sz = origin.position.z
+
+        mindist = 0.0
+        maxdist = 700.0
+        angle = random.uniform(0.0, 2 * math.pi)
+        dist = random.uniform(mindist, maxdist)
+        point = lgsvl.Vector(sx + dist * math.cos(angle), sy, sz + dist * math.sin(angle))
+
+        return self.sim.map_point_on_lane(point)
+
+    # Draws a random point in the camera view of the EGO, to be projected on a lane (see draw_npc_candidates)
+    # The point is shifted sideways by up to 10 m so that the NPCs are spawned on different lanes
+    def get_npc_random_point(self):
+        ego_transform = self.ego_state.transform
+        sx = ego_transform.position.x
+        sy = ego_transform.position.y
+        sz = ego_transform.position.z
+        ry = ego_transform.rotation.y
+        if ry < 0:
+            ry = 360 + ry
+
+        hfov = self.calibration.camera_intrinsics["horizontal_fov"]
+
+        mindist = 0.0
+        maxdist = 100.0
+        dist = random.uniform(mindist, maxdist)
+        angle = random.uniform(math.radians(ry - hfov / 2), math.radians(ry + hfov / 2))
+        offset = random.uniform(0.0, 10.0)
+        heading = math.radians(ry)
+        return lgsvl.Vector(sx + dist * math.sin(angle) - offset * math.cos(heading), sy,
+            sz + dist * math.cos(angle) + offset * math.sin(heading))
+
+    # Removes all spawned NPCs
+    def reset_npcs(self):
+        for npc in self.npcs:
+            self.sim.remove_agent(npc)
+        self.npcs = []
+        self.npcs_state = []
+        position = self.ego_state.transform.position
+        self.occupied = np.array([[position.x, position.z]])
+
+    # Moves the EGO to the given transform
+    def position_ego(self, transform):
+        ego_state = self.ego.state
+        ego_state.transform = transform
+        self.ego.state = ego_state
+        # cache the state for later queries
+        self.ego_state = ego_state
+
+    # Creates a random number of NPCs
+    # Candidate positions are drawn and checked in batches, survivors are placed as long as they keep their distance
+    # A batch holds at most as many candidates as NPCs are still missing and costs one lane projection round trip
+    # This will timeout after 9 seconds
+    def setup_npcs(self, candidates=16):
+        self.reset_npcs()
+        models = self.environment.npc_models if self.environment is not None else None
+        num_npcs = len(models) if models is not None else random.randint(1, 15)
+        t0 = time.time()
+        while len(self.npcs) < num_npcs:
+            if time.time() - t0 > 9:
+                print("Timeout! Stop placing NPCs")
+                break
+            for npc_transform in self.draw_npc_candidates(min(candidates, num_npcs - len(self.npcs))):
+                if len(self.npcs) >= num_npcs:
+                    break
+                # candidates of the same batch may still be too close to each other
+                if self.is_npc_too_close(npc_transform):
+                    continue
+                self.position_npc(npc_transform, models[len(self.npcs)] if models is not None else None)
+                self.placement_stats.accepted += 1
+
+    # Draws count candidate NPC transforms and returns the ones in the camera view, far enough from placed agents
+    # and not obscured. The candidates are projected on lanes with one batch, field of view and distance are checked
+    # for all of them at once, occlusion with a single batched raycast
+    def draw_npc_candidates(self, count):
+        stats = self.placement_stats
+        stats.rounds += 1
+        transforms = self.sim.map_point_on_lane_batch([self.get_npc_random_point() for _ in range(count)])
+        positions = np.array([(t.position.x, t.position.y, t.position.z) for t in transforms]).reshape(-1, 3)
+        stats.drawn += count
+
+        keep = self.are_npcs_in_fov(positions)
+        stats.in_fov += int(keep.sum())
+        keep &= ~self.are_npcs_too_close(positions)
+        stats.spaced += int(keep.sum())
+        if not keep.any():
+            return []
+
+        visible = ~self.are_npcs_obscured(positions[keep])
+        stats.visible += int(visible.sum())
+        survivors = [t for t, k in zip(transforms, keep) if k]
+        return [t for t, v in zip(survivors, visible) if v]
+
+    # Creates an NPC of the given type (random if None) at the given location
+    def position_npc(self, transform, npc_type=None):
+        npc_state = lgsvl.AgentState()
+        npc_state.transform = transform
+        if npc_type is None:
+            available_npcs = ['Sedan', 'SUV', 'Jeep', 'Hatchback']  # 'SchoolBus', 'DeliveryTruck'
+            npc_type = available_npcs[random.randint(0, len(available_npcs) - 1)]
+        npc = self.sim.add_agent(npc_type, lgsvl.AgentType.NPC, npc_state)
+        self.npcs.append(npc)
+        self.npcs_state.append(npc_state)
+        self.occupied = np.vstack([self.occupied, [(transform.position.x, transform.position.z)]])
+
+    # Checks if the given position is too close to the EGO or a placed NPC
+    def is_npc_too_close(self, npc_transform):
+        position = npc_transform.position
+        return bool(self.are_npcs_too_close(np.array([[position.x, position.y, position.z]]))[0])
+
+    # Checks which of the (M, 3) positions are too close (along both x and z) to the EGO or already placed NPCs
+    def are_npcs_too_close(self, positions):
+        distance = np.abs(positions[:, None, [0, 2]] - self.occupied[None, :, :])
+        return (distance < MIN_AGENT_DISTANCE).all(axis=2).any(axis=1)
+
+    # Checks which of the (M, 3) positions have something between the EGO lidar and them, with one raycast round trip
+    def are_npcs_obscured(self, positions):
+        lidar_mat = np.dot(transform_to_matrix(self.sensor_lidar.transform), transform_to_matrix(self.ego_state.transform))
+        start = lidar_mat[3][:3]
+        directions = positions - start
+        distances = np.linalg.norm(directions, axis=1)
+        layer_mask = 0
+        for bit in [0]:
+            layer_mask |= 1 << bit
+
+        origin = lgsvl.Vector(*start)
+        hits = self.sim.raycast_batch([{
+            "origin": origin,
+            "direction": lgsvl.Vector(*direction),
+            "layer_mask": layer_mask,
+            "max_distance": float(distance),
+        } for direction, distance in zip(directions, distances)])
+        return np.array([hit is not None for hit in hits], dtype=bool)
+
+    # Checks which of the (M, 3) positions are in the view of the EGO camera
+    def are_npcs_in_fov(self, positions):
+        ego = self.ego_state.transform
+        # heading of every position seen from the EGO, clockwise from the z axis like rotation.y
+        theta = np.degrees(np.arctan2(positions[:, 0] - ego.position.x, positions[:, 2] - ego.position.z))
+        angle = np.abs((theta - ego.rotation.y + 180) % 360 - 180)
+        hfov = self.calibration.camera_intrinsics["horizontal_fov"]
+        return angle < hfov / 2
+
+    # Captures camera, lidar and ground truth of one simulation frame
+    def capture_data(self):
+        bundle = self.ego.capture([self.sensor_camera, self.sensor_lidar], ground_truth=True, encoding=self.capture_encoding)
+        npcs = []
+        for npc in self.npcs:
+            truth = bundle.agents.get(npc.uid)
+            if truth is not None:
+                npcs.append((truth.state.transform, truth.bounding_box))
+        ego_transform = bundle.agents[self.ego.uid].state.transform if self.ego.uid in bundle.agents else self.ego_state.transform
+        frame = Frame(self.idx, bundle.time, bundle.frame, bundle.sensors[self.sensor_camera], bundle.sensors[self.sensor_lidar],
+            ego_transform, self.sensor_camera.transform, npcs)
+        frame.environment = self.environment._asdict() if self.environment is not None else None
+        self.idx += 1
+        return frame
+
+    # Simulator stage: positions actors and captures data, frames without NPCs are skipped
+    def frames(self, count):
+        for i in range(count):
+            self.update_environment(self.idx)
+            self.position_ego(self.get_ego_random_transform())
+            self.setup_npcs()
+            if len(self.npcs) == 0:
+                print("No NPCs! Skip frame.")
+                continue
+            yield self.capture_data()
+
+    # Positions actors for frame idx from its seed and captures it
+    # Draws are repeated (with derived seeds) while no NPC could be placed
+    def capture_index(self, idx, seed, attempts=10):
+        self.update_environment(idx)
+        for attempt in range(attempts):
+            random.seed("{}:{}".format(seed, attempt))
+            self.position_ego(self.get_ego_random_transform())
+            self.setup_npcs()
+            if len(self.npcs) > 0:
+                self.idx = idx
+                frame = self.capture_data()
+                frame.seed = seed
+                return frame
+        print("No NPCs for frame {} after {} attempts! Skip frame.".format(idx, attempts))
+        return None
+
+    # Applies the sampled environment of frame idx if it differs from the current one
+    # Weather and time of day are set in one round trip, the NPC models are used by setup_npcs
+    def update_environment(self, idx):
+        if self.sampler is None:
+            return
+        config = self.sampler.config_for(idx)
+        if self.environment is None or self.environment.seed != config.seed:
+            self.sampler.apply(self.sim, config)
+            self.environment = config
+
+    # Simulator stage for an explicit set of indices, each frame reproducible from its seed
+    def frames_for(self, indices, seeds):
+        for idx in indices:
+            yield self.capture_index(idx, seeds(idx))
+
+    # Frame stages writing a KITTI tree at layout, or only serialising frames for a container sink if layout is None
+    def pipeline(self, layout, workers=2, queue_size=8, encoder=None, keep_files=False):
+        encoder = encoder or ImageEncoder()
+        if layout is None:
+            output = Stage("pack", partial(pack_frame, calibration=self.calibration), workers)
+        else:
+            output = Stage("write", partial(write_frame, layout=layout, calibration=self.calibration, keep_files=keep_files), workers)
+        return Pipeline([
+            Stage("convert", partial(convert_frame, calibration=self.calibration, encoder=encoder), workers),
+            output,
+        ], queue_size=queue_size)
+
+    # Generates count frames into base_path, encoding, conversion and writes run in a pool of worker processes
+    # encoder is an ImageEncoder (lossless PNG by default)
+    # With container set, frames are also appended to a dataset.container at that path; files=False skips the KITTI tree
+    # exporter is an optional dataset.export.LabelExporter writing columnar labels
+    def generate(self, count, base_path, workers=2, queue_size=8, encoder=None, container=None, files=True, exporter=None):
+        layout = None
+        if files:
+            layout = KittiLayout(base_path)
+            layout.makedirs()
+            layout.write_rig(self.calibration)
+            if self.sampler is not None:
+                layout.write_sampler(self.sampler)
+        sinks = [self.writer_stats.add]
+        if exporter is not None:
+            sinks.append(exporter.add)
+        writer = None
+        if container is not None:
+            writer = ContainerWriter(container)
+            sinks.append(writer.add)
+
+        pipeline = self.pipeline(layout, workers, queue_size, encoder, keep_files=writer is not None)
+        try:
+            pipeline.run(self.frames(count), sink=sinks)
+        finally:
+            if exporter is not None:
+                exporter.close()
+            if writer is not None:
+                writer.close()
+        return pipeline
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Staged pipeline for dataset generation
+
+The simulator facing stage runs in the calling thread and only produces frames.
+Every other stage is a picklable function frame -> frame (or None to drop the
+frame) executed in a process pool. Stages are connected with bounded queues so
+a slow stage applies back pressure instead of buffering frames without limit.
+Frames leave every stage in the order they entered it.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+_DONE = object()
+
+
+class Stage(object):
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+
+
+class StageStats(object):
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.frames = 0
+        self.busy = 0.0  # seconds spent in the stage function, summed over workers
+        self.start = None
+        self.end = None
+
+    def add(self, elapsed):
+        self.frames += 1
+        self.busy += elapsed
+
+    @property
+    def fps(self):
+        """Frames per second the stage delivered over its lifetime"""
+        if self.start is None or self.end is None or self.end <= self.start:
+            return 0.0
+        return self.frames / (self.end - self.start)
+
+    @property
+    def capacity(self):
+        """Frames per second the stage could sustain with its workers if never starved"""
+        if self.busy <= 0:
+            return 0.0
+        return self.frames * self.workers / self.busy
+
+    def __repr__(self):
+        return "{:<12} {:6d} frames {:8.2f} fps {:8.2f} fps capacity ({} workers)".format(
+            self.name, self.frames, self.fps, self.capacity, self.workers)
+
+
+def _timed(fn, item):
+    t0 = time.perf_counter()
+    result = fn(item)
+    return result, time.perf_counter() - t0
+
+
+class Pipeline(object):
+    def __init__(self, stages, queue_size=8, executor=None):
+        """
+        stages: list of Stage, executed in order after the source
+        queue_size: maximum number of frames waiting in front of each stage
+        executor: concurrent.futures executor (a process pool by default)
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.executor = executor
+        self.stats = {}
+        self._error = None
+
+    def run(self, source, name="simulator", sink=None):
+        """
+        Feeds every frame of the source iterable through all stages and waits until
+        they are done. Frames leaving the last stage are passed to sink (a callable or
+        a list of callables, called in order) in this process. Returns the per stage
+        statistics, source stage included.
+        """
+        executor = self.executor or ProcessPoolExecutor(max_workers=sum(stage.workers for stage in self.stages))
+        self.stats = {name: StageStats(name)}
+        for stage in self.stages:
+            self.stats[stage.name] = StageStats(stage.name, stage.workers)
+        self._error = None
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            t = threading.Thread(target=self._run_stage, args=(stage, queues[i], queues[i + 1], executor), daemon=True)
+            t.start()
+            threads.append(t)
+        collector = threading.Thread(target=self._drain_sink, args=(queues[-1], sink), daemon=True)
+        collector.start()
+
+        stats = self.stats[name]
+        stats.start = time.perf_counter()
+        try:
+            iterator = iter(source)
+            while self._error is None:
+                t0 = time.perf_counter()
+                try:
+                    frame = next(iterator)
+                except StopIteration:
+                    break
+                stats.add(time.perf_counter() - t0)
+                if frame is not None:
+                    self._put(queues[0], frame)
+        finally:
+            stats.end = time.perf_counter()
+            self._put(queues[0], _DONE)
+            for t in threads:
+                t.join()
+            collector.join()
+            if self.executor is None:
+                executor.shutdown()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def report(self):
+        return "\n".join(repr(stats) for stats in self.stats.values())
+
+    def _put(self, q, item):
+        # blocks while the queue is full, unless the pipeline failed and nobody is consuming
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._error is not None and item is not _DONE:
+                    return
+
+    def _run_stage(self, stage, inbox, outbox, executor):
+        stats = self.stats[stage.name]
+        pending = deque()
+        while True:
+            self._forward(stats, pending, outbox, block=False)
+            try:
+                item = inbox.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            if stats.start is None:
+                stats.start = time.perf_counter()
+            while len(pending) >= stage.workers:
+                self._forward(stats, pending, outbox, block=True)
+            if self._error is None:
+                pending.append(executor.submit(_timed, stage.fn, item))
+        while pending:
+            self._forward(stats, pending, outbox, block=True)
+        stats.end = time.perf_counter()
+        self._put(outbox, _DONE)
+
+    def _forward(self, stats, pending, outbox, block):
+        # passes on the finished results at the head of pending (oldest first), waits for the first one if block
+        while pending and (block or pending[0].done()):
+            block = False
+            future = pending.popleft()
+            try:
+                result, elapsed = future.result()
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+                continue
+            stats.add(elapsed)
+            if result is not None:
+                self._put(outbox, result)
+
+    def _drain_sink(self, inbox, sink):
+        sinks = list(sink) if isinstance(sink, (list, tuple)) else [sink] if sink is not None else []
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            if self._error is not None:
+                continue
+            try:
+                for fn in sinks:
+                    fn(item)
+            except Exception as e:
+                self._error = e
@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Domain randomisation for dataset generation
+
+An EnvironmentSampler draws weather, time of day and the NPC models to place
+from declarative distributions. A configuration is drawn per episode of
+`episode_length` consecutive frames, from a seed derived from the sampler seed
+and the episode, so any frame's environment can be reproduced without
+replaying the frames before it.
+
+Distributions are given as JSON friendly specs:
+
+    {"uniform": [low, high]}
+    {"normal": [mean, std, low, high]}      clipped to [low, high]
+    {"randint": [low, high]}                inclusive
+    {"choice": {"value": weight, ...}}
+    any other value                         constant
+"""
+
+import bisect
+import random
+from collections import namedtuple
+
+import lgsvl
+
+EnvironmentConfig = namedtuple("EnvironmentConfig", "seed rain fog wetness time_of_day npc_models")
+
+DEFAULT_SPEC = {
+    "rain": {"uniform": [0.0, 1.0]},
+    "fog": {"uniform": [0.0, 0.5]},
+    "wetness": {"uniform": [0.0, 1.0]},
+    "time_of_day": {"uniform": [6.0, 20.0]},
+    "npc_count": {"randint": [1, 15]},
+    "npc_models": {"choice": {"Sedan": 1, "SUV": 1, "Jeep": 1, "Hatchback": 1}},
+}
+
+
+def derive_seed(base_seed, n):
+    """32 bit seed of the n-th unit (frame, episode) derived from base_seed"""
+    return (base_seed * 2654435761 + n) % (1 << 32)
+
+
+def draw(rng, spec):
+    """Draws one value from a distribution spec with the random.Random rng"""
+    if not isinstance(spec, dict) or len(spec) != 1:
+        return spec
+    kind, params = next(iter(spec.items()))
+    if kind == "uniform":
+        return rng.uniform(*params)
+    if kind == "normal":
+        mean, std, low, high = params
+        return min(max(rng.gauss(mean, std), low), high)
+    if kind == "randint":
+        return rng.randint(*params)
+    if kind == "choice":
+        values, cumulative, total = list(params), [], 0.0
+        for v in values:
+            total += params[v]
+            cumulative.append(total)
+        return values[bisect.bisect(cumulative, rng.random() * total, 0, len(values) - 1)]
+    raise ValueError("unknown distribution '{}'".format(kind))
+
+
+class EnvironmentSampler(object):
+    def __init__(self, spec=None, seed=0, episode_length=1):
+        """
+        spec: dict of distributions overriding DEFAULT_SPEC entries
+        seed: base seed, together with the episode it determines the configuration
+        episode_length: number of consecutive frames sharing one configuration
+        """
+        self.spec = dict(DEFAULT_SPEC)
+        self.spec.update(spec or {})
+        self.seed = seed
+        self.episode_length = episode_length
+
+    def episode_seed(self, idx):
+        return derive_seed(self.seed, idx // self.episode_length)
+
+    def sample(self, seed):
+        rng = random.Random(seed)
+        count = draw(rng, self.spec["npc_count"])
+        return EnvironmentConfig(
+            seed=seed,
+            rain=draw(rng, self.spec["rain"]),
+            fog=draw(rng, self.spec["fog"]),
+            wetness=draw(rng, self.spec["wetness"]),
+            time_of_day=draw(rng, self.spec["time_of_day"]),
+            npc_models=[draw(rng, self.spec["npc_models"]) for _ in range(count)],
+        )
+
+    def config_for(self, idx):
+        """Configuration of the episode frame idx belongs to"""
+        return self.sample(self.episode_seed(idx))
+
+    @staticmethod
+    def apply(sim, config):
+        """Applies weather and time of day in one round trip, NPCs are placed by the caller"""
+        sim.set_environment(lgsvl.WeatherState(config.rain, config.fog, config.wetness), config.time_of_day)
+
+    def to_json(self):
+        return {"spec": self.spec, "seed": self.seed, "episode_length": self.episode_length}
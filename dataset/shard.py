@@ -0,0 +1,272 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+"""
+Sharded, resumable dataset generation
+
+The index range of a dataset is split into contiguous shards, one per simulator
+endpoint. Every shard is generated by its own process into its own KITTI tree
+and keeps an append-only manifest of the frames it completed, together with the
+seed each frame was generated from and the checksums of the written files.
+Restarting a shard skips everything its manifest already lists, so a crashed
+simulator only costs the frames that were in flight. Finished shards are merged
+into a single KITTI tree.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+
+from dataset.encoding import ImageEncoder
+from dataset.export import LabelExporter, discard_frames
+from dataset.kitti import Calibration, KittiLayout, KittiParser, link_or_copy
+from dataset.sampler import derive_seed
+
+MANIFEST = "manifest.jsonl"
+
+
+# Seed of a frame, independent of the shard (and endpoint) that generates it
+def frame_seed(base_seed, idx):
+    return derive_seed(base_seed, idx)
+
+
+# Splits [start, start + count) into contiguous ranges of nearly equal size
+def split_range(start, count, shards):
+    bounds = [start + count * i // shards for i in range(shards + 1)]
+    return [range(bounds[i], bounds[i + 1]) for i in range(shards)]
+
+
+# Parses "host:port" (or "host" using the default port)
+def parse_endpoint(endpoint, default_port=8181):
+    host, _, port = endpoint.partition(":")
+    return host, int(port) if port else default_port
+
+
+def file_checksum(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class Manifest(object):
+    """
+    Append-only record of completed frames, one JSON object per line:
+    {"idx": ..., "seed": ..., "time": ..., "frame": ..., "files": {path: sha1}, "bytes": ..., "encode_time": ..., "rig": rig hash,
+     "environment": sampled configuration or None}
+    A partially written last line (crash while appending) is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        self.entries = {}
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry["idx"]] = entry
+
+    def __contains__(self, idx):
+        return idx in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, frame):
+        entry = {"idx": frame.idx, "seed": frame.seed, "time": frame.time, "frame": frame.frame, "files": frame.checksums,
+            "bytes": frame.bytes_written, "encode_time": frame.encode_time, "rig": frame.rig_hash,
+            "environment": frame.environment}
+        self.append(entry)
+
+    def append(self, entry):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[entry["idx"]] = entry
+
+    # Returns indices whose files are missing or do not match the recorded checksums
+    def verify(self, base_path):
+        invalid = []
+        for idx, entry in sorted(self.entries.items()):
+            for name, checksum in entry["files"].items():
+                path = os.path.join(base_path, name)
+                if not os.path.exists(path) or file_checksum(path) != checksum:
+                    invalid.append(idx)
+                    break
+        return invalid
+
+    def discard(self, indices):
+        for idx in indices:
+            self.entries.pop(idx, None)
+        self.rewrite()
+
+    def rewrite(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for _, entry in sorted(self.entries.items()):
+                f.write(json.dumps(entry, sort_keys=True) + "\n")
+        os.replace(tmp, self.path)
+
+
+class Shard(object):
+    """Frames of one index range, generated by one simulator endpoint into base_path"""
+
+    def __init__(self, name, indices, endpoint, base_path, seed=0):
+        self.name = name
+        self.indices = indices
+        self.endpoint = endpoint
+        self.base_path = base_path
+        self.seed = seed
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.base_path, MANIFEST)
+
+    def pending(self, verify=False):
+        if not os.path.exists(self.manifest_path):
+            return list(self.indices)
+        manifest = Manifest(self.manifest_path)
+        if verify:
+            invalid = manifest.verify(self.base_path)
+            if invalid:
+                print("{}: {} frames failed verification, regenerating".format(self.name, len(invalid)))
+                manifest.discard(invalid)
+        return [idx for idx in self.indices if idx not in manifest]
+
+    def run(self, scene_name, agent_name, workers=2, queue_size=8, verify=False, encoder=None, capture_encoding="raw", sampler=None,
+            label_formats=()):
+        layout = KittiLayout(self.base_path)
+        layout.makedirs()
+        pending = self.pending(verify)
+        print("{}: {} of {} frames pending".format(self.name, len(pending), len(self.indices)))
+        if not pending:
+            return None
+
+        address, port = self.endpoint
+        parser = KittiParser(scene_name, agent_name, pending[0], address, port, capture_encoding, sampler)
+        parser.bootstrap()
+        layout.write_rig(parser.calibration)
+        if sampler is not None:
+            layout.write_sampler(sampler)
+        manifest = Manifest(self.manifest_path)
+        sinks = [parser.writer_stats.add]
+        exporter = None
+        if label_formats:
+            # frames are recorded once their labels are exported, so a resumed run regenerates unexported frames;
+            # labels a crashed or discarded attempt left for them are removed first
+            discard_frames(self.base_path, pending)
+            exporter = LabelExporter(self.base_path, parser.calibration, label_formats, (encoder or ImageEncoder()).ext,
+                on_flush=manifest.record)
+            sinks.append(exporter.add)
+        else:
+            sinks.append(manifest.record)
+
+        pipeline = parser.pipeline(layout, workers, queue_size, encoder)
+        try:
+            pipeline.run(parser.frames_for(pending, lambda idx: frame_seed(self.seed, idx)), sink=sinks)
+        finally:
+            if exporter is not None:
+                exporter.close()
+        print("{}:\n{}\n{}\n{}".format(self.name, pipeline.report(), parser.placement_stats, parser.writer_stats))
+        return pipeline
+
+
+def _run_shard(shard, scene_name, agent_name, workers, queue_size, verify, encoder, capture_encoding, sampler, label_formats):
+    shard.run(scene_name, agent_name, workers, queue_size, verify, encoder, capture_encoding, sampler, label_formats)
+
+
+def plan(endpoints, start, count, base_path, seed=0):
+    """Returns one Shard per endpoint ("host:port" strings), each in base_path/shards/<name>"""
+    shards = []
+    for i, (endpoint, indices) in enumerate(zip(endpoints, split_range(start, count, len(endpoints)))):
+        name = "shard_{:03d}".format(i)
+        shards.append(Shard(name, indices, parse_endpoint(endpoint), os.path.join(base_path, "shards", name), seed))
+    return shards
+
+
+def run_shards(shards, scene_name, agent_name, workers=2, queue_size=8, verify=False, encoder=None, capture_encoding="raw", sampler=None,
+        label_formats=()):
+    """
+    Generates every shard in its own process. Shards that fail (for example because
+    their simulator crashed) can be resumed by running them again.
+    Returns the names of the failed shards.
+    """
+    processes = []
+    for shard in shards:
+        p = multiprocessing.Process(target=_run_shard, name=shard.name,
+            args=(shard, scene_name, agent_name, workers, queue_size, verify, encoder, capture_encoding, sampler, label_formats))
+        p.start()
+        processes.append((shard, p))
+
+    failed = []
+    for shard, p in processes:
+        p.join()
+        if p.exitcode != 0:
+            failed.append(shard.name)
+    return failed
+
+
+def merge(shards, base_path, link=True, verify=True):
+    """
+    Merges the shard trees into one KITTI tree at base_path, with a combined manifest.
+    Files are hard linked when link is True and the file system allows it, copied otherwise.
+    Returns the merged Manifest.
+    """
+    layout = KittiLayout(base_path)
+    layout.makedirs()
+    merged = Manifest(os.path.join(base_path, MANIFEST))
+    # label parts are linked again from the shards below, parts a shard has since rewritten or removed must not stay
+    merged_labels = os.path.join(base_path, "labels")
+    if os.path.isdir(merged_labels):
+        for name in os.listdir(merged_labels):
+            if name.startswith("part-"):
+                os.remove(os.path.join(merged_labels, name))
+    for shard in shards:
+        if not os.path.exists(shard.manifest_path):
+            continue
+        manifest = Manifest(shard.manifest_path)
+        if verify:
+            invalid = manifest.verify(shard.base_path)
+            if invalid:
+                raise RuntimeError("{}: frames {} failed verification".format(shard.name, invalid))
+        for rig in shard_rigs(shard.base_path):
+            layout.write_rig(rig)
+        if os.path.exists(os.path.join(shard.base_path, "sampler.json")):
+            link_or_copy(os.path.join(shard.base_path, "sampler.json"), os.path.join(base_path, "sampler.json"), link=False)
+        labels = os.path.join(shard.base_path, "labels")
+        if os.path.isdir(labels):
+            os.makedirs(os.path.join(base_path, "labels"), exist_ok=True)
+            for name in os.listdir(labels):
+                if name.startswith("part-") and not name.endswith(".tmp"):
+                    link_or_copy(os.path.join(labels, name), os.path.join(base_path, "labels", name), link)
+        for idx, entry in sorted(manifest.entries.items()):
+            if idx in merged:
+                continue
+            for name in entry["files"]:
+                link_or_copy(os.path.join(shard.base_path, name), os.path.join(base_path, name), link)
+            merged.entries[idx] = entry
+    merged.rewrite()
+    return merged
+
+
+# Calibrations of the rigs a shard was generated with
+def shard_rigs(base_path):
+    path = os.path.join(base_path, "rig.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        rigs = json.load(f)
+    return [Calibration.from_json(j) for j in rigs.values()]
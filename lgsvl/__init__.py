@@ -6,6 +6,7 @@
 
 from .geometry import Vector, BoundingBox, Transform
 from .simulator import Simulator, RaycastHit, WeatherState
-from .sensor import Sensor, CameraSensor, LidarSensor, ImuSensor
-from .agent import AgentType, VehicleControl, AgentState, Vehicle, EgoVehicle, NpcVehicle, Pedestrian, DriveWaypoint, WalkWaypoint, NPCControl
+from .sensor import Sensor, CameraSensor, LidarSensor, ImuSensor, SensorRig
+from .buffer import SensorBuffer, SensorReading, snapshot
+from .agent import AgentType, VehicleControl, AgentState, Vehicle, EgoVehicle, NpcVehicle, Pedestrian, DriveWaypoint, WalkWaypoint, NPCControl, CaptureBundle, GroundTruth
 from .controllable import Controllable
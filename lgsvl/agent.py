@@ -5,7 +5,8 @@
 #
 
 from .geometry import Vector, Transform, BoundingBox
-from .sensor import Sensor
+from .remote import BinaryFrame
+from .sensor import Sensor, SensorRig
 from .utils import accepts
 
 from enum import Enum
@@ -13,6 +14,10 @@ from collections import namedtuple
 from collections.abc import Iterable, Callable
 import math
 
+CaptureBundle = namedtuple("CaptureBundle", "time frame sensors agents")
+
+GroundTruth = namedtuple("GroundTruth", "agent state bounding_box")
+
 class DriveWaypoint:
   def __init__(self, position, speed, angle = Vector(0,0,0), idle = 0, deactivate = False, trigger_distance = 0):
     self.position = position
@@ -121,7 +126,12 @@ class Agent:
   @state.setter
   @accepts(AgentState)
   def state(self, state):
-    self.remote.command("agent/state/set", {
+    self.remote.command(*self.state_command(state))
+
+  @accepts(AgentState)
+  def state_command(self, state):
+    '''(command, arguments) that sets the state, to be sent later (see Simulator.batch)'''
+    return ("agent/state/set", {
       "uid": self.uid,
       "state": state.to_json()
     })
@@ -168,6 +178,8 @@ class Vehicle(Agent):
 class EgoVehicle(Vehicle):
   def __init__(self, uid, simulator):
     super().__init__(uid, simulator)
+    self._sensors = None
+    self._sensor_rig = None
 
   @property
   def bridge_connected(self):
@@ -178,9 +190,88 @@ class EgoVehicle(Vehicle):
     if port <= 0 or port > 65535: raise ValueError("port value is out of range")
     self.remote.command("vehicle/bridge/connect", {"uid": self.uid, "address": address, "port": port})
 
-  def get_sensors(self):
-    j = self.remote.command("vehicle/sensors/get", {"uid": self.uid})
-    return [Sensor.create(self.remote, sensor) for sensor in j]
+  @accepts(bool)
+  def get_sensors(self, refresh = False):
+    '''Returns the sensors of this vehicle
+
+    Sensors, their mount transforms and static parameters come in a single
+    reply and are cached; pass refresh=True after the sensor configuration
+    of the vehicle has changed. This is the only invalidation: Sensors returned
+    earlier, and the SensorRig built from them, keep their cached transforms.
+    '''
+    if self._sensors is None or refresh:
+      j = self.remote.command("vehicle/sensors/get", {"uid": self.uid})
+      self._sensors = [Sensor.create(self.remote, sensor) for sensor in j]
+      self._sensor_rig = None
+    return list(self._sensors)
+
+  @property
+  def sensor_rig(self):
+    '''SensorRig with the extrinsics between all sensors of this vehicle'''
+    if self._sensor_rig is None:
+      self._sensor_rig = SensorRig(self.get_sensors())
+    return self._sensor_rig
+
+  def capture(self, sensors = None, ground_truth = True, encoding = "raw"):
+    '''Captures sensor data and ground truth of a single simulation frame
+
+    The simulator holds the frame while all requested sensors and agent states
+    are collected, so everything in the result belongs to the same instant.
+
+    Parameters
+    ----------
+    sensors : list of Sensors
+      sensors of this vehicle to capture (all sensors if None)
+
+    ground_truth : bool
+      whether states and bounding boxes of all agents should be included
+
+    encoding : str
+      camera image encoding, see CameraSensor.capture
+
+    Returns
+    -------
+    CaptureBundle (time, frame, sensors, agents)
+      sensors : dict mapping each Sensor to its data (as returned by its capture or data)
+      agents : dict mapping agent uid to GroundTruth (agent, state, bounding_box),
+        agent is None for agents not created by this client
+    '''
+    if sensors is None:
+      sensors = self.get_sensors()
+    if not isinstance(ground_truth, bool):
+      raise TypeError("Argument 'ground_truth' should have '{}' type".format(bool))
+    if encoding not in ("jpg", "png", "raw"):
+      raise ValueError("unsupported encoding '{}'".format(encoding))
+    result = self.remote.command("vehicle/capture", {
+      "uid": self.uid,
+      "sensors": [sensor.uid for sensor in sensors],
+      "ground_truth": ground_truth,
+      "encoding": encoding,
+    })
+
+    if isinstance(result, BinaryFrame):
+      header, payload = result
+    else:
+      header, payload = result, b""
+
+    by_uid = {sensor.uid: sensor for sensor in sensors}
+    data = {}
+    for j in header["sensors"]:
+      sensor = by_uid[j["uid"]]
+      if "data" in j:
+        data[sensor] = sensor._parse(j["data"])
+      else:
+        data[sensor] = sensor._parse(BinaryFrame(j, payload[j["offset"]:j["offset"] + j["length"]]))
+
+    agents = {}
+    for j in header.get("agents", []):
+      agents[j["uid"]] = GroundTruth(
+        self.simulator.agents.get(j["uid"]),
+        AgentState.from_json(j["state"]),
+        BoundingBox.from_json(j["bounding_box"]),
+      )
+
+    return CaptureBundle(header["time"], header["frame"], data, agents)
 
   @accepts(bool, float)
   def set_fixed_speed(self, isCruise, speed=None):
@@ -188,6 +279,11 @@ class EgoVehicle(Vehicle):
 
   @accepts(VehicleControl, bool)
   def apply_control(self, control, sticky = False):
+    self.remote.command(*self.control_command(control, sticky))
+
+  @accepts(VehicleControl, bool)
+  def control_command(self, control, sticky = False):
+    '''(command, arguments) of apply_control, to be sent later (see Simulator.batch)'''
     args = {
       "uid": self.uid,
       "sticky": sticky,
@@ -207,7 +303,7 @@ class EgoVehicle(Vehicle):
       args["control"]["turn_signal_left"] = control.turn_signal_left
     if control.turn_signal_right is not None:
       args["control"]["turn_signal_right"] = control.turn_signal_right
-    self.remote.command("vehicle/apply_control", args)
+    return ("vehicle/apply_control", args)
 
   def on_custom(self, fn):
     self.simulator._add_callback(self, "custom", fn)
@@ -259,14 +355,28 @@ class NpcVehicle(Vehicle):
     })
 
   def follow_closest_lane(self, follow, max_speed, isLaneChange=True):
-    self.remote.command("vehicle/follow_closest_lane", {"uid": self.uid, "follow": follow, "max_speed": max_speed, "isLaneChange": isLaneChange})
+    self.remote.command(*self.follow_closest_lane_command(follow, max_speed, isLaneChange))
+
+  def follow_closest_lane_command(self, follow, max_speed, isLaneChange=True):
+    '''(command, arguments) of follow_closest_lane, to be sent later (see Simulator.batch)'''
+    return ("vehicle/follow_closest_lane", {"uid": self.uid, "follow": follow, "max_speed": max_speed, "isLaneChange": isLaneChange})
 
   @accepts(bool)
   def change_lane(self, isLeftChange):
-    self.remote.command("vehicle/change_lane", {"uid": self.uid, "isLeftChange": isLeftChange})
+    self.remote.command(*self.change_lane_command(isLeftChange))
+
+  @accepts(bool)
+  def change_lane_command(self, isLeftChange):
+    '''(command, arguments) of change_lane, to be sent later (see Simulator.batch)'''
+    return ("vehicle/change_lane", {"uid": self.uid, "isLeftChange": isLeftChange})
 
   @accepts(NPCControl)
   def apply_control(self, control):
+    self.remote.command(*self.control_command(control))
+
+  @accepts(NPCControl)
+  def control_command(self, control):
+    '''(command, arguments) of apply_control, to be sent later (see Simulator.batch)'''
     args = {
       "uid": self.uid,
       "control":{}
@@ -287,7 +397,7 @@ class NpcVehicle(Vehicle):
     if control.target_speed is not None:
       args["control"]["target_speed"] = control.target_speed
 
-    self.remote.command("vehicle/apply_npc_control", args)
+    return ("vehicle/apply_npc_control", args)
 
   def on_waypoint_reached(self, fn):
     self.remote.command("agent/on_waypoint_reached", {"uid": self.uid})
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+from collections import namedtuple
+import threading
+
+import numpy as np
+
+SensorReading = namedtuple("SensorReading", "time frame data")
+
+
+class SensorBuffer:
+  '''Fixed size ring buffer of sensor readings stamped with simulation time and frame
+
+  Readings are appended by the connection thread as the simulator pushes them,
+  so all accessors are safe to call from other threads.
+  '''
+  def __init__(self, size):
+    if size <= 0: raise ValueError("buffer size should be positive")
+    self.size = size
+    self.times = np.zeros(size)
+    self.frames = np.zeros(size, dtype=np.int64)
+    self.data = [None] * size
+    self.count = 0
+    self.head = 0 # index of the next write
+    self.cv = threading.Condition()
+
+  def __len__(self):
+    return self.count
+
+  def append(self, time, frame, data):
+    with self.cv:
+      self.times[self.head] = time
+      self.frames[self.head] = frame
+      self.data[self.head] = data
+      self.head = (self.head + 1) % self.size
+      self.count = min(self.count + 1, self.size)
+      self.cv.notify_all()
+
+  def clear(self):
+    with self.cv:
+      self.data = [None] * self.size
+      self.count = 0
+      self.head = 0
+
+  def _order(self):
+    return (self.head - self.count + np.arange(self.count)) % self.size
+
+  def _reading(self, i):
+    return SensorReading(float(self.times[i]), int(self.frames[i]), self.data[i])
+
+  def latest(self):
+    '''Returns the most recent reading, or None if nothing was received yet'''
+    with self.cv:
+      if self.count == 0:
+        return None
+      return self._reading((self.head - 1) % self.size)
+
+  def since(self, time):
+    '''Returns all buffered readings newer than the given simulation time, oldest first'''
+    with self.cv:
+      order = self._order()
+      start = np.searchsorted(self.times[order], time, side="right")
+      return [self._reading(i) for i in order[start:]]
+
+  def at(self, time):
+    '''Returns the newest reading taken at or before the given simulation time'''
+    with self.cv:
+      order = self._order()
+      end = np.searchsorted(self.times[order], time, side="right")
+      if end == 0:
+        return None
+      return self._reading(order[end - 1])
+
+  def wait_for(self, frame, timeout = None):
+    '''Blocks until a reading of the given frame (or later) arrives, returns it or None on timeout'''
+    with self.cv:
+      ready = self.cv.wait_for(lambda: self.count > 0 and self.frames[(self.head - 1) % self.size] >= frame, timeout)
+      if not ready:
+        return None
+      return self._reading((self.head - 1) % self.size)
+
+
+def snapshot(sensors, tolerance = None):
+  '''Returns time aligned readings of several subscribed sensors
+
+  The reference time is the newest time every sensor has reached; each sensor
+  contributes its newest reading at or before it.
+
+  Parameters
+  ----------
+  sensors : list of subscribed Sensors (or SensorBuffers)
+
+  tolerance : float
+    maximum spread of reading times in seconds (ignored if None)
+
+  Returns
+  -------
+  dict mapping each sensor to its SensorReading, or None if some sensor has
+  no reading yet or the readings are further apart than tolerance
+  '''
+  buffers = [getattr(sensor, "buffer", sensor) for sensor in sensors]
+  if any(b is None for b in buffers):
+    raise ValueError("all sensors should be subscribed")
+  latest = [b.latest() for b in buffers]
+  if any(r is None for r in latest):
+    return None
+  reference = min(r.time for r in latest)
+  readings = [b.at(reference) for b in buffers]
+  if any(r is None for r in readings):
+    return None
+  if tolerance is not None and reference - min(r.time for r in readings) > tolerance:
+    return None
+  return dict(zip(sensors, readings))
@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import io
+import os
+
+import numpy as np
+
+# Point layout used by the simulator for lidar point clouds (PCD files and binary frames)
+POINT_DTYPE = np.dtype([
+  ("x", "<f4"),
+  ("y", "<f4"),
+  ("z", "<f4"),
+  ("intensity", "u1"),
+])
+
+PCD_TYPES = {
+  ("F", 4): "<f4", ("F", 8): "<f8",
+  ("U", 1): "u1", ("U", 2): "<u2", ("U", 4): "<u4", ("U", 8): "<u8",
+  ("I", 1): "i1", ("I", 2): "<i2", ("I", 4): "<i4", ("I", 8): "<i8",
+}
+
+
+def read_header(f):
+  '''Reads the PCD header, leaving the file positioned at the start of the point data
+
+  Returns the header as a dict of strings and the byte offset of the point data
+  '''
+  header = {}
+  offset = 0
+  while True:
+    ln = f.readline()
+    if not ln:
+      raise ValueError("PCD header is missing DATA field")
+    offset += len(ln)
+    ln = ln.strip()
+    if not ln or ln.startswith(b"#"):
+      continue
+    field = ln.decode("ascii").split(" ", 1)
+    header[field[0]] = field[1] if len(field) > 1 else ""
+    if field[0] == "DATA":
+      return header, offset
+
+
+def header_dtype(header):
+  fields = header["FIELDS"].split()
+  sizes = [int(s) for s in header["SIZE"].split()]
+  types = header["TYPE"].split()
+  counts = [int(c) for c in header["COUNT"].split()] if "COUNT" in header else [1] * len(fields)
+  dtype = []
+  for name, size, kind, count in zip(fields, sizes, types, counts):
+    if (kind, size) not in PCD_TYPES:
+      raise ValueError("PCD field '{}' has unsupported type {}{}".format(name, kind, size))
+    dtype.append((name, PCD_TYPES[(kind, size)]) if count == 1 else (name, PCD_TYPES[(kind, size)], (count,)))
+  return np.dtype(dtype)
+
+
+def read(source, mmap = True):
+  '''Reads a PCD file into a structured numpy array
+
+  Parameters
+  ----------
+  source : str or binary file object
+    path to a PCD file, or a file opened in binary mode
+
+  mmap : bool
+    memory map binary point data instead of reading it (only for paths)
+
+  Returns
+  -------
+  numpy structured array with one field per PCD field
+  '''
+  if isinstance(source, (str, os.PathLike)):
+    with open(source, "rb") as f:
+      header, offset = read_header(f)
+      if mmap and header["DATA"] == "binary":
+        dtype = header_dtype(header)
+        count = int(header["POINTS"])
+        if count == 0:
+          return np.zeros(0, dtype)
+        return np.memmap(source, dtype, mode="r", offset=offset, shape=(count,))
+      return read_points(f, header)
+  header, _ = read_header(source)
+  return read_points(source, header)
+
+
+def read_points(f, header):
+  dtype = header_dtype(header)
+  count = int(header["POINTS"])
+  if header["DATA"] == "binary":
+    buf = f.read(count * dtype.itemsize)
+    if len(buf) < count * dtype.itemsize:
+      raise ValueError("PCD file is truncated: expected {} points".format(count))
+    return np.frombuffer(buf, dtype, count)
+  if header["DATA"] == "ascii":
+    text = io.TextIOWrapper(f, encoding="ascii")
+    try:
+      return np.loadtxt(text, dtype=dtype, max_rows=count, ndmin=1)
+    finally:
+      text.detach()
+  raise ValueError("PCD data format '{}' is not supported".format(header["DATA"]))
+
+
+def write(path, points, binary = True):
+  '''Writes a structured numpy array (for example POINT_DTYPE) as a PCD file'''
+  points = np.asarray(points)
+  if points.dtype.names is None:
+    raise TypeError("points should be a structured array")
+  kinds = {"f": "F", "u": "U", "i": "I"}
+  fields, sizes, types, counts = [], [], [], []
+  for name in points.dtype.names:
+    base, shape = points.dtype[name].base, points.dtype[name].shape
+    if base.kind not in kinds:
+      raise TypeError("field '{}' has unsupported type {}".format(name, base))
+    fields.append(name)
+    sizes.append(str(base.itemsize))
+    types.append(kinds[base.kind])
+    counts.append(str(int(np.prod(shape)) if shape else 1))
+
+  header = "\n".join([
+    "VERSION 0.7",
+    "FIELDS " + " ".join(fields),
+    "SIZE " + " ".join(sizes),
+    "TYPE " + " ".join(types),
+    "COUNT " + " ".join(counts),
+    "WIDTH {}".format(len(points)),
+    "HEIGHT 1",
+    "VIEWPOINT 0 0 0 1 0 0 0",
+    "POINTS {}".format(len(points)),
+    "DATA {}".format("binary" if binary else "ascii"),
+  ]) + "\n"
+
+  with open(path, "wb") as f:
+    f.write(header.encode("ascii"))
+    if binary:
+      little = np.dtype([(name, points.dtype[name].newbyteorder("<")) for name in points.dtype.names])
+      f.write(points.astype(little, copy=False).tobytes())
+    else:
+      columns, fmt = [], []
+      for name in points.dtype.names:
+        column = points[name].reshape(len(points), -1)
+        columns.append(column.astype(np.float64))
+        fmt += ["%.9g" if column.dtype.kind == "f" else "%d"] * column.shape[1]
+      np.savetxt(f, np.hstack(columns), fmt=fmt)
+
+
+def to_xyzi(points, intensity_scale = 1.0 / 255):
+  '''Converts lidar points to an (N, 4) float32 array of x, y, z and scaled intensity'''
+  out = np.empty((len(points), 4), dtype=np.float32)
+  out[:, 0] = points["x"]
+  out[:, 1] = points["y"]
+  out[:, 2] = points["z"]
+  np.multiply(points["intensity"], intensity_scale, out=out[:, 3], casting="unsafe")
+  return out
@@ -8,6 +8,32 @@ import threading
 import websockets
 import asyncio
 import json
+import logging
+import struct
+
+from collections import namedtuple
+
+# Binary websocket messages carry bulk sensor data next to a regular reply:
+#   uint32 (little endian) header size | utf-8 JSON header | raw payload
+# The header is the same object a text reply would contain ("result" or "error").
+BinaryFrame = namedtuple("BinaryFrame", "header payload")
+
+def decode_binary_frame(data):
+  (size,) = struct.unpack_from("<I", data, 0)
+  header = json.loads(bytes(data[4:4 + size]).decode("utf-8"))
+  payload = memoryview(data)[4 + size:]
+  if "result" in header:
+    header["result"] = BinaryFrame(header["result"], payload)
+  return header
+
+def encode_binary_frame(header, payload):
+  j = json.dumps(header).encode("utf-8")
+  return struct.pack("<I", len(j)) + j + bytes(payload)
+
+def is_unknown_command(error, name):
+  # the simulator replies to a command it does not implement with an error naming it
+  message = str(error)
+  return name in message and "unknown" in message.lower()
 
 class Remote(threading.Thread):
 
@@ -18,6 +44,7 @@ class Remote(threading.Thread):
     self.episode_cv = threading.Condition()
     self.cv = threading.Condition() 
     self.data = None
+    self.subscribers = {}
     self.sem = threading.Semaphore(0)
     self.running = True
     self.start()
@@ -50,11 +77,22 @@ class Remote(threading.Thread):
           self.cv.notify()
         break   
      
+      if isinstance(data, bytes):
+        message = decode_binary_frame(data)
+      else:
+        message = json.loads(data)
+      if type(message) is dict and message.get("type") == "sensor":
+        self.dispatch(message)
+        continue
+
       try:
         self.cv.acquire()
-        self.data = json.loads(data)
+        self.data = message
         if "error" in self.data:
-          break
+          # the command waiting for this reply raises, later commands are still answered
+          self.cv.notify()
+          self.cv_released_already = False
+          continue
         if type(self.data) is dict and self.data["result"] is not None and type(self.data["result"]) is dict and "type" in self.data["result"] and self.data["result"]["type"] == "episode":   
       #  if type(self.data) is dict and next(iter(self.data)) == "result" and "type" in self.data["result"] and self.data["result"]["type"] == "episode":   
           self.cv.release()
@@ -75,6 +113,24 @@ class Remote(threading.Thread):
       
     await self.websocket.close()
 
+  # Readings pushed by the simulator for subscribed sensors are not replies to a command:
+  # {"type": "sensor", "uid": ..., "time": ..., "frame": ..., "result": ...}
+  # they are handed to the subscriber of that sensor on this thread, errors raised by the
+  # subscriber are logged so that replies to commands keep being received
+  def subscribe(self, uid, fn):
+    self.subscribers[uid] = fn
+
+  def unsubscribe(self, uid):
+    self.subscribers.pop(uid, None)
+
+  def dispatch(self, message):
+    fn = self.subscribers.get(message["uid"])
+    if fn is not None:
+      try:
+        fn(message)
+      except Exception:
+        logging.getLogger(__name__).exception("subscriber of sensor %s failed", message["uid"])
+
   def command(self, name, args = {}):
     if not self.websocket:
       raise Exception("Not connected")
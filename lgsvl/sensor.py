@@ -4,10 +4,16 @@
 # This software contains code licensed as described in LICENSE.
 #
 
+from .buffer import SensorBuffer
 from .geometry import Transform
-from .utils import accepts
+from .pcd import POINT_DTYPE
+from .remote import BinaryFrame
+from .utils import accepts, transform_to_matrix
 
 from collections import namedtuple
+import io
+
+import numpy as np
 
 GpsData = namedtuple("GpsData", "latitude longitude northing easting altitude orientation")
 
@@ -16,11 +22,21 @@ class Sensor:
     self.remote = remote
     self.uid = uid
     self.name = name
+    self.buffer = None
+    self._transform = None
     
   @property
   def transform(self):
-    j = self.remote.command("sensor/transform/get", {"uid": self.uid})
-    return Transform.from_json(j)
+    '''Mount transform relative to the vehicle
+
+    Read once and cached for the life of this Sensor. Nothing invalidates it: after
+    the sensor configuration of the vehicle has changed, EgoVehicle.get_sensors(refresh=True)
+    returns new Sensor instances (and a new sensor_rig) with the current mounts.
+    '''
+    if self._transform is None:
+      j = self.remote.command("sensor/transform/get", {"uid": self.uid})
+      self._transform = Transform.from_json(j)
+    return self._transform
 
   @property
   def enabled(self):
@@ -31,6 +47,32 @@ class Sensor:
   def enabled(self, value):
     self.remote.command("sensor/enabled/set", {"uid": self.uid, "enabled": value})
 
+  @accepts(int)
+  def subscribe(self, buffer_size = 16):
+    '''Makes the simulator push readings of this sensor at its native frequency
+
+    Readings are kept in a ring buffer of buffer_size entries stamped with
+    simulation time and frame, see SensorBuffer.latest, since and wait_for.
+    Returns the buffer, also available as sensor.buffer.
+    '''
+    return self._subscribe(buffer_size, {"uid": self.uid})
+
+  def _subscribe(self, buffer_size, args):
+    self.buffer = SensorBuffer(buffer_size)
+    self.remote.subscribe(self.uid, self._on_reading)
+    self.remote.command("sensor/subscribe", args)
+    return self.buffer
+
+  def unsubscribe(self):
+    self.remote.command("sensor/unsubscribe", {"uid": self.uid})
+    self.remote.unsubscribe(self.uid)
+
+  def _on_reading(self, message):
+    self.buffer.append(message["time"], message["frame"], self._parse(message["result"]))
+
+  def _parse(self, result):
+    return result
+
   def __eq__(self, other):
     return self.uid == other.uid
 
@@ -40,18 +82,22 @@ class Sensor:
   @staticmethod
   def create(remote, j):
     if j["type"] == "camera":
-      return CameraSensor(remote, j)
-    if j["type"] == "lidar":
-      return LidarSensor(remote, j)
-    if j["type"] == "imu":
-      return ImuSensor(remote, j)
-    if j["type"] == "gps":
-      return GpsSensor(remote, j)
-    if j["type"] == "radar":
-      return RadarSensor(remote, j)
-    if j["type"] == "canbus":
-      return CanBusSensor(remote, j)
-    raise ValueError("Sensor type '{}' not supported".format(j["type"]))
+      sensor = CameraSensor(remote, j)
+    elif j["type"] == "lidar":
+      sensor = LidarSensor(remote, j)
+    elif j["type"] == "imu":
+      sensor = ImuSensor(remote, j)
+    elif j["type"] == "gps":
+      sensor = GpsSensor(remote, j)
+    elif j["type"] == "radar":
+      sensor = RadarSensor(remote, j)
+    elif j["type"] == "canbus":
+      sensor = CanBusSensor(remote, j)
+    else:
+      raise ValueError("Sensor type '{}' not supported".format(j["type"]))
+    if "transform" in j:
+      sensor._transform = Transform.from_json(j["transform"])
+    return sensor
 
 
 class CameraSensor(Sensor):
@@ -80,6 +126,80 @@ class CameraSensor(Sensor):
     })
     return success
 
+  @accepts(str, int, int, bool)
+  def capture(self, encoding = "png", quality = 75, compression = 6, decode = False):
+    '''Returns the current camera image without going through the filesystem
+
+    The image is transferred as a binary websocket frame.
+
+    Parameters
+    ----------
+    encoding : str
+      "jpg", "png" or "raw" (unencoded pixels, no encode/decode cost)
+
+    quality : int
+      JPEG quality, ignored for other encodings
+
+    compression : int
+      PNG compression level, ignored for other encodings
+
+    decode : bool
+      whether encoded images should be decoded (requires PIL)
+
+    Returns
+    -------
+    bytes with the encoded image, or numpy.ndarray of uint8 with shape
+    (height, width, 3) (or (height, width) for single channel formats)
+    for raw and decoded images
+    '''
+    if encoding not in ("jpg", "png", "raw"):
+      raise ValueError("unsupported encoding '{}'".format(encoding))
+    frame = self.remote.command("sensor/camera/capture", {
+      "uid": self.uid,
+      "encoding": encoding,
+      "quality": quality,
+      "compression": compression,
+    })
+    return self._parse(frame, decode)
+
+  @accepts(int, str, int, int)
+  def subscribe(self, buffer_size = 16, encoding = "raw", quality = 75, compression = 6):
+    '''Subscribes to camera images, see Sensor.subscribe and CameraSensor.capture
+
+    Buffered images are numpy arrays for raw encoding and encoded bytes otherwise.
+    '''
+    if encoding not in ("jpg", "png", "raw"):
+      raise ValueError("unsupported encoding '{}'".format(encoding))
+    return self._subscribe(buffer_size, {
+      "uid": self.uid,
+      "encoding": encoding,
+      "quality": quality,
+      "compression": compression,
+    })
+
+  def _parse(self, frame, decode = False):
+    if not isinstance(frame, BinaryFrame):
+      raise ValueError("camera image should be sent as a binary frame")
+    header = frame.header
+    if header["encoding"] == "raw":
+      channels = header.get("channels", 3)
+      shape = (header["height"], header["width"], channels) if channels > 1 else (header["height"], header["width"])
+      return np.frombuffer(frame.payload, np.uint8).reshape(shape)
+    if not decode:
+      return bytes(frame.payload)
+    return decode_image(frame.payload)
+
+
+def decode_image(data):
+  try:
+    from PIL import Image
+  except ImportError:
+    raise ImportError("PIL is required to decode camera images, use encoding 'raw' instead")
+  with Image.open(io.BytesIO(data)) as im:
+    if im.mode not in ("RGB", "L"):
+      im = im.convert("RGB")
+    return np.asarray(im)
+
 
 class LidarSensor(Sensor):
   def __init__(self, remote, j):
@@ -101,6 +221,23 @@ class LidarSensor(Sensor):
     })
     return success
 
+  def capture(self):
+    '''Returns the current lidar scan without going through the filesystem
+
+    Returns
+    -------
+    numpy structured array of lgsvl.pcd.POINT_DTYPE (x, y, z, intensity),
+    a read-only view of the received binary frame
+    '''
+    frame = self.remote.command("sensor/lidar/capture", {"uid": self.uid})
+    return self._parse(frame)
+
+  def _parse(self, frame):
+    if not isinstance(frame, BinaryFrame):
+      raise ValueError("lidar points should be sent as a binary frame")
+    count = frame.header.get("points", len(frame.payload) // POINT_DTYPE.itemsize)
+    return np.frombuffer(frame.payload, POINT_DTYPE, count)
+
 
 class ImuSensor(Sensor):
   def __init__(self, remote, j):
@@ -115,6 +252,9 @@ class GpsSensor(Sensor):
   @property
   def data(self):
     j = self.remote.command("sensor/gps/data", {"uid": self.uid})
+    return self._parse(j)
+
+  def _parse(self, j):
     return GpsData(j["latitude"], j["longitude"], j["northing"], j["easting"], j["altitude"], j["orientation"])
 
 
@@ -127,3 +267,47 @@ class CanBusSensor(Sensor):
   def __init__(self, remote, j):
     super().__init__(remote, j["uid"], j["name"])
     self.frequency = j["frequency"]
+
+
+class SensorRig:
+  '''Mount transforms of a vehicle's sensors with all pairwise extrinsics precomputed
+
+  Matrices follow lgsvl.utils.transform_to_matrix: Unity coordinates and row
+  vectors, so a point p (homogeneous row) in the source sensor frame is
+  p @ rig.extrinsic(source, target) in the target sensor frame.
+  '''
+  def __init__(self, sensors):
+    self.sensors = list(sensors)
+    self.by_uid = {}
+    self.by_name = {}
+    for i, sensor in enumerate(self.sensors):
+      self.by_uid[sensor.uid] = i
+      self.by_name.setdefault(sensor.name, i)
+    # sensor frame -> vehicle frame, (N, 4, 4)
+    self.mounts = np.array([transform_to_matrix(sensor.transform) for sensor in self.sensors]).reshape((-1, 4, 4))
+    # mounts are rigid, their inverse is the transposed rotation and the rotated negative translation
+    inverse = np.zeros_like(self.mounts)
+    inverse[:, :3, :3] = self.mounts[:, :3, :3].transpose(0, 2, 1)
+    inverse[:, 3, :3] = -np.einsum("ai,aji->aj", self.mounts[:, 3, :3], self.mounts[:, :3, :3])
+    inverse[:, 3, 3] = 1.0
+    # extrinsics[a, b] maps sensor a frame -> sensor b frame
+    self.extrinsics = np.einsum("aij,bjk->abik", self.mounts, inverse)
+
+  def _index(self, sensor):
+    if isinstance(sensor, Sensor):
+      return self.by_uid[sensor.uid]
+    return self.by_name[sensor]
+
+  def __getitem__(self, name):
+    return self.sensors[self._index(name)]
+
+  def __contains__(self, name):
+    return name in self.by_name
+
+  def mount(self, sensor):
+    '''Returns the 4x4 sensor to vehicle matrix of a Sensor or sensor name'''
+    return self.mounts[self._index(sensor)]
+
+  def extrinsic(self, source, target):
+    '''Returns the 4x4 matrix mapping source sensor coordinates to target sensor coordinates'''
+    return self.extrinsics[self._index(source), self._index(target)]
@@ -4,7 +4,7 @@
 # This software contains code licensed as described in LICENSE.
 #
 
-from .remote import Remote
+from .remote import Remote, is_unknown_command
 from .agent import Agent, AgentType, AgentState
 from .sensor import GpsData
 from .geometry import Vector, Transform
@@ -28,6 +28,7 @@ class Simulator:
     self.agents = {}
     self.callbacks = {}
     self.stopped = False
+    self.batch_supported = True
 
   def close(self):
     self.remote.close()
@@ -165,6 +166,46 @@ class Simulator:
   def set_time_of_day(self, time, fixed = True):
     self.remote.command("environment/time/set", {"time": time, "fixed": fixed})
 
+  def set_environment(self, weather = None, time_of_day = None, fixed = True):
+    '''Sets weather and time of day (either may be None to keep it) with a single round trip'''
+    commands = []
+    if weather is not None:
+      if not isinstance(weather, WeatherState):
+        raise TypeError("Argument 'weather' should have '{}' type".format(WeatherState))
+      commands.append(("environment/weather/set", {"rain": weather.rain, "fog": weather.fog, "wetness": weather.wetness}))
+    if time_of_day is not None:
+      if not isinstance(time_of_day, (int, float)):
+        raise TypeError("Argument 'time_of_day' should have '{}' type".format((int, float)))
+      commands.append(("environment/time/set", {"time": time_of_day, "fixed": fixed}))
+    self.batch(commands)
+
+  def batch(self, commands):
+    '''Sends several commands as one message and returns their results in order
+
+    The simulator executes all of them before it simulates the next frame, so
+    they take effect together. Simulators that reject simulator/batch as an
+    unknown command get the commands one by one instead, and it is not tried
+    again. Any other error is raised, batching stays on.
+
+    Parameters
+    ----------
+    commands : list of (command, arguments) pairs
+
+    Returns
+    -------
+    list of command results
+    '''
+    if len(commands) == 0:
+      return []
+    if self.batch_supported:
+      try:
+        return self.remote.command("simulator/batch", [{"command": c, "arguments": a} for c, a in commands])
+      except Exception as e:
+        if not is_unknown_command(e, "simulator/batch"):
+          raise
+        self.batch_supported = False
+    return [self.remote.command(c, a) for c, a in commands]
+
   def get_spawn(self):
     spawns = self.remote.command("map/spawn/get")
 #    if(spawns is not None and spawns[0] == "spawn"): 
@@ -233,9 +274,14 @@ class Simulator:
       return Transform() 
     return Transform.from_json(j)
 
+  def map_point_on_lane_batch(self, points):
+    '''Batched map_point_on_lane, all points are projected with one round trip (see batch)'''
+    results = self.batch([("map/point_on_lane", {"point": point.to_json()}) for point in points])
+    return [Transform() if j is None else Transform.from_json(j) for j in results]
+
   @accepts(Vector, Vector, int, float)
   def raycast(self, origin, direction, layer_mask = -1, max_distance = float("inf")):
-    hit = self.remote.command("simulator/raycast", {
+    hit = self.remote.command("simulator/raycast", [{
       "origin": origin.to_json(),
       "direction": direction.to_json(),
       "layer_mask": layer_mask,
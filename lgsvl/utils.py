@@ -9,6 +9,8 @@ from .geometry import Vector, Transform
 import math
 import inspect
 
+import numpy as np
+
 def accepts(*types):
   def check_accepts(f):
     assert len(types) + 1 == f.__code__.co_argcount
@@ -44,6 +46,30 @@ def transform_to_matrix(tr):
            [ px, py, pz, 1.0 ],
          ]
 
+def transforms_to_matrices(position, rotation):
+  '''Batched transform_to_matrix
+
+  position and rotation (in degrees) are (N, 3) arrays, returns (N, 4, 4) matrices
+  '''
+  position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+  angles = np.radians(np.asarray(rotation, dtype=np.float64).reshape(-1, 3))
+  sx, sy, sz = np.sin(angles).T
+  cx, cy, cz = np.cos(angles).T
+
+  m = np.zeros((len(position), 4, 4))
+  m[:, 0, 0] = sx * sy * sz + cy * cz
+  m[:, 0, 1] = cx * sz
+  m[:, 0, 2] = sx * cy * sz - sy * cz
+  m[:, 1, 0] = sx * sy * cz - cy * sz
+  m[:, 1, 1] = cx * cz
+  m[:, 1, 2] = sy * sz + sx * cy * cz
+  m[:, 2, 0] = cx * sy
+  m[:, 2, 1] = -sx
+  m[:, 2, 2] = cx * cy
+  m[:, 3, :3] = position
+  m[:, 3, 3] = 1.0
+  return m
+
 def transform_to_forward(tr):
   ax = tr.rotation.x * math.pi / 180.0
   sx, cx = math.sin(ax), math.cos(ax)
@@ -23,8 +23,11 @@ import py_trees
 import lgsvl
 import numpy as np
 from py_trees.blackboard import Blackboard
-from scenario.server_data_provider import ServerDataProvider, calculate_velocity
+from scenario.command_buffer import CommandBuffer
+from scenario.server_data_provider import ServerDataProvider
+from scenario.tick_scheduler import TickScheduler
 from scenario.timer import GameTime
+from scenario.ttc import TTCEngine
 from lgsvl.geometry import Vector, Transform, BoundingBox
 
 EPSILON = 0.001
@@ -64,10 +67,18 @@ def normalized_vector(vec):
 def multiply_vector(vec, scalar):
     return lgsvl.Vector(vec.x * scalar,  vec.y * scalar, vec.z * scalar)
 
+def get_actor_location(actor):
+    # None until the episode stream carried a state of the actor, callers wait for the next tick
+    return ServerDataProvider.get_location(actor)
+
 def set_velocity(actor, speed):
-    s = actor.state 
+    # returns False without sending anything while no state of the actor was received
+    s = ServerDataProvider.get_state(actor)
+    if s is None:
+        return False
     s.velocity = lgsvl.Vector(math.sin(math.radians(s.rotation.y))*speed, 0, math.cos(math.radians(s.rotation.y))*speed)
-    actor.state = s 
+    CommandBuffer.set_state(actor, s)
+    return True
 
 class AtomicBehavior(py_trees.behaviour.Behaviour):
 
@@ -204,8 +215,19 @@ class InTriggerDistanceToVehicle(AtomicBehavior):
         if ego_location is None or other_location is None:
             return new_status
 
-        if calculate_distance(ego_location, other_location) < self._distance:
+        distance = calculate_distance(ego_location, other_location)
+        if distance < self._distance:
             new_status = py_trees.common.Status.SUCCESS
+        else:
+            # time until the gap closes to the trigger distance at the current closing speed
+            ego_velocity = ServerDataProvider.get_velocity_vector(self._actor)
+            other_velocity = ServerDataProvider.get_velocity_vector(self._other_actor)
+            if ego_velocity is not None and other_velocity is not None and distance > EPSILON:
+                gap = other_location - ego_location
+                relative = other_velocity - ego_velocity
+                closing = -(gap.x * relative.x + gap.y * relative.y + gap.z * relative.z) / distance
+                if closing > EPSILON:
+                    TickScheduler.report((distance - self._distance) / closing)
 
         self.logger.debug("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
 
@@ -240,9 +262,13 @@ class InTriggerDistanceToLocation(AtomicBehavior):
         if location is None:
             return new_status
 
-        if calculate_distance(
-                location, self._target_location) < self._distance:
+        distance = calculate_distance(location, self._target_location)
+        if distance < self._distance:
             new_status = py_trees.common.Status.SUCCESS
+        else:
+            velocity = ServerDataProvider.get_velocity(self._actor)
+            if velocity > EPSILON:
+                TickScheduler.report((distance - self._distance) / velocity)
 
         self.logger.debug("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
 
@@ -289,6 +315,8 @@ class InTimeToArrivalToLocation(AtomicBehavior):
 
         if time_to_arrival < self._time:
             new_status = py_trees.common.Status.SUCCESS
+        else:
+            TickScheduler.report(time_to_arrival - self._time)
 
         self.logger.debug("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
 
@@ -329,26 +357,10 @@ class InTimeToArrivalToVehicle(AtomicBehavior):
 
         new_status = py_trees.common.Status.RUNNING
 
-        current_location=Vector()
-        target_location=Vector()
-        current_velocity=0.0
-        other_velocity=0.0
-
-        if self._actor.agent_type == lgsvl.AgentType.EGO:
-            ego_state = self._actor.state
-            current_location = ego_state.transform.position
-            current_velocity = calculate_velocity(ego_state.velocity)
-        else:
-            current_location = ServerDataProvider.get_location(self._actor)
-            current_velocity = ServerDataProvider.get_velocity(self._actor)
-        
-        if self._other_actor.agent_type == lgsvl.AgentType.EGO:
-            ego_state = self._other_actor.state
-            target_location = ego_state.transform.position
-            other_velocity =  calculate_velocity(ego_state.velocity)
-        else:
-            target_location = ServerDataProvider.get_location(self._other_actor)
-            other_velocity = ServerDataProvider.get_velocity(self._other_actor)
+        current_location = ServerDataProvider.get_location(self._actor)
+        current_velocity = ServerDataProvider.get_velocity(self._actor)
+        target_location = ServerDataProvider.get_location(self._other_actor)
+        other_velocity = ServerDataProvider.get_velocity(self._other_actor)
 
         if current_location is None or target_location is None:
             return new_status
@@ -363,10 +375,56 @@ class InTimeToArrivalToVehicle(AtomicBehavior):
 
         if self._comparison_operator(time_to_arrival, self._time):
             new_status = py_trees.common.Status.SUCCESS
+        else:
+            TickScheduler.report(abs(time_to_arrival - self._time))
         print("dist %f cur vel %f other vel %f ttc %f " % (distance,current_velocity,other_velocity,time_to_arrival))
 
         return new_status
 
+class InTimeToCollisionToVehicle(AtomicBehavior):
+
+    """
+    This class contains a check if a actor collides with another actor
+    within a given time, using the bounding boxes and velocities of both
+    (see TTCEngine).
+
+    Important parameters:
+    - actor: actor to execute the behavior
+    - name: Name of the condition
+    - time: The behavior is successful, if TTC is less than _time_ in seconds
+    - other_actor: Reference actor used in this behavior
+
+    The condition terminates with SUCCESS, when the actors collide within the given time
+    """
+
+    def __init__(self, other_actor, actor, time, comparison_operator=operator.lt, name="TimeToCollision"):
+        """
+        Setup parameters
+        """
+        super(InTimeToCollisionToVehicle, self).__init__(name)
+        self.logger.debug("%s.__init__()" % (self.__class__.__name__))
+        self._other_actor = other_actor
+        self._actor = actor
+        self._time = time
+        self._comparison_operator = comparison_operator
+
+    def update(self):
+        """
+        Check if the actor collides with other actor within time
+        """
+
+        new_status = py_trees.common.Status.RUNNING
+
+        time_to_collision = TTCEngine.get_ttc(self._actor, self._other_actor)
+        if self._comparison_operator(time_to_collision, self._time):
+            new_status = py_trees.common.Status.SUCCESS
+        else:
+            TickScheduler.report(time_to_collision - self._time)
+
+        self.logger.debug("%s.update()[%s->%s] ttc %f" % (self.__class__.__name__, self.status, new_status, time_to_collision))
+
+        return new_status
+
 class AfterTerminationCondition(AtomicBehavior):
 
     """
@@ -456,7 +514,7 @@ class AccelerateToVelocity(AtomicBehavior):
             new_status = py_trees.common.Status.SUCCESS
             self._control.external_acceleration = -100
             
-        self._actor.apply_control(self._control)
+        CommandBuffer.apply_control(self._actor, self._control)
 
         return new_status
 
@@ -491,8 +549,7 @@ class SetToVelocity(AtomicBehavior):
         new_status = py_trees.common.Status.RUNNING
         print("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
 
-        if GameTime.get_time() - self._start_time > self._delay_time:        
-            set_velocity(self._actor, self._target_velocity)
+        if GameTime.get_time() - self._start_time > self._delay_time and set_velocity(self._actor, self._target_velocity):
             #TODO, update velocity won't get registered in ServrDataProvider ...
             new_status = py_trees.common.Status.SUCCESS
                 
@@ -533,12 +590,11 @@ class KeepVelocity(AtomicBehavior):
 
         self._duration = duration
         self._target_distance = distance
-        self._distance = 0
+        self._start_distance = 0
         self._start_time = 0
-        self._location = None
 
     def initialise(self):
-        self._location = ServerDataProvider.get_location(self._actor)
+        self._start_distance = ServerDataProvider.get_odometer(self._actor)
         self._start_time = GameTime.get_time()
 
         # In case of walkers, we have to extract the current heading
@@ -562,13 +618,9 @@ class KeepVelocity(AtomicBehavior):
                 self._control.throttle = 1.0
             else:
                 self._control.throttle = 0.0
-        self._actor.apply_control(self._control)
+        CommandBuffer.apply_control(self._actor, self._control)
 
-        new_location = ServerDataProvider.get_location(self._actor)
-        self._distance += calculate_distance(self._location, new_location)
-        self._location = new_location
-
-        if self._distance > self._target_distance:
+        if ServerDataProvider.get_odometer(self._actor) - self._start_distance > self._target_distance:
             new_status = py_trees.common.Status.SUCCESS
 
         if GameTime.get_time() - self._start_time > self._duration:
@@ -589,7 +641,7 @@ class KeepVelocity(AtomicBehavior):
         elif self._type == 'walker':
             self._control.speed = 0.0
         if self._actor is not None and self._actor.is_alive:
-            self._actor.apply_control(self._control)
+            CommandBuffer.apply_control(self._actor, self._control)
         super(KeepVelocity, self).terminate(new_status)
 
 
@@ -597,8 +649,6 @@ class DriveDistance(AtomicBehavior):
 
     """
     This class contains an atomic behavior to drive a certain distance.
-    currently can not get ego car poz via ServerDataProvider.get_location(self._actor)
-    so this class can not work yet
     """
 
     def __init__(self, actor, distance, name="DriveDistance"):
@@ -608,12 +658,11 @@ class DriveDistance(AtomicBehavior):
         super(DriveDistance, self).__init__(name)
         self.logger.debug("%s.__init__()" % (self.__class__.__name__))
         self._target_distance = distance
-        self._distance = 0
-        self._location = None
+        self._start_distance = 0
         self._actor = actor
 
     def initialise(self):
-        self._location = self._actor.state.transform.position
+        self._start_distance = ServerDataProvider.get_odometer(self._actor)
         super(DriveDistance, self).initialise()
 
     def update(self):
@@ -621,11 +670,8 @@ class DriveDistance(AtomicBehavior):
         Check driven distance
         """
         new_status = py_trees.common.Status.RUNNING
-        new_location = self._actor.state.transform.position # ServerDataProvider.get_location(self._actor)  #new_location is lgsvl.Vector()
-        self._distance += calculate_distance(self._location, new_location)
-        self._location = new_location
 
-        if self._distance > self._target_distance:
+        if ServerDataProvider.get_odometer(self._actor) - self._start_distance > self._target_distance:
             new_status = py_trees.common.Status.SUCCESS
 
         self.logger.debug("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
@@ -667,7 +713,7 @@ class StopVehicle(AtomicBehavior):
                 new_status = py_trees.common.Status.SUCCESS    
                 self._control.brake = 0.0 
             if isinstance(self._actor, lgsvl.AgentType.EGO):
-                self._actor.apply_control(self._control)
+                CommandBuffer.apply_control(self._actor, self._control)
         else:
             new_status = py_trees.common.Status.SUCCESS
         self.logger.debug("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
@@ -704,7 +750,7 @@ class FollowClosestLane(AtomicBehavior):
         super(FollowClosestLane, self).__init__(name)
         self._actor = actor 
         self._target_speed = target_speed 
-        self._actor.follow_closest_lane(True, self._target_speed, False) 
+        CommandBuffer.follow_closest_lane(self._actor, True, self._target_speed, False)
 
     def update(self):
         new_status = py_trees.common.Status.RUNNING
@@ -764,7 +810,7 @@ class WaypointFollower(AtomicBehavior):
         control.steer = 0.0
         for actor, local_planner in zip(self._actor_list, self._local_planner_list):
             if actor is not None:
-                actor.apply_control(control)
+                CommandBuffer.apply_control(actor, control)
             if local_planner is not None:
                 local_planner.reset_vehicle()
                 local_planner = None
@@ -793,12 +839,14 @@ class ActorTransformSetter(AtomicBehavior):
         """
         new_status = py_trees.common.Status.RUNNING
         if self._actor:
-            s = self._actor.state 
+            s = ServerDataProvider.get_state(self._actor)
+            if s is None:
+                return new_status
             s.velocity = lgsvl.Vector(0,0,0)
             s.angular_velocity = lgsvl.Vector(0, 0, 0)
             if(self._transform):
                 s.transform = self._transform 
-            self._actor.state = s 
+            CommandBuffer.set_state(self._actor, s)
             new_status = py_trees.common.Status.SUCCESS
         else:
             # For some reason the actor is gone...
@@ -823,9 +871,10 @@ class NpcChangeLane(AtomicBehavior):
     def update(self):
         new_status = py_trees.common.Status.RUNNING
         if not self.lane_changed:
+            if not set_velocity(self._actor, 10):
+                return new_status
             self._actor.on_lane_change(self.on_lane_changing) 
-            set_velocity(self._actor, 10)
-            self._actor.change_lane(self.isLeftChange) 
+            CommandBuffer.change_lane(self._actor, self.isLeftChange)
             self._actor.on_lane_change_done(self.on_lane_changed)
             return new_status         
         else: 
@@ -846,7 +895,11 @@ class PedestrainWalkTowardVehicle(AtomicBehavior):
 
     def update(self):
         new_status = py_trees.common.Status.RUNNING
-        dis_target = self._target_actor.state.transform.position - self._actor.state.transform.position
+        target_location = get_actor_location(self._target_actor)
+        location = get_actor_location(self._actor)
+        if target_location is None or location is None:
+            return new_status
+        dis_target = target_location - location
         walk_direction = normalized_vector(dis_target)
         set_velocity(self._actor, walk_direction * self._speed)
         if dis_target < 0.5 :
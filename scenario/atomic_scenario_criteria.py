@@ -1,103 +1,93 @@
 import py_trees 
 import math
-import lgsvl 
-from scenario.server_data_provider import ServerDataProvider, ServerActorPool 
-import scenario.criteria 
+import logging
+from scenario.criteria_engine import CriteriaEngine, SPEED, ANGULAR_VELOCITY_Y, ACCELERATION, SEPARATION, COLLISION, NEAR_MISS
 
 
 class Criterion(py_trees.behaviour.Behaviour):
-    def __init__(self, name, actor, expected_value_success):
+    """
+    Base class of the test criteria. Criteria are registered with the
+    CriteriaEngine, which evaluates all of them in one pass per tick; update()
+    reads the shared result: FAILURE once the quantity exceeds
+    expected_value_success, RUNNING otherwise.
+    """
+    kind = None
+
+    def __init__(self, name, actor, expected_value_success, other=None):
         super(Criterion, self).__init__(name)
         self.name = name
         self.actor = actor 
         self.test_status = "INIT"
         self.expected_value_success = expected_value_success 
+        self.value = None
+        self._index = None
+        if actor is not None and self.kind is not None:
+            self._index = CriteriaEngine.register(self.kind, actor, expected_value_success, other)
+
+    def update(self):
+        new_status = py_trees.common.Status.RUNNING
+        if self._index is None:
+            return new_status
+
+        failed, known, value = CriteriaEngine.result(self._index)
+        if not known:
+            return new_status
+        self.value = value
+
+        if failed:
+            self.test_status = "FAILURE"
+            new_status = py_trees.common.Status.FAILURE
+        else:
+            self.test_status = "SUCCESS"
+
+        return new_status
 
 def cb_collision(actor1, actor2, contact):
-    raise criteria.TestException("actor {} collision with actor {}".format(actor1, actor2))
+    logging.warning("actor {} collision with actor {}".format(actor1, actor2))
+    CriteriaEngine.on_collision(actor1)
 
 class CollisionTest(Criterion):
+    kind = COLLISION
+
     def __init__(self, actor, name="CheckCollisions" ):
-        super(CollisionTest, self).__init__(name, actor, 0)
+        super(CollisionTest, self).__init__(name, actor, 0.5)
         self.actor.on_collision(cb_collision)
-    
-    def update(self):
-         new_status = py_trees.common.Status.RUNNING
-         if self.test_status == "FAILURE":
-            new_status = py_trees.comon.Status.FAILURE 
-#TODO
-         return new_status 
 
 class MaxVelocityTest(Criterion):
+    kind = SPEED
+
     def __init__(self, actor, max_velocity_allowed, name="CheckMaxVelocity"):
         super(MaxVelocityTest, self).__init__(name, actor, max_velocity_allowed)
-
-    def update(self):
-        new_status = py_trees.common.Status.RUNNING
-        if self.actor is None: 
-            return new_status 
-        
-        velocity = ServerDataProvider.get_velocity(self.actor)
-
-        if velocity > self.expected_value_success: 
-            self.test_status = "FAILURE"
-            new_status = py_trees.common.Status.FAILURE
-        else:
-            self.test_status = "SUCCESS"
-
-        return new_status 
         
 class MaxAngularVelocityTest(Criterion):
+    kind = ANGULAR_VELOCITY_Y
+
     def __init__(self, actor, max_angular_velocity_allowed, name="CheckMaxAngularVelocity"):
         super(MaxAngularVelocityTest, self).__init__(name, actor, max_angular_velocity_allowed)
 
-    def update(self):
-        new_status = py_trees.common.Status.RUNNING
-        if self.actor is None: 
-            return new_status 
-        
-        angular_velocity = self.actor.state.angular_velocity.y
+class MaxAccelerationTest(Criterion):
+    kind = ACCELERATION
 
-        if angular_velocity > self.expected_value_success: 
-            self.test_status = "FAILURE"
-            new_status = py_trees.common.Status.FAILURE
-        else:
-            self.test_status = "SUCCESS"
+    def __init__(self, actor, max_acceleration_allowed, name="CheckMaxAcceleration"):
+        super(MaxAccelerationTest, self).__init__(name, actor, max_acceleration_allowed)
 
-        print("%s.update()[%s->%s]" % (self.__class__.__name__, self.status, new_status))
-        return new_status
+class NearMissTest(Criterion):
+    kind = NEAR_MISS
+
+    def __init__(self, actor, other_actor=None, max_near_misses_allowed=0, name="CheckNearMiss"):
+        super(NearMissTest, self).__init__(name, actor, max_near_misses_allowed, other_actor)
 
 def calculate_distance(location1, location2):
     distance = (location1.x-location2.x)**2 + (location1.y-location2.y)**2 + (location1.z-location2.z)**2
     return math.sqrt(distance)   
 
 class SeparationDistanceTest(Criterion):
+    kind = SEPARATION
+
     def __init__(self, actor, target_actor, max_separation_distance_allowed, end_time=False, name="CheckSeparationDistance"):
         self.target = target_actor
         #TODO: this criteria only works at final time once 
         self.at_end_time = end_time  
-        super(SeparationDistanceTest, self).__init__(name, actor, max_separation_distance_allowed)
-   
-    def update(self):        
-        new_status = py_trees.common.Status.RUNNING
-        
-        if self.actor is None or self.target is None:
-            return new_status 
-
-        actor_location = ServerDataProvider.get_location(self.actor)
-        target_location = ServerDataProvider.get_location(self.target)
-
-        #TODO: check direction
-        if calculate_distance(target_location, actor_location) >  self.expected_value_success:
-            self.test_status = "FAILURE"
-            new_status = py_trees.common.Status.FAILURE 
-        else:
-            self.test_status = "SUCCESS"
-
-        return new_status
-    
-
-
-
-
-
+        if target_actor is None:
+            actor = None
+        super(SeparationDistanceTest, self).__init__(name, actor, max_separation_distance_allowed, target_actor)
@@ -0,0 +1,54 @@
+"""
+Broad phase of collision prediction
+
+Every actor is bounded by the axis aligned box (x/z ground plane) its bounding
+circle sweeps within the prediction horizon. Sweep and prune sorts these boxes
+along the axis the actors are spread most and keeps the pairs whose intervals
+overlap on both axes. Only these candidate pairs need the exact oriented box
+test (see scenario.ttc), so the cost grows with the number of actors that can
+actually meet rather than with all pairs.
+"""
+
+import numpy as np
+
+
+def swept_bounds(center, velocity, radius, horizon, acceleration=None):
+    """
+    (N, 4) min x, min z, max x, max z of the area the circles (center, radius)
+    sweep within horizon seconds, center, velocity, acceleration: (N, 2) x/z arrays
+    """
+    end = center + velocity * horizon
+    reach = radius
+    if acceleration is not None:
+        # the path bends away from the straight segment by at most |a| horizon^2 / 8
+        end = end + 0.5 * acceleration * horizon ** 2
+        reach = radius + np.linalg.norm(acceleration, axis=1) * horizon ** 2 / 8.0
+    reach = reach[:, np.newaxis]
+    return np.hstack([np.minimum(center, end) - reach, np.maximum(center, end) + reach])
+
+
+def sweep_and_prune(bounds):
+    """(i, j) index arrays, i < j, of the pairs of overlapping (N, 4) bounds"""
+    n = len(bounds)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    middle = 0.5 * (bounds[:, 0:2] + bounds[:, 2:4])
+    axis = int(np.argmax(middle.var(axis=0)))
+    other = 1 - axis
+
+    order = np.argsort(bounds[:, axis], kind="stable")
+    lo, hi = bounds[order, axis], bounds[order, axis + 2]
+    # boxes sorted after k overlap it on axis up to the first one starting past its end
+    count = np.searchsorted(lo, hi, side="right") - np.arange(n) - 1
+    a = np.repeat(np.arange(n), count)
+    b = a + 1 + np.arange(len(a)) - np.repeat(np.cumsum(count) - count, count)
+    i, j = order[a], order[b]
+
+    keep = (bounds[i, other] <= bounds[j, other + 2]) & (bounds[j, other] <= bounds[i, other + 2])
+    i, j = i[keep], j[keep]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def candidate_pairs(center, velocity, radius, horizon, acceleration=None):
+    """(i, j) index arrays of the pairs of actors that may meet within horizon"""
+    return sweep_and_prune(swept_bounds(center, velocity, radius, horizon, acceleration))
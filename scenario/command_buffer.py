@@ -0,0 +1,60 @@
+import logging
+from collections import OrderedDict
+
+
+class CommandBuffer(object):
+    """
+    Commands behaviors issue during a tick of the scenario tree. ScenarioManager
+    sends them as one simulator/batch message after the tick. Commands are keyed
+    by agent and field ("state", "control", "follow", "lane_change"), the last
+    write of a tick wins and is sent in the place of the first one, so commands
+    run in the order behaviors first issued them.
+    """
+
+    _commands = OrderedDict()  # (uid, field) -> (command, arguments)
+    _issued = 0
+
+    @staticmethod
+    def record(actor, field, command):
+        """Buffers the (command, arguments) pair under field of actor, in place of an earlier one of the tick"""
+        CommandBuffer._commands[(actor.uid, field)] = command
+        CommandBuffer._issued += 1
+
+    @staticmethod
+    def set_state(actor, state):
+        CommandBuffer.record(actor, "state", actor.state_command(state))
+
+    @staticmethod
+    def apply_control(actor, control):
+        CommandBuffer.record(actor, "control", actor.control_command(control))
+
+    @staticmethod
+    def follow_closest_lane(actor, follow, max_speed, isLaneChange=True):
+        CommandBuffer.record(actor, "follow", actor.follow_closest_lane_command(follow, max_speed, isLaneChange))
+
+    @staticmethod
+    def change_lane(actor, isLeftChange):
+        CommandBuffer.record(actor, "lane_change", actor.change_lane_command(isLeftChange))
+
+    @staticmethod
+    def pending():
+        return len(CommandBuffer._commands)
+
+    @staticmethod
+    def flush(sim):
+        """
+        Sends the buffered commands in one message
+        Returns the number of commands issued and sent since the last flush
+        """
+        issued, sent = CommandBuffer._issued, len(CommandBuffer._commands)
+        commands = list(CommandBuffer._commands.values())
+        CommandBuffer.clear()
+        if commands:
+            sim.batch(commands)
+        logging.debug("CommandBuffer.flush() %d commands issued, %d sent" % (issued, sent))
+        return issued, sent
+
+    @staticmethod
+    def clear():
+        CommandBuffer._commands.clear()
+        CommandBuffer._issued = 0
@@ -0,0 +1,121 @@
+import numpy as np
+
+from scenario.server_data_provider import ServerDataProvider, ANGULAR_VELOCITY, POSITION
+from scenario.ttc import TTCEngine
+
+# Quantities criteria compare against their threshold, see CriteriaEngine.register
+SPEED = 0               # speed of actor
+ANGULAR_VELOCITY_Y = 1  # yaw rate of actor (signed)
+ACCELERATION = 2        # magnitude of the finite difference acceleration of actor
+SEPARATION = 3          # distance between actor and other
+COLLISION = 4           # 1 once actor collided
+NEAR_MISS = 5           # near misses of actor (with other if given), see TTCEngine
+
+
+class CriteriaEngine(object):
+    """
+    Evaluates all registered criteria in one vectorised pass per server tick.
+
+    Criteria are compiled into arrays (kind, actor slot, other slot, threshold)
+    over the ServerDataProvider state store. The first criterion updated after a
+    tick evaluates all of them, the others read the shared result, so the cost
+    per tick stays flat as criteria and actors are added.
+
+    A criterion fails when its quantity exceeds its threshold; quantities that are
+    not known yet (no state received) neither fail nor pass.
+    """
+
+    _criteria = []  # (kind, actor, other, threshold) in registration order
+    _compiled = None  # (kind, slot, other_slot, threshold) arrays
+    _compiled_actors = -1  # registered actor count the compiled slots were resolved with
+    _evaluated_tick = -1
+    _collided = set()  # actors reported by collision callbacks
+    values = np.zeros(0)
+    failed = np.zeros(0, dtype=bool)
+    known = np.zeros(0, dtype=bool)
+
+    @staticmethod
+    def register(kind, actor, threshold, other=None):
+        """Adds a criterion and returns its index into values, failed and known"""
+        CriteriaEngine._criteria.append((kind, actor, other, threshold))
+        CriteriaEngine._compiled = None
+        CriteriaEngine._evaluated_tick = -1
+        return len(CriteriaEngine._criteria) - 1
+
+    @staticmethod
+    def on_collision(actor):
+        CriteriaEngine._collided.add(actor)
+        CriteriaEngine._evaluated_tick = -1
+
+    @staticmethod
+    def _compile():
+        slots = ServerDataProvider._slots
+        criteria = CriteriaEngine._criteria
+        kind = np.array([c[0] for c in criteria], dtype=np.int64)
+        slot = np.array([slots.get(c[1], -1) for c in criteria], dtype=np.int64)
+        other = np.array([slots.get(c[2], -1) if c[2] is not None else -1 for c in criteria], dtype=np.int64)
+        threshold = np.array([c[3] for c in criteria], dtype=np.float64)
+        CriteriaEngine._compiled = (kind, slot, other, threshold)
+        CriteriaEngine._compiled_actors = len(slots)
+
+    @staticmethod
+    def evaluate():
+        """Evaluates all criteria against the current state store"""
+        if CriteriaEngine._compiled is None or CriteriaEngine._compiled_actors != len(ServerDataProvider._slots):
+            CriteriaEngine._compile()
+        kind, slot, other, threshold = CriteriaEngine._compiled
+        n = len(kind)
+
+        # per slot quantities, one extra NaN row for unresolved (-1) slots
+        count = len(ServerDataProvider._speed)
+        has_state = np.append(ServerDataProvider._frame >= 0, False)
+        state = ServerDataProvider._state
+        speed = np.append(ServerDataProvider._speed, np.nan)
+        yaw_rate = np.append(state[:, ANGULAR_VELOCITY][:, 1], np.nan)
+        history = ServerDataProvider.history
+        acceleration = np.full(count + 1, np.nan)
+        acceleration[:history.size] = np.linalg.norm(history.acceleration, axis=1)
+        position = np.vstack([state[:, POSITION], np.full((1, 3), np.nan)])
+
+        values = np.full(n, np.nan)
+        a = np.where(slot >= 0, slot, count)
+        b = np.where(other >= 0, other, count)
+        for k, quantity in ((SPEED, speed), (ANGULAR_VELOCITY_Y, yaw_rate), (ACCELERATION, acceleration)):
+            mask = kind == k
+            values[mask] = quantity[a[mask]]
+        separation = np.flatnonzero(kind == SEPARATION)
+        values[separation] = np.linalg.norm(position[a[separation]] - position[b[separation]], axis=1)
+
+        known = has_state[a] & ~np.isnan(values)
+        known[separation] &= has_state[b[separation]]
+        # collisions come from simulator callbacks, not from the state store
+        collision = np.flatnonzero(kind == COLLISION)
+        values[collision] = [CriteriaEngine._criteria[i][1] in CriteriaEngine._collided for i in collision]
+        known[collision] = True
+        near_miss = np.flatnonzero(kind == NEAR_MISS)
+        values[near_miss] = [TTCEngine.near_miss_count(*CriteriaEngine._criteria[i][1:3]) for i in near_miss]
+        known[near_miss] = has_state[a[near_miss]]
+        with np.errstate(invalid="ignore"):
+            failed = known & (values > threshold)
+
+        CriteriaEngine.values, CriteriaEngine.failed, CriteriaEngine.known = values, failed, known
+        CriteriaEngine._evaluated_tick = history.count
+
+    @staticmethod
+    def result(index):
+        """(failed, known, value) of a criterion, evaluating all criteria once per tick and when actors were registered"""
+        if (CriteriaEngine._evaluated_tick != ServerDataProvider.history.count or index >= len(CriteriaEngine.failed)
+                or CriteriaEngine._compiled_actors != len(ServerDataProvider._slots)):
+            CriteriaEngine.evaluate()
+        return bool(CriteriaEngine.failed[index]), bool(CriteriaEngine.known[index]), float(CriteriaEngine.values[index])
+
+    @staticmethod
+    def cleanup():
+        CriteriaEngine._criteria = []
+        CriteriaEngine._compiled = None
+        CriteriaEngine._compiled_actors = -1
+        CriteriaEngine._evaluated_tick = -1
+        CriteriaEngine._collided = set()
+        CriteriaEngine.values = np.zeros(0)
+        CriteriaEngine.failed = np.zeros(0, dtype=bool)
+        CriteriaEngine.known = np.zeros(0, dtype=bool)
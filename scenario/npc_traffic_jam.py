@@ -3,11 +3,14 @@ from scenario.basic_scenario import BasicScenario
 from scenario.atomic_scenario_behavior import *
 from scenario.atomic_scenario_criteria import *
 from scenario.server_data_provider import ServerActorPool 
+from scenario.spatial_hash import SpatialHash
 
 MAX_EGO_SPEED = 11.18 # (40 km/h, 25 mph)
 MAX_FOLLOWING_DISTANCE = 10 # The maximum distance the EGO should be from the POV 
 MAX_NPC_SPEED = 10
 VEHICLE_LENGTH = 6.0
+SPAWN_CLEARANCE = 5.0 # minimum distance of a spawn position to any spawned actor
+MAX_SPAWN_SHIFTS = 10
 
 NPC_TRAFFIC_JAM = ["NpcTrafficJam"]
 
@@ -31,7 +34,12 @@ class NpcTrafficJam(BasicScenario):
         if dist0 > 10:  #TODO
             next_pos =  npc2_trans.position + dist0/2.0 * driving_direction 
         else:
-            next_pos = npc1_trans.position +  5.0 * driving_direction 
+            next_pos = npc1_trans.position +  SPAWN_CLEARANCE * driving_direction 
+        # keep moving along the lane while the position is taken by another spawned actor
+        for _ in range(MAX_SPAWN_SHIFTS):
+            if not self._spawned.any_within(next_pos, SPAWN_CLEARANCE):
+                break
+            next_pos = next_pos + SPAWN_CLEARANCE * driving_direction
         return lgsvl.Transform(next_pos, npc2_trans.rotation)
 
     def _get_next_npc(self, npc, layers=3):
@@ -41,6 +49,8 @@ class NpcTrafficJam(BasicScenario):
                 prev_npc = self.other_actors[len(self.other_actors)-2]
                 next_trans2 = self._get_next_spawn_position(npc, prev_npc) 
                 npc22 = ServerActorPool.request_new_npc("Sedan", next_trans2)      
+                if npc22 is not None:
+                    self._spawned.insert(npc22, next_trans2.position)
                 self._get_next_npc(npc22, layers-1)      
         else:
             return None
@@ -50,6 +60,9 @@ class NpcTrafficJam(BasicScenario):
         lane_width = 4.0
         trans0 = self.other_actors[0].state.transform 
         ego_trans = self.ego.state.transform 
+        self._spawned = SpatialHash(SPAWN_CLEARANCE)
+        self._spawned.insert(self.ego, ego_trans.position)
+        self._spawned.insert(self.other_actors[0], trans0.position)
         driving_direction =  normalized_vector(trans0.position - ego_trans.position)
         unit_normal_direction = lgsvl.Vector(-driving_direction.z, driving_direction.y, driving_direction.x)
         print("dbug unit_normal: ", unit_normal_direction)
@@ -57,10 +70,14 @@ class NpcTrafficJam(BasicScenario):
         trans1.position = trans0.position - lane_width * unit_normal_direction
         print("debug npc1 jam: ", trans1.position)
         npc1 = ServerActorPool.request_new_npc("Sedan", trans1)
+        if npc1 is not None:
+            self._spawned.insert(npc1, trans1.position)
         trans2 = lgsvl.Transform(trans0.position,trans0.rotation) 
         trans2.position = trans0.position + lane_width * unit_normal_direction 
         print("debug npc2 jam: ", trans2.position)
         npc2 = ServerActorPool.request_new_npc("Sedan", trans2)
+        if npc2 is not None:
+            self._spawned.insert(npc2, trans2.position)
         self._get_next_npc(npc1)
         self._get_next_npc(npc2)
         print("debug jam, npc length ", len(self.other_actors)) 
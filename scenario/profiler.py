@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from scenario.command_buffer import CommandBuffer
+
+# Behaviour methods the profiler times
+METHODS = ("initialise", "update", "terminate")
+
+
+class _NodeStats(object):
+    def __init__(self):
+        self.times = []
+        self.commands = 0
+
+    @property
+    def calls(self):
+        return len(self.times)
+
+    @property
+    def total(self):
+        return sum(self.times)
+
+
+class TreeProfiler(object):
+    """
+    Opt-in profiler for a py_trees scenario tree. attach() wraps initialise,
+    update and terminate of every node and records, per node and method, the
+    call count, wall time of every call and the commands issued (sent directly
+    through remote or buffered in CommandBuffer). Only this remote is counted,
+    its command is patched on the instance. detach() restores the tree and the
+    remote.
+
+    report() ranks the node methods by total time, write_flamegraph() writes
+    collapsed stacks ("root;parent;node;method microseconds" lines) for
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, tree, remote=None):
+        self.tree = tree
+        self.remote = remote
+        self.stats = OrderedDict()  # (path, method) -> _NodeStats
+        self._sent = 0
+        self._attached = []
+        self._remote_wrapped = False
+
+    def attach(self):
+        if self._attached:
+            return
+        self._wrap_remote()
+        for path, node in self._nodes(self.tree, ()):
+            for method in METHODS:
+                self.stats[(path, method)] = _NodeStats()
+                setattr(node, method, self._wrap(getattr(node, method), self.stats[(path, method)]))
+                self._attached.append((node, method))
+
+    def detach(self):
+        for node, method in self._attached:
+            delattr(node, method)  # back to the class method
+        self._attached = []
+        if self._remote_wrapped:
+            del self.remote.command  # back to the class method
+            self._remote_wrapped = False
+
+    @staticmethod
+    def _nodes(node, parent):
+        path = parent + ("%s[%s]" % (node.name.replace(";", ","), node.__class__.__name__),)
+        yield path, node
+        for child in node.children:
+            for item in TreeProfiler._nodes(child, path):
+                yield item
+
+    def _wrap_remote(self):
+        if self.remote is None:
+            return
+        command = self.remote.command
+
+        def counted(*args, **kwargs):
+            self._sent += 1
+            return command(*args, **kwargs)
+        self.remote.command = counted
+        self._remote_wrapped = True
+
+    def _wrap(self, fn, stats):
+        def timed(*args, **kwargs):
+            sent, buffered = self._sent, CommandBuffer._issued
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.times.append(time.perf_counter() - t0)
+                stats.commands += self._sent - sent + max(CommandBuffer._issued - buffered, 0)
+        return timed
+
+    def ranked(self):
+        """[(path, method, stats)] of the methods called at least once, by total time"""
+        rows = [(path, method, stats) for (path, method), stats in self.stats.items() if stats.calls]
+        return sorted(rows, key=lambda row: row[2].total, reverse=True)
+
+    def report(self, limit=None):
+        lines = ["%-60s %-10s %8s %10s %10s %10s %8s" % ("node", "method", "calls", "total ms", "mean us", "p99 us", "commands")]
+        for path, method, stats in self.ranked()[:limit]:
+            times = np.array(stats.times) * 1e6
+            lines.append("%-60s %-10s %8d %10.2f %10.1f %10.1f %8d" % (
+                path[-1][:60], method, stats.calls, times.sum() / 1e3, times.mean(), np.percentile(times, 99), stats.commands))
+        return "\n".join(lines)
+
+    def write_flamegraph(self, path):
+        with open(path, "w") as f:
+            for (node_path, method), stats in self.stats.items():
+                if stats.calls:
+                    f.write("%s;%s %d\n" % (";".join(node_path), method, int(round(stats.total * 1e6))))
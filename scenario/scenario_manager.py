@@ -1,8 +1,12 @@
 import time 
 import py_trees
 from scenario.logger import * 
+from scenario.command_buffer import CommandBuffer
 from scenario.server_data_provider import ServerDataProvider 
+from scenario.profiler import TreeProfiler
+from scenario.tick_scheduler import TickScheduler
 from scenario.timer import GameTime, TimeOut
+from scenario.ttc import TTCEngine
 
 
 class Scenario():
@@ -61,10 +65,17 @@ class Scenario():
 
 class ScenarioManager(object):
 
-    def __init__(self):
+    def __init__(self, base_step=0.5, min_step=0.05, max_step=None, profile=None):
+        """
+        base_step: simulated seconds per tick while no trigger is close to firing
+        min_step, max_step: bounds of the adaptive step (max_step defaults to base_step), see TickScheduler
+        profile: if set, the scenario tree is profiled and a flame graph (collapsed stacks) written to this path
+        """
         self._running = False 
         self.scenario_tree = None 
-        self.fixed_delta_time = 0.5
+        self.scheduler = TickScheduler(base_step, min_step, max_step)
+        self.profile = profile
+        self.profiler = None
         self.logger = logger(__name__)
         self.logger.set_output_file() #using default log config
         self.logger.log.debug("ScenarioManager init done ")
@@ -77,19 +88,35 @@ class ScenarioManager(object):
 
     def restart(self):
         self._running = False 
+        if self.profiler is not None:
+            self.profiler.detach()
+            self.profiler = None
         self.scenario = None
         self.scenario_tree = None
+        self.scheduler.restart()
         GameTime.restart()
 
     def run_scenario(self, sim):   
         self._running = True 
         start_system_time = time.time()
         start_game_time = GameTime.get_time()
+        self.ticks = 0
+        self.commands_issued = 0
+        self.commands_sent = 0
+        self.max_commands_per_tick = 0
+        if self.profile is not None:
+            self.profiler = TreeProfiler(self.scenario_tree, sim.remote)
+            self.profiler.attach()
+        self._flush_commands(sim)  # commands issued while the scenario was set up
         while self._running:
-            sim.run_with_cb(self.fixed_delta_time)
+            sim.run_with_cb(self.scheduler.step)
             if sim.episode_state is not None:
                 ServerDataProvider.on_server_tick(sim.episode_state)
+                TTCEngine.on_server_tick()
             self._tick_scenario()
+            self._flush_commands(sim)
+            self.scheduler.next_step()
+            self.ticks += 1
         end_system_time = time.time()
         end_game_time = GameTime.get_time()
         self.scenario_duration_system = end_system_time - start_system_time 
@@ -97,10 +124,30 @@ class ScenarioManager(object):
         self.logger.log.info("  scenario duration system time |     duration game time ")
         self.logger.log.info("---------------------------------------------------------")
         self.logger.log.info("%4.2f | %4.2f"%(self.scenario_duration_system, self.scenario_duration_game))
+        self.logger.log.info("ticks: " + self.scheduler.summary(self.scenario_duration_system, self.scenario_duration_game))
+        self.logger.log.info("commands: %d issued, %d sent in %d ticks, at most %d per tick" % (
+            self.commands_issued, self.commands_sent, self.ticks, self.max_commands_per_tick))
+        if TTCEngine.min_distance != float("inf"):  # evaluated at least once
+            self.logger.log.info("time to collision: min %4.2f s, min distance %4.2f m, %d near misses" % (
+                TTCEngine.min_ttc, TTCEngine.min_distance, len(TTCEngine.near_misses)))
+
+        if self.profiler is not None:
+            self.logger.log.info("behavior tree profile, by total time\n" + self.profiler.report())
+            self.profiler.write_flamegraph(self.profile)
+            self.logger.log.info("flame graph written to %s" % self.profile)
+            self.profiler.detach()
 
         if self.scenario_tree.status == py_trees.common.Status.FAILURE:
             self.logger.log.warn("ScenarioManager: Terminated due to failure")
     
+    def _flush_commands(self, sim):
+        issued, sent = CommandBuffer.flush(sim)
+        self.commands_issued += issued
+        self.commands_sent += sent
+        self.max_commands_per_tick = max(self.max_commands_per_tick, sent)
+        if issued:
+            self.logger.log.debug("tick %d: %d commands issued, %d sent" % (self.ticks, issued, sent))
+
     def _tick_scenario(self):
         #TODO: return simulator currentTime and currentFrame        
         GameTime.on_server_tick(ServerDataProvider.game_timer)
@@ -14,6 +14,9 @@ from scenario.world import World
 from scenario.open_scenario import OpenScenario
 from scenarioconfigs.openscenario_configuration import OpenScenarioConfiguration
 from scenario.server_data_provider import * 
+from scenario.command_buffer import CommandBuffer
+from scenario.criteria_engine import CriteriaEngine
+from scenario.ttc import TTCEngine
 from scenario.follow_leading_vehicle import *
 from scenario.npc_cut_in import *
 from scenario.npc_cut_off import * 
@@ -126,6 +129,9 @@ class ScenarioRunner(object):
     def cleanup(self):
         ServerDataProvider.cleanup()
         ServerActorPool.cleanup()
+        CommandBuffer.clear()
+        CriteriaEngine.cleanup()
+        TTCEngine.cleanup()
         self.manager.restart()
         self.sim.reset()
         self.agents = []
@@ -139,7 +145,7 @@ class ScenarioRunner(object):
         
         for _ in range(self.repetitions): 
             self.logger.log.info("scenario: %s episode index: %d" % (self.scenario_name, _))
-            self.manager = ScenarioManager()
+            self.manager = ScenarioManager(args.tick_step, args.min_tick_step, args.max_tick_step, args.profile)
             try:
                 self.prepare_ego(config=config)
                 if self.ego is not None: 
@@ -147,7 +153,7 @@ class ScenarioRunner(object):
                 else :
                     self.cleanup()
                     continue 
-        #        ServerDataProvider.register_actor(self.ego)
+                ServerDataProvider.register_actor(self.ego)
                 ServerActorPool.set_world(self.sim)   
             except Exception as exception:
                 self.logger.log.error("this scenario can't load successfully")
@@ -171,7 +177,7 @@ class ScenarioRunner(object):
 
         config = OpenScenarioConfiguration(args.openscenario)
         
-        self.manager = ScenarioManager()
+        self.manager = ScenarioManager(args.tick_step, args.min_tick_step, args.max_tick_step, args.profile)
         try:
             self.prepare_ego(config=config)
             if self.ego is not None: 
@@ -180,7 +186,7 @@ class ScenarioRunner(object):
                 print("ego vehicle is not exist")
                 self.cleanup()
                 return  
-    #        ServerDataProvider.register_actor(self.ego)
+            ServerDataProvider.register_actor(self.ego)
             ServerActorPool.set_world(self.sim)   
         except Exception as exception:
             self.logger.log.error("this scenario can't load successfully")
@@ -219,6 +225,10 @@ def main():
     PARSER.add_argument('-openscenario', default=r'.\testcases\NpcCutIn.xosc', help='Provide an OpenSCENARIO definition')
     PARSER.add_argument('-run_mode', default="stand_alone", help="scenario run in stand_alone mode") 
     PARSER.add_argument('-time_of_day', default=10, help="time of day in current world" )    
+    PARSER.add_argument('-tick_step', type=float, default=0.5, help="simulated seconds per scenario tick while no trigger is close to firing")
+    PARSER.add_argument('-min_tick_step', type=float, default=0.05, help="smallest tick step, used when a trigger is about to fire")
+    PARSER.add_argument('-max_tick_step', type=float, default=None, help="largest tick step, used when nothing is pending (default: tick_step)")
+    PARSER.add_argument('-profile', default=None, help="profile the behavior tree and write a flame graph (collapsed stacks) to this file")
     
     ARGUMENTS =PARSER.parse_args()
     world = World(ARGUMENTS.map)
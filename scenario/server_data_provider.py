@@ -2,6 +2,8 @@ import logging
 import math 
 import random 
 import lgsvl 
+import numpy as np
+from scenario.trajectory import TrajectoryHistory
 
 
 def calculate_velocity(velocity):
@@ -29,34 +31,94 @@ class GameTime(object):
         self.currentFrame = jdic["current_frame"]
 
 
+# Columns of the per actor state rows
+POSITION = slice(0, 3)
+VELOCITY = slice(3, 6)
+ROTATION = slice(6, 9)
+ANGULAR_VELOCITY = slice(9, 12)
+STATE_SIZE = 12
+
+# Ticks kept in the trajectory history
+HISTORY_LENGTH = 64
+
+_ZERO = {"x": 0.0, "y": 0.0, "z": 0.0}
+
+
+def _xyz(jdic):
+    return (jdic["x"], jdic["y"], jdic["z"])
+
+
+def decode_states(states):
+    """
+    Decodes the agent states of an episode frame into an (N, STATE_SIZE) array
+    of position, velocity, rotation and angular velocity rows
+    """
+    if not states:
+        return np.zeros((0, STATE_SIZE))
+    return np.array([
+        _xyz(s["transform"]["position"]) + _xyz(s.get("velocity") or _ZERO)
+        + _xyz(s["transform"]["rotation"]) + _xyz(s.get("angular_velocity") or _ZERO)
+        for s in states], dtype=np.float64)
+
+
 class ServerDataProvider(object):
-    
-    _actor_velocity_map = dict() 
-    _actor_location_map = dict()
-    id2actor = dict()  
+    """
+    Latest state of the registered actors, updated from the episode stream on
+    every server tick. Each actor owns a slot (a row) of preallocated arrays, so
+    a tick is one vectorised copy and lookups are O(1) array reads.
+
+    Episode records of NPCs and ego vehicles are matched to actors by agent
+    uid, so behaviors and criteria never need to read agent states from the
+    simulator while a scenario ticks. Actors missing from a
+    frame keep their last state (see get_frame), records of agents registered
+    later are kept until registration.
+
+    The last HISTORY_LENGTH ticks are kept in a TrajectoryHistory, which provides
+    acceleration, jerk, heading rate and travelled distance of every actor.
+    """
+
+    _slots = dict()  # actor -> slot
+    _uid2slot = dict()  # agent uid -> slot
+    _state = np.zeros((0, STATE_SIZE))
+    _speed = np.zeros(0)
+    _frame = np.zeros(0, dtype=np.int64)  # game frame of the last update, -1 if never updated
+    _unregistered = dict()  # agent uid -> (frame, state row) of agents seen before registration
+    id2actor = dict()  # slot -> actor
     game_timer = GameTime()
+    history = TrajectoryHistory(HISTORY_LENGTH)
+
+    @staticmethod
+    def _reserve(count):
+        capacity = len(ServerDataProvider._speed)
+        if count <= capacity:
+            return
+        capacity = max(16, 2 * capacity, count)
+        state = np.zeros((capacity, STATE_SIZE))
+        speed = np.zeros(capacity)
+        frame = np.full(capacity, -1, dtype=np.int64)
+        n = len(ServerDataProvider._speed)
+        state[:n] = ServerDataProvider._state
+        speed[:n] = ServerDataProvider._speed
+        frame[:n] = ServerDataProvider._frame
+        ServerDataProvider._state, ServerDataProvider._speed, ServerDataProvider._frame = state, speed, frame
 
     @staticmethod
     def register_actor(actor):
         """
-        Add new actor to dictionaries
+        Assigns a state slot to actor
         If actor already exists, throw an exception
         """
-        if actor not in (ServerDataProvider.id2actor).values():
-            id =  len(ServerDataProvider.id2actor)
-            ServerDataProvider.id2actor[id] = actor 
-  
-        if actor in ServerDataProvider._actor_velocity_map:
+        if actor in ServerDataProvider._slots:
             raise KeyError(
                 "Vehicle '{}' already registered. Cannot register twice!".format(actor))
-        else:
-            ServerDataProvider._actor_velocity_map[actor] = 0.0
-
-        if actor in ServerDataProvider._actor_location_map:
-            raise KeyError(
-                "Vehicle '{}' already registered. Cannot register twice!".format(actor.id))
-        else:
-            ServerDataProvider._actor_location_map[actor] = None
+        slot = len(ServerDataProvider._slots)
+        ServerDataProvider._reserve(slot + 1)
+        ServerDataProvider._slots[actor] = slot
+        ServerDataProvider._uid2slot[actor.uid] = slot
+        ServerDataProvider.id2actor[slot] = actor
+        if actor.uid in ServerDataProvider._unregistered:
+            frame, row = ServerDataProvider._unregistered.pop(actor.uid)
+            ServerDataProvider.update(np.array([slot]), row[np.newaxis], frame)
 
     @staticmethod
     def register_actors(actors):
@@ -73,47 +135,156 @@ class ServerDataProvider(object):
     #TODO: add condition variable / lock
     @staticmethod 
     def on_server_tick(episode_state=None):  
-        npcs_state = []
-        id = 0  
-        tmp_position = lgsvl.Vector(0,0,0)
-        tmp_velocity = lgsvl.Vector(0,0,0)
-        if episode_state is not None:
-            npcs_state = episode_state["npcs_state"] #list
-            #TODO
-            for id in range(len(npcs_state)):
-                cur_velocity = npcs_state[id]["velocity"]
-                tmp_velocity = json2vector(cur_velocity)
-                cur_position = npcs_state[id]["transform"]["position"]
-                tmp_position = json2vector(cur_position)
-                logging.debug("on_server_tick() tmp_velocity %4.2f, %4.2f, %4.2f" %(tmp_velocity.x, tmp_velocity.y, tmp_velocity.z))
-                if id in ServerDataProvider.id2actor:
-                    actor = ServerDataProvider.id2actor[id]
-                    ServerDataProvider._actor_velocity_map[actor] = calculate_velocity(tmp_velocity)  
-                    ServerDataProvider._actor_location_map[actor] = tmp_position           
-                    logging.debug("test with id %4d, on_server_tick velocity %4.2f" % (id, ServerDataProvider.get_velocity(actor)))
-                    logging.debug("test with id %4d, on_server_tick position.x %4.2f" % (id, ServerDataProvider.get_location(actor).x))                    
-                else:
-                    logging.debug("debug id2actor %d" % id)
-            ServerDataProvider.game_timer.from_json(episode_state["game_time"])
-           
+        if episode_state is None:
+            return
+        ServerDataProvider.game_timer.from_json(episode_state["game_time"])
+        frame = ServerDataProvider.game_timer.currentFrame
+        records = episode_state["npcs_state"] + ServerDataProvider.ego_records(episode_state)
+        states = decode_states(records)
+        uid2slot = ServerDataProvider._uid2slot
+        slots = np.array([uid2slot.get(r.get("agent_id"), -1) for r in records], dtype=np.int64)
+        known = slots >= 0
+        ServerDataProvider.update(slots[known], states[known], frame)
+        if not known.all():
+            for i in np.flatnonzero(~known):
+                uid = records[i].get("agent_id")
+                if uid is not None:
+                    ServerDataProvider._unregistered[uid] = (frame, states[i])
+
+        n = len(ServerDataProvider._slots)
+        state = ServerDataProvider._state[:n]
+        ServerDataProvider.history.record(ServerDataProvider.game_timer.currentTime,
+            state[:, POSITION], state[:, VELOCITY], state[:, ROTATION], ServerDataProvider._frame[:n] == frame)
+
+    @staticmethod
+    def ego_records(episode_state):
+        """States of all ego vehicles, older simulators only send the first one as ego_state"""
+        if "egos_state" in episode_state:
+            return episode_state["egos_state"]
+        if episode_state.get("ego_state"):
+            return [episode_state["ego_state"]]
+        return []
+
+    @staticmethod
+    def update(slots, states, frame=0):
+        """Stores (N, STATE_SIZE) state rows in the given slots"""
+        ServerDataProvider._state[slots] = states
+        ServerDataProvider._speed[slots] = np.linalg.norm(states[:, VELOCITY], axis=1)
+        ServerDataProvider._frame[slots] = frame
+
+    @staticmethod
+    def _slot(actor):
+        slot = ServerDataProvider._slots.get(actor)
+        if slot is None or ServerDataProvider._frame[slot] < 0:
+            return None
+        return slot
+
+    @staticmethod
+    def get_frame(actor):
+        """Game frame of the last state received for actor, None if none was received yet"""
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
+            return None
+        return int(ServerDataProvider._frame[slot])
+
     @staticmethod 
     def get_velocity(actor):
-        if actor not in ServerDataProvider._actor_velocity_map.keys():
+        """Speed of actor in m/s"""
+        slot = ServerDataProvider._slots.get(actor)
+        if slot is None:
             print(actor.name+" is not in actor list")
             return 0.0
-        return ServerDataProvider._actor_velocity_map[actor]
+        return float(ServerDataProvider._speed[slot])
 
     @staticmethod
     def get_location(actor):
-        if actor not in ServerDataProvider._actor_location_map.keys():
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
+            return None
+        return lgsvl.Vector(*ServerDataProvider._state[slot, POSITION].tolist())
+
+    @staticmethod
+    def get_velocity_vector(actor):
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
+            return None
+        return lgsvl.Vector(*ServerDataProvider._state[slot, VELOCITY].tolist())
+
+    @staticmethod
+    def get_angular_velocity(actor):
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
+            return None
+        return lgsvl.Vector(*ServerDataProvider._state[slot, ANGULAR_VELOCITY].tolist())
+
+    @staticmethod
+    def get_transform(actor):
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
+            return None
+        row = ServerDataProvider._state[slot].tolist()
+        return lgsvl.Transform(lgsvl.Vector(*row[POSITION]), lgsvl.Vector(*row[ROTATION]))
+
+    @staticmethod
+    def get_state(actor):
+        """Latest lgsvl.AgentState of actor, None if none was received yet"""
+        slot = ServerDataProvider._slot(actor)
+        if slot is None:
             return None
-        return ServerDataProvider._actor_location_map[actor]
+        row = ServerDataProvider._state[slot].tolist()
+        transform = lgsvl.Transform(lgsvl.Vector(*row[POSITION]), lgsvl.Vector(*row[ROTATION]))
+        return lgsvl.AgentState(transform, lgsvl.Vector(*row[VELOCITY]), lgsvl.Vector(*row[ANGULAR_VELOCITY]))
+
+    @staticmethod
+    def get_acceleration(actor):
+        """Finite difference acceleration over the last two ticks, None if unknown"""
+        slot = ServerDataProvider._slot(actor)
+        if slot is None or slot >= ServerDataProvider.history.size or np.isnan(ServerDataProvider.history.acceleration[slot, 0]):
+            return None
+        return lgsvl.Vector(*ServerDataProvider.history.acceleration[slot].tolist())
+
+    @staticmethod
+    def get_jerk(actor):
+        """Finite difference jerk over the last three ticks, None if unknown"""
+        slot = ServerDataProvider._slot(actor)
+        if slot is None or slot >= ServerDataProvider.history.size or np.isnan(ServerDataProvider.history.jerk[slot, 0]):
+            return None
+        return lgsvl.Vector(*ServerDataProvider.history.jerk[slot].tolist())
+
+    @staticmethod
+    def get_heading_rate(actor):
+        """Yaw rate in degrees per second over the last two ticks, None if unknown"""
+        slot = ServerDataProvider._slot(actor)
+        if slot is None or slot >= ServerDataProvider.history.size or np.isnan(ServerDataProvider.history.heading_rate[slot]):
+            return None
+        return float(ServerDataProvider.history.heading_rate[slot])
+
+    @staticmethod
+    def get_odometer(actor):
+        """Distance actor travelled since its first state, differences give the distance between two ticks"""
+        slot = ServerDataProvider._slots.get(actor)
+        if slot is None or slot >= ServerDataProvider.history.size:
+            return 0.0
+        return float(ServerDataProvider.history.odometer[slot])
+
+    @staticmethod
+    def get_history(actor, length=None):
+        """(time, position, velocity, rotation) arrays of the last length ticks of actor, oldest first"""
+        slot = ServerDataProvider._slots.get(actor)
+        if slot is None:
+            return np.zeros(0), np.zeros((0, 3)), np.zeros((0, 3)), np.zeros((0, 3))
+        return ServerDataProvider.history.window(slot, length)
 
     @staticmethod 
     def cleanup():
         ServerDataProvider.id2actor.clear()
-        ServerDataProvider._actor_velocity_map.clear()
-        ServerDataProvider._actor_location_map.clear()
+        ServerDataProvider._slots.clear()
+        ServerDataProvider._uid2slot.clear()
+        ServerDataProvider._unregistered.clear()
+        ServerDataProvider._state[:] = 0.0
+        ServerDataProvider._speed[:] = 0.0
+        ServerDataProvider._frame[:] = -1
+        ServerDataProvider.history.clear()
 
 class ServerActorPool(object):
 
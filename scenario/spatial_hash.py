@@ -0,0 +1,90 @@
+import math
+from collections import defaultdict
+
+
+def _xz(position):
+    # accepts lgsvl.Vector (ground plane is x/z) or an (x, z) pair
+    if hasattr(position, "z"):
+        return position.x, position.z
+    return position[0], position[1]
+
+
+class SpatialHash(object):
+    """
+    Uniform grid over the x/z ground plane answering "is any actor closer than r to p"
+    queries. Keys are arbitrary hashable actor handles.
+
+    With cell_size close to the typical query radius, insert, remove and query only
+    touch a handful of cells, so placing n actors with proximity checks is O(n)
+    instead of O(n^2).
+    """
+
+    def __init__(self, cell_size=5.0):
+        self.cell_size = float(cell_size)
+        self._cells = defaultdict(dict)  # cell -> {key: (x, z)}
+        self._entries = {}  # key -> cell
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _cell(self, x, z):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(z / self.cell_size)))
+
+    def clear(self):
+        self._cells.clear()
+        self._entries.clear()
+
+    def insert(self, key, position):
+        """Adds key at position, moving it if it is already present"""
+        if key in self._entries:
+            self.remove(key)
+        x, z = _xz(position)
+        cell = self._cell(x, z)
+        self._cells[cell][key] = (x, z)
+        self._entries[key] = cell
+
+    def remove(self, key):
+        cell = self._entries.pop(key)
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def _candidates(self, x, z, radius):
+        x0, z0 = self._cell(x - radius, z - radius)
+        x1, z1 = self._cell(x + radius, z + radius)
+        for i in range(x0, x1 + 1):
+            for j in range(z0, z1 + 1):
+                bucket = self._cells.get((i, j))
+                if bucket:
+                    for key, point in bucket.items():
+                        yield key, point
+
+    def query(self, position, radius, box=False, exclude=None):
+        """
+        Returns the keys closer than radius to position. Distances are euclidean, or
+        per axis (an axis aligned square of half size radius) when box is True.
+        """
+        x, z = _xz(position)
+        found = []
+        for key, (px, pz) in self._candidates(x, z, radius):
+            if (exclude is None or key != exclude) and _within(px - x, pz - z, radius, box):
+                found.append(key)
+        return found
+
+    def any_within(self, position, radius, box=False, exclude=None):
+        """Same as query, but stops at the first key found"""
+        x, z = _xz(position)
+        for key, (px, pz) in self._candidates(x, z, radius):
+            if (exclude is None or key != exclude) and _within(px - x, pz - z, radius, box):
+                return True
+        return False
+
+
+def _within(dx, dz, radius, box):
+    if box:
+        return abs(dx) < radius and abs(dz) < radius
+    return dx * dx + dz * dz < radius * radius
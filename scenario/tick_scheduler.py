@@ -0,0 +1,67 @@
+class TickScheduler(object):
+    """
+    Chooses how much simulated time ScenarioManager runs before the next tick of
+    the scenario tree.
+
+    Triggers that have not fired yet report an estimate of the simulated time
+    left until they fire (see report). The next step is a fraction (safety) of
+    the smallest estimate, clamped to [min_step, max_step], so a trigger fires
+    at most a small step late. When nothing is close to firing the step grows
+    back by relax per tick, up to max_step.
+
+    max_step defaults to base_step, so criteria are never checked less often
+    than with a fixed base_step. A larger max_step lets stretches without a
+    pending trigger run with longer steps.
+    """
+
+    _estimates = []  # reported during the current tick
+
+    def __init__(self, base_step=0.5, min_step=0.05, max_step=None, safety=0.5, relax=1.5):
+        if max_step is None:
+            max_step = base_step
+        if not 0 < min_step <= base_step <= max_step:
+            raise ValueError("expected 0 < min_step <= base_step <= max_step")
+        self.base_step = base_step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.safety = safety
+        self.relax = relax
+        self.restart()
+
+    def restart(self):
+        self.step = self.base_step
+        self.ticks = 0
+        self.tightened = 0  # ticks with a step below base_step
+        self.simulated = 0.0
+        self.smallest_step = self.step
+        TickScheduler._estimates = []
+
+    @staticmethod
+    def report(time_to_fire):
+        """Called by triggers during a tick with the simulated seconds left until they fire"""
+        if time_to_fire == time_to_fire and time_to_fire != float("inf"):  # skip NaN and inf
+            TickScheduler._estimates.append(max(time_to_fire, 0.0))
+
+    def next_step(self):
+        """Consumes the estimates reported during the tick that just ran and returns the next step"""
+        self.ticks += 1
+        self.simulated += self.step
+        estimates, TickScheduler._estimates = TickScheduler._estimates, []
+
+        step = min(self.step * self.relax, self.max_step)
+        if estimates:
+            step = min(step, max(self.safety * min(estimates), self.min_step))
+        self.step = max(step, self.min_step)
+
+        if self.step < self.base_step:
+            self.tightened += 1
+        self.smallest_step = min(self.smallest_step, self.step)
+        return self.step
+
+    def summary(self, system_time, game_time=None):
+        """One line report; the real-time factor is game time (the requested steps if None) over system time"""
+        if game_time is None:
+            game_time = self.simulated
+        rtf = game_time / system_time if system_time > 0 else float("inf")
+        return "%d ticks, %d tightened, step mean %4.3f s min %4.3f s, real-time factor %4.2f" % (
+            self.ticks, self.tightened, self.simulated / max(self.ticks, 1), self.smallest_step, rtf)
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+def _wrap_degrees(angle):
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+class TrajectoryHistory(object):
+    """
+    Fixed capacity history of the positions, velocities and rotations of all
+    actors, one row per server tick stored in circular arrays.
+
+    Derived quantities (finite difference acceleration and jerk, heading rate and
+    travelled distance) are computed for all actors at once when a tick is
+    recorded, so behaviors and criteria reading them share one computation per
+    tick. Values that cannot be computed yet (too few ticks, actor not seen) are NaN.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.count = 0  # ticks recorded since the last clear
+        self.time = np.zeros(capacity)
+        self.position = np.zeros((capacity, 0, 3))
+        self.velocity = np.zeros((capacity, 0, 3))
+        self.rotation = np.zeros((capacity, 0, 3))
+        self.valid = np.zeros((capacity, 0), dtype=bool)
+        self.acceleration = np.zeros((0, 3))
+        self.jerk = np.zeros((0, 3))
+        self.heading_rate = np.zeros(0)
+        self.odometer = np.zeros(0)  # distance travelled since the actor was first seen
+
+    @property
+    def size(self):
+        return len(self.odometer)
+
+    def _reserve(self, size):
+        if size <= self.size:
+            return
+        grow = size - self.size
+        pad = lambda a, value: np.concatenate([a, np.full(a.shape[:1] + (grow,) + a.shape[2:], value, a.dtype)], axis=1)
+        self.position = pad(self.position, 0.0)
+        self.velocity = pad(self.velocity, 0.0)
+        self.rotation = pad(self.rotation, 0.0)
+        self.valid = pad(self.valid, False)
+        self.acceleration = np.concatenate([self.acceleration, np.full((grow, 3), np.nan)])
+        self.jerk = np.concatenate([self.jerk, np.full((grow, 3), np.nan)])
+        self.heading_rate = np.concatenate([self.heading_rate, np.full(grow, np.nan)])
+        self.odometer = np.concatenate([self.odometer, np.zeros(grow)])
+
+    def clear(self):
+        self.count = 0
+        self.valid[:] = False
+        self.acceleration[:] = np.nan
+        self.jerk[:] = np.nan
+        self.heading_rate[:] = np.nan
+        self.odometer[:] = 0.0
+
+    def _rows(self, length):
+        """Ring indices of the last length ticks, oldest first"""
+        return np.arange(self.count - length, self.count) % self.capacity
+
+    def record(self, time, position, velocity, rotation, valid):
+        """
+        Appends one tick; position, velocity and rotation are (N, 3) arrays of the
+        first N actor slots, valid marks the slots that have a state
+        """
+        n = len(valid)
+        self._reserve(n)
+        row = self.count % self.capacity
+        self.time[row] = time
+        self.position[row, :n] = position
+        self.velocity[row, :n] = velocity
+        self.rotation[row, :n] = rotation
+        self.valid[row, :n] = valid
+        self.valid[row, n:] = False
+        self.count += 1
+        self._derive()
+
+    def _derive(self):
+        rows = self._rows(min(self.count, 3, self.capacity))
+        t = self.time[rows]
+        valid = self.valid[rows].all(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if len(rows) >= 2:
+                p0, p1 = self.position[rows[-2]], self.position[rows[-1]]
+                step = np.linalg.norm(p1 - p0, axis=1)
+                moved = self.valid[rows[-2]] & self.valid[rows[-1]]
+                self.odometer += np.where(moved, step, 0.0)
+
+                dt = t[-1] - t[-2]
+                pair = self.valid[rows[-2:]].all(axis=0) & (dt > 0)
+                v = self.velocity[rows[-2:]]
+                self.acceleration[:] = np.where(pair[:, np.newaxis], (v[1] - v[0]) / dt, np.nan)
+                yaw = self.rotation[rows[-2:], :, 1]
+                self.heading_rate[:] = np.where(pair, _wrap_degrees(yaw[1] - yaw[0]) / dt, np.nan)
+            if len(rows) >= 3:
+                v = self.velocity[rows]
+                dt0, dt1 = t[1] - t[0], t[2] - t[1]
+                a0 = (v[1] - v[0]) / dt0
+                a1 = (v[2] - v[1]) / dt1
+                ok = valid & (dt0 > 0) & (dt1 > 0)
+                self.jerk[:] = np.where(ok[:, np.newaxis], (a1 - a0) / (0.5 * (dt0 + dt1)), np.nan)
+            else:
+                self.jerk[:] = np.nan
+
+    def window(self, slot, length=None):
+        """(time, position, velocity, rotation) of the last length ticks of a slot with a state, oldest first"""
+        length = min(self.count, self.capacity) if length is None else min(length, self.count, self.capacity)
+        rows = self._rows(length)
+        rows = rows[self.valid[rows, slot]] if slot < self.size else rows[:0]
+        return self.time[rows], self.position[rows, slot], self.velocity[rows, slot], self.rotation[rows, slot]
+
+    def path_length(self, slot, length=None):
+        """Distance travelled by a slot over the last length ticks"""
+        _, position, _, _ = self.window(slot, length)
+        if len(position) < 2:
+            return 0.0
+        return float(np.linalg.norm(np.diff(position, axis=0), axis=1).sum())
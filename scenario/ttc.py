@@ -0,0 +1,384 @@
+"""
+Time to collision and minimum distance between actors
+
+Actors are oriented boxes on the x/z ground plane (from Agent.bounding_box and
+the yaw of the actor). For every pair, time_to_collision predicts the motion of
+both boxes with constant velocity, or constant acceleration, and returns the
+first time within the horizon at which they overlap. A circle test on the
+closest approach of the centers first discards pairs that cannot meet.
+
+With constant velocity the first overlap is exact: on each separating axis the
+projections of two boxes overlap during one time interval, and the boxes
+overlap in the intersection of these intervals. With constant acceleration the
+remaining pairs are checked with the separating axis test at sampled times,
+spaced so that the boxes move relative to each other by less than their
+smallest extent between samples, and hits are refined by bisection. All
+functions work on arrays of pairs.
+
+With many actors, predicted_pairs limits the pairs to those the broad phase
+(scenario.broad_phase) finds close enough to meet within the horizon.
+"""
+
+import logging
+from collections import Counter
+
+import numpy as np
+
+from scenario.broad_phase import candidate_pairs
+from scenario.server_data_provider import ServerDataProvider, POSITION, VELOCITY, ROTATION
+
+# center offset x, z and half size x, z of the box used for actors without a bounding box
+DEFAULT_BOX = (0.0, 0.0, 1.0, 2.3)
+
+
+def box_axes(yaw):
+    """Right and forward unit vectors (x, z) of boxes rotated by yaw degrees about y"""
+    r = np.radians(yaw)
+    right = np.stack([np.cos(r), -np.sin(r)], axis=-1)
+    forward = np.stack([np.sin(r), np.cos(r)], axis=-1)
+    return right, forward
+
+
+def box_corners(center, right, forward, half):
+    """(..., 4, 2) corners of boxes"""
+    signs = np.array([[1, 1], [1, -1], [-1, -1], [-1, 1]], dtype=np.float64)
+    x = signs[:, 0, np.newaxis] * (half[..., np.newaxis, 0:1] * right[..., np.newaxis, :])
+    z = signs[:, 1, np.newaxis] * (half[..., np.newaxis, 1:2] * forward[..., np.newaxis, :])
+    return center[..., np.newaxis, :] + x + z
+
+
+def _reach(axis, ra, fa, ha, rb, fb, hb):
+    """Sum of the half extents of two boxes projected on axis"""
+    dot = lambda u: np.abs(np.sum(u * axis, axis=-1))
+    return ha[..., 0] * dot(ra) + ha[..., 1] * dot(fa) + hb[..., 0] * dot(rb) + hb[..., 1] * dot(fb)
+
+
+def boxes_overlap(ca, ra, fa, ha, cb, rb, fb, hb):
+    """Separating axis test of pairs of oriented boxes, arrays broadcast over leading dimensions"""
+    d = cb - ca
+    overlap = np.ones(np.broadcast(d[..., 0], ha[..., 0], hb[..., 0]).shape, dtype=bool)
+    for axis in (ra, fa, rb, fb):
+        overlap &= np.abs(np.sum(d * axis, axis=-1)) <= _reach(axis, ra, fa, ha, rb, fb, hb)
+    return overlap
+
+
+def entry_time(ca, ra, fa, ha, va, cb, rb, fb, hb, vb, horizon):
+    """
+    First time in [0, horizon] at which pairs of boxes moving with constant
+    velocity (and constant orientation) overlap, inf if they do not
+    """
+    d, v = cb - ca, vb - va
+    enter = np.zeros(len(d))
+    leave = np.full(len(d), float(horizon))
+    for axis in (ra, fa, rb, fb):
+        reach = _reach(axis, ra, fa, ha, rb, fb, hb)
+        s, w = np.sum(d * axis, axis=-1), np.sum(v * axis, axis=-1)
+        # |s + w t| <= reach for t in [lo, hi], always or never when the projections do not move
+        moving = w != 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0, t1 = (-reach - s) / w, (reach - s) / w
+        inside = np.abs(s) <= reach
+        lo = np.where(moving, np.minimum(t0, t1), np.where(inside, -np.inf, np.inf))
+        hi = np.where(moving, np.maximum(t0, t1), np.where(inside, np.inf, -np.inf))
+        enter = np.maximum(enter, lo)
+        leave = np.minimum(leave, hi)
+    return np.where(enter <= leave, enter, np.inf)
+
+
+def _point_segment_distance(p, a, b):
+    ab = b - a
+    t = np.clip(np.sum((p - a) * ab, axis=-1) / np.maximum(np.sum(ab * ab, axis=-1), 1e-12), 0.0, 1.0)
+    return np.linalg.norm(a + t[..., np.newaxis] * ab - p, axis=-1)
+
+
+def boxes_distance(ca, ra, fa, ha, cb, rb, fb, hb):
+    """Distance between pairs of oriented boxes, 0 where they overlap"""
+    corners_a = box_corners(ca, ra, fa, ha)
+    corners_b = box_corners(cb, rb, fb, hb)
+    edges = lambda c: (c, np.roll(c, -1, axis=-2))
+    # every corner of one box against every edge of the other: (M, 4 corners, 4 edges)
+    a0, a1 = edges(corners_a)
+    b0, b1 = edges(corners_b)
+    d_ab = _point_segment_distance(corners_a[..., :, np.newaxis, :], b0[..., np.newaxis, :, :], b1[..., np.newaxis, :, :])
+    d_ba = _point_segment_distance(corners_b[..., :, np.newaxis, :], a0[..., np.newaxis, :, :], a1[..., np.newaxis, :, :])
+    distance = np.minimum(d_ab.min(axis=(-2, -1)), d_ba.min(axis=(-2, -1)))
+    return np.where(boxes_overlap(ca, ra, fa, ha, cb, rb, fb, hb), 0.0, distance)
+
+
+def oriented_boxes(position, yaw, box):
+    """center, right, forward and half size arrays of the boxes of actors at position with yaw"""
+    right, forward = box_axes(yaw)
+    offset, half = box[:, 0:2], box[:, 2:4]
+    center = position + offset[:, 0:1] * right + offset[:, 1:2] * forward
+    return center, right, forward, half
+
+
+def all_pairs(n):
+    """(i, j) index arrays of all pairs i < j"""
+    return np.triu_indices(n, 1)
+
+
+def ego_pairs(ego, n):
+    """(i, j) index arrays pairing ego with every other index"""
+    j = np.delete(np.arange(n), ego)
+    return np.full(len(j), ego), j
+
+
+def predicted_pairs(position, velocity, yaw, box, acceleration=None, horizon=5.0):
+    """(i, j) index arrays of the pairs whose swept boxes overlap within horizon, see time_to_collision"""
+    center, _, _, half = oriented_boxes(position, yaw, box)
+    return candidate_pairs(center, velocity, np.linalg.norm(half, axis=1), horizon, acceleration)
+
+
+def time_to_collision(position, velocity, yaw, box, acceleration=None, pairs=None, horizon=5.0, steps=20, refine=8, max_steps=1024):
+    """
+    position, velocity, acceleration: (N, 2) x/z arrays, yaw: (N,) degrees
+    box: (N, 4) center offset x, z and half size x, z in the actor frame
+    acceleration: None for the constant velocity model
+    pairs: (i, j) index arrays, all pairs if None
+    steps, max_steps: bounds of the number of samples over the horizon (constant acceleration only)
+    Returns i, j, ttc (inf if no collision within horizon, 0 if overlapping now)
+    and the current distance between the boxes of every pair.
+    """
+    i, j = all_pairs(len(position)) if pairs is None else pairs
+    center, right, forward, half = oriented_boxes(position, yaw, box)
+    if acceleration is None:
+        acceleration = np.zeros_like(velocity)
+
+    distance = boxes_distance(center[i], right[i], forward[i], half[i], center[j], right[j], forward[j], half[j])
+    ttc = np.full(len(i), np.inf)
+    ttc[distance == 0.0] = 0.0
+
+    # broad phase: closest approach of the centers against the sum of the bounding radii
+    radius = np.linalg.norm(half, axis=1)
+    p = center[j] - center[i]
+    v = velocity[j] - velocity[i]
+    a = acceleration[j] - acceleration[i]
+    vv = np.sum(v * v, axis=1)
+    t = np.clip(-np.sum(p * v, axis=1) / np.maximum(vv, 1e-12), 0.0, horizon)
+    closest = np.linalg.norm(p + v * t[:, np.newaxis], axis=1) - 0.5 * np.linalg.norm(a, axis=1) * horizon ** 2
+    candidates = np.flatnonzero((closest <= radius[i] + radius[j]) & (ttc > 0.0))
+    if len(candidates) == 0:
+        return i, j, ttc, distance
+
+    # exact entry time of the pairs moving with constant relative velocity
+    steady = ~a[candidates].any(axis=1)
+    ci, cj = i[candidates[steady]], j[candidates[steady]]
+    ttc[candidates[steady]] = entry_time(center[ci], right[ci], forward[ci], half[ci], velocity[ci],
+        center[cj], right[cj], forward[cj], half[cj], velocity[cj], horizon)
+    candidates = candidates[~steady]
+    if len(candidates) == 0:
+        return i, j, ttc, distance
+    ci, cj = i[candidates], j[candidates]
+
+    def overlap_at(times, pairs):
+        # times: (S, M) or (M,) for the M pairs given by index, yaw is held constant over the horizon
+        ci, cj = i[pairs], j[pairs]
+        tt = times[..., np.newaxis]
+        move = lambda k: center[k] + velocity[k] * tt + 0.5 * acceleration[k] * tt * tt
+        return boxes_overlap(move(ci), right[ci], forward[ci], half[ci], move(cj), right[cj], forward[cj], half[cj])
+
+    # samples per pair: relative displacement between samples below the smallest extent of both boxes
+    extent = 2.0 * np.minimum(half[ci].min(axis=1), half[cj].min(axis=1))
+    travel = (np.linalg.norm(v[candidates], axis=1) + np.linalg.norm(a[candidates], axis=1) * horizon) * horizon
+    needed = np.clip(np.ceil(travel / np.maximum(extent, 1e-3)), steps, max_steps)
+    # pairs sampled together in power of two groups of sample counts
+    groups = 2 ** np.ceil(np.log2(needed)).astype(np.int64)
+    for count in np.unique(groups):
+        group = candidates[groups == count]
+        samples = np.linspace(0.0, horizon, count + 1)
+        hits = overlap_at(np.repeat(samples[:, np.newaxis], len(group), axis=1), group)
+        hit = hits.any(axis=0)
+        colliding = group[hit]
+        first = hits.argmax(axis=0)[hit]
+        lo = samples[np.maximum(first - 1, 0)]
+        hi = samples[first]
+        for _ in range(refine):
+            mid = 0.5 * (lo + hi)
+            inside = overlap_at(mid, colliding)
+            hi = np.where(inside, mid, hi)
+            lo = np.where(inside, lo, mid)
+        ttc[colliding] = hi
+    return i, j, ttc, distance
+
+
+def most_critical(i, j, ttc, distance, k):
+    """Indices into the pair arrays of the k most critical pairs: smallest ttc, then smallest distance"""
+    order = np.lexsort((distance, ttc))
+    return order[:k]
+
+
+class TTCEngine(object):
+    """
+    Time to collision over the actors in the ServerDataProvider, evaluated once
+    per server tick when first needed. By default only the pairs found by the
+    broad phase get the exact test, all pairs if broad_phase is False. Triggers
+    read single pairs (get_ttc, get_distance), KPIs the most critical pairs and
+    the minimum time to collision and distance seen during the run.
+
+    A pair becomes a near miss when its boxes, not touching, are predicted to
+    collide within near_miss_ttc seconds or are closer than near_miss_distance.
+    Every near miss is logged once when it starts and kept in near_misses.
+    """
+
+    horizon = 5.0
+    steps = 20
+    constant_acceleration = False
+    broad_phase = True
+    k = 10
+    near_miss_ttc = 1.0
+    near_miss_distance = 0.5
+    _boxes = dict()  # actor -> (offset x, offset z, half size x, half size z)
+    _evaluated_tick = -1
+    ttc = {}  # (slot, slot) pair, lower slot first -> ttc of the pairs tested in the last tick
+    distance = {}  # (slot, slot) pair -> distance of the tested pairs and those computed since, see get_distance
+    critical = []  # (actor, other, ttc, distance) of the k most critical pairs of the last tick
+    min_ttc = float("inf")
+    min_distance = float("inf")
+    near_misses = []  # (game time, actor, other, ttc, distance) when each near miss started
+    _near = set()  # slot pairs in a near miss during the last tick
+    _near_miss_count = Counter()  # actor or frozenset of the actor pair -> near misses
+
+    @staticmethod
+    def configure(horizon=5.0, steps=20, constant_acceleration=False, broad_phase=True, k=10,
+                  near_miss_ttc=1.0, near_miss_distance=0.5):
+        TTCEngine.horizon = horizon
+        TTCEngine.steps = steps
+        TTCEngine.constant_acceleration = constant_acceleration
+        TTCEngine.broad_phase = broad_phase
+        TTCEngine.k = k
+        TTCEngine.near_miss_ttc = near_miss_ttc
+        TTCEngine.near_miss_distance = near_miss_distance
+        TTCEngine._evaluated_tick = -1
+
+    @staticmethod
+    def box(actor):
+        """Box of actor in its own frame, the bounding box is requested from the simulator once"""
+        if actor not in TTCEngine._boxes:
+            bbox = getattr(actor, "bounding_box", None)
+            if bbox is None:
+                TTCEngine._boxes[actor] = DEFAULT_BOX
+            else:
+                center, size = bbox.center, bbox.size
+                TTCEngine._boxes[actor] = (center.x, center.z, 0.5 * size.x, 0.5 * size.z)
+        return TTCEngine._boxes[actor]
+
+    @staticmethod
+    def _inputs(slots):
+        """position, velocity, yaw, box and acceleration (None for constant velocity) of slots"""
+        provider = ServerDataProvider
+        state = provider._state[slots]
+        xz = [0, 2]
+        acceleration = None
+        if TTCEngine.constant_acceleration:
+            acceleration = np.zeros((len(slots), 2))
+            history = provider.history.acceleration
+            known = slots < len(history)
+            acceleration[known] = np.nan_to_num(history[slots[known]][:, xz])
+        box = np.array([TTCEngine.box(provider.id2actor[s]) for s in slots], dtype=np.float64).reshape(-1, 4)
+        return state[:, POSITION][:, xz], state[:, VELOCITY][:, xz], state[:, ROTATION][:, 1], box, acceleration
+
+    @staticmethod
+    def evaluate():
+        provider = ServerDataProvider
+        count = len(provider._slots)
+        TTCEngine.critical = []
+        TTCEngine._evaluated_tick = provider.history.count
+
+        slots = np.flatnonzero(provider._frame[:count] >= 0)
+        position, velocity, yaw, box, acceleration = TTCEngine._inputs(slots)
+        pairs = None
+        if TTCEngine.broad_phase:
+            pairs = predicted_pairs(position, velocity, yaw, box, acceleration, TTCEngine.horizon)
+        i, j, ttc, distance = time_to_collision(position, velocity, yaw, box, acceleration, pairs,
+            horizon=TTCEngine.horizon, steps=TTCEngine.steps)
+        si, sj = slots[i], slots[j]
+        # only the tested pairs are kept, slots are sorted so si < sj
+        keys = list(zip(si.tolist(), sj.tolist()))
+        TTCEngine.ttc = dict(zip(keys, ttc.tolist()))
+        TTCEngine.distance = dict(zip(keys, distance.tolist()))
+        actors = provider.id2actor
+        for p in most_critical(i, j, ttc, distance, TTCEngine.k):
+            TTCEngine.critical.append((actors[si[p]], actors[sj[p]], float(ttc[p]), float(distance[p])))
+        if len(ttc):
+            TTCEngine.min_ttc = min(TTCEngine.min_ttc, float(ttc.min()))
+            TTCEngine.min_distance = min(TTCEngine.min_distance, float(distance.min()))
+
+        near = (distance > 0.0) & ((ttc < TTCEngine.near_miss_ttc) | (distance < TTCEngine.near_miss_distance))
+        current = set()
+        for p in np.flatnonzero(near):
+            pair = (int(si[p]), int(sj[p]))
+            current.add(pair)
+            if pair not in TTCEngine._near:
+                TTCEngine._on_near_miss(actors[pair[0]], actors[pair[1]], float(ttc[p]), float(distance[p]))
+        TTCEngine._near = current
+
+    @staticmethod
+    def _on_near_miss(actor, other, ttc, distance):
+        logging.warning("near miss actor {} with actor {}: time to collision {:.2f} s, distance {:.2f} m".format(
+            actor, other, ttc, distance))
+        TTCEngine.near_misses.append((ServerDataProvider.game_timer.currentTime, actor, other, ttc, distance))
+        TTCEngine._near_miss_count.update([actor, other, frozenset((actor, other))])
+
+    @staticmethod
+    def _update():
+        if TTCEngine._evaluated_tick != ServerDataProvider.history.count:
+            TTCEngine.evaluate()
+
+    @staticmethod
+    def on_server_tick():
+        """Evaluates every tick so that near misses are logged when no criterion or trigger reads the engine"""
+        if len(ServerDataProvider._slots) > 1:
+            TTCEngine._update()
+
+    @staticmethod
+    def _pair(actor, other):
+        TTCEngine._update()
+        a, b = ServerDataProvider._slots.get(actor), ServerDataProvider._slots.get(other)
+        if a is None or b is None:
+            return None
+        return (a, b) if a < b else (b, a)
+
+    @staticmethod
+    def get_ttc(actor, other):
+        """Time to collision of two actors, inf if they do not collide within the horizon or are unknown"""
+        pair = TTCEngine._pair(actor, other)
+        return float("inf") if pair is None else TTCEngine.ttc.get(pair, float("inf"))
+
+    @staticmethod
+    def get_distance(actor, other):
+        """Current distance between the boxes of two actors, inf if unknown"""
+        pair = TTCEngine._pair(actor, other)
+        if pair is None or ServerDataProvider._frame[pair[0]] < 0 or ServerDataProvider._frame[pair[1]] < 0:
+            return float("inf")
+        if pair not in TTCEngine.distance:
+            # not a broad phase candidate
+            position, _, yaw, box, _ = TTCEngine._inputs(np.array(pair))
+            center, right, forward, half = oriented_boxes(position, yaw, box)
+            TTCEngine.distance[pair] = float(boxes_distance(
+                center[0], right[0], forward[0], half[0], center[1], right[1], forward[1], half[1]))
+        return TTCEngine.distance[pair]
+
+    @staticmethod
+    def most_critical(k=None):
+        TTCEngine._update()
+        return TTCEngine.critical[:k]
+
+    @staticmethod
+    def near_miss_count(actor, other=None):
+        """Near misses of actor so far, only those with other if given"""
+        TTCEngine._update()
+        return TTCEngine._near_miss_count[actor if other is None else frozenset((actor, other))]
+
+    @staticmethod
+    def cleanup():
+        TTCEngine._boxes = dict()
+        TTCEngine._evaluated_tick = -1
+        TTCEngine.ttc = {}
+        TTCEngine.distance = {}
+        TTCEngine.critical = []
+        TTCEngine.min_ttc = float("inf")
+        TTCEngine.min_distance = float("inf")
+        TTCEngine.near_misses = []
+        TTCEngine._near = set()
+        TTCEngine._near_miss_count = Counter()
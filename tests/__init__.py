@@ -12,6 +12,26 @@ from .test_NPC import TestNPC
 from .test_sensors import TestSensors
 from .test_peds import TestPeds
 from .test_utils import TestUtils
+from .test_capture import TestCapture
+from .test_pcd import TestPcd
+from .test_subscription import TestSubscription
+from .test_sensor_rig import TestSensorRig
+from .test_environment import TestEnvironment
+from .test_shard import TestShard
+from .test_spatial_hash import TestSpatialHash
+from .test_container import TestContainer
+from .test_export import TestExport
+from .test_server_data_provider import TestServerDataProvider
+from .test_command_buffer import TestCommandBuffer
+from .test_tick_scheduler import TestTickScheduler
+from .test_criteria import TestCriteria
+from .test_behavior import TestBehavior
+from .test_ttc import TestTTC
+from .test_broad_phase import TestBroadPhase
+from .test_profiler import TestProfiler
+from .test_kitti import TestKitti, TestPlacement, TestCalibration
+from .test_pipeline import TestPipeline
+from .test_encoding import TestEncoding
 
 def load_tests(loader, standard_tests, pattern):
     suite = unittest.TestSuite()
@@ -21,5 +41,27 @@ def load_tests(loader, standard_tests, pattern):
     suite.addTests(loader.loadTestsFromTestCase(TestSensors))
     suite.addTests(loader.loadTestsFromTestCase(TestPeds))
     suite.addTests(loader.loadTestsFromTestCase(TestUtils))
+    suite.addTests(loader.loadTestsFromTestCase(TestCapture))
+    suite.addTests(loader.loadTestsFromTestCase(TestPcd))
+    suite.addTests(loader.loadTestsFromTestCase(TestSubscription))
+    suite.addTests(loader.loadTestsFromTestCase(TestSensorRig))
+    suite.addTests(loader.loadTestsFromTestCase(TestEnvironment))
+    suite.addTests(loader.loadTestsFromTestCase(TestShard))
+    suite.addTests(loader.loadTestsFromTestCase(TestSpatialHash))
+    suite.addTests(loader.loadTestsFromTestCase(TestContainer))
+    suite.addTests(loader.loadTestsFromTestCase(TestExport))
+    suite.addTests(loader.loadTestsFromTestCase(TestServerDataProvider))
+    suite.addTests(loader.loadTestsFromTestCase(TestCommandBuffer))
+    suite.addTests(loader.loadTestsFromTestCase(TestTickScheduler))
+    suite.addTests(loader.loadTestsFromTestCase(TestCriteria))
+    suite.addTests(loader.loadTestsFromTestCase(TestBehavior))
+    suite.addTests(loader.loadTestsFromTestCase(TestTTC))
+    suite.addTests(loader.loadTestsFromTestCase(TestBroadPhase))
+    suite.addTests(loader.loadTestsFromTestCase(TestProfiler))
+    suite.addTests(loader.loadTestsFromTestCase(TestKitti))
+    suite.addTests(loader.loadTestsFromTestCase(TestPlacement))
+    suite.addTests(loader.loadTestsFromTestCase(TestCalibration))
+    suite.addTests(loader.loadTestsFromTestCase(TestPipeline))
+    suite.addTests(loader.loadTestsFromTestCase(TestEncoding))
     suite.addTests(loader.loadTestsFromTestCase(TestSimulator)) #must be last
     return suite
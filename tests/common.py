@@ -7,6 +7,11 @@
 import signal
 import lgsvl
 import os
+import asyncio
+import json
+import threading
+import websockets
+from lgsvl.remote import BinaryFrame, encode_binary_frame
 
 class TestTimeout(Exception):
     pass
@@ -46,6 +51,73 @@ class SimConnection:
     #   self.sim.remove_agent(a)
     self.sim.close()
 
+class StandInServer:
+  # Answers API commands with canned handlers so features can be tested without a simulator
+  # handlers maps command name to fn(arguments) returning a result or a BinaryFrame
+  def __init__(self, handlers):
+    self.handlers = handlers
+    self.commands = []
+    self.websocket = None
+    self.loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    self.thread = threading.Thread(target=self.run, args=(ready,), daemon=True)
+    self.thread.start()
+    ready.wait()
+
+  def run(self, ready):
+    asyncio.set_event_loop(self.loop)
+    try:
+      self.loop.run_until_complete(self.start())
+    finally:
+      ready.set()
+    self.loop.run_forever()
+
+  async def start(self):
+    self.server = await websockets.serve(self.handle, "127.0.0.1", 0, compression=None)
+    self.port = self.server.sockets[0].getsockname()[1]
+
+  async def stop(self):
+    self.server.close()
+    await self.server.wait_closed()
+
+  async def handle(self, websocket, *args):
+    self.websocket = websocket
+    try:
+      async for message in websocket:
+        j = json.loads(message)
+        self.commands.append(j)
+        if j["command"] not in self.handlers:
+          await websocket.send(json.dumps({"error": "Unknown command '{}'".format(j["command"])}))
+          continue
+        try:
+          result = self.handlers[j["command"]](j["arguments"])
+        except Exception as e:
+          await websocket.send(json.dumps({"error": str(e)}))
+          continue
+        await websocket.send(self.encode({"result": result}))
+    except websockets.exceptions.ConnectionClosed:
+      pass
+
+  def encode(self, message):
+    result = message.get("result")
+    if isinstance(result, BinaryFrame):
+      return encode_binary_frame(dict(message, result=result.header), result.payload)
+    return json.dumps(message)
+
+  def push(self, message):
+    # sends an unsolicited message (sensor readings, events) to the connected client
+    asyncio.run_coroutine_threadsafe(self.websocket.send(self.encode(message)), self.loop).result()
+
+  def __enter__(self):
+    self.sim = lgsvl.Simulator("127.0.0.1", self.port)
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.sim.close()
+    asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+    self.loop.call_soon_threadsafe(self.loop.stop)
+    self.thread.join()
+
 def spawnState(sim, index=0):
   state = lgsvl.AgentState()
   state.transform = sim.get_spawn()[index]
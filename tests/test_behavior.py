@@ -0,0 +1,49 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import py_trees
+import lgsvl
+from scenario.atomic_scenario_behavior import ActorTransformSetter, SetToVelocity
+from scenario.command_buffer import CommandBuffer
+from scenario.server_data_provider import ServerDataProvider
+
+from .test_server_data_provider import Actor, episode, record
+
+RUNNING = py_trees.common.Status.RUNNING
+SUCCESS = py_trees.common.Status.SUCCESS
+
+class StreamedActor(Actor):
+    @property
+    def state(self):
+        raise AssertionError("synchronous state read of " + self.uid)
+
+    def state_command(self, state):
+        return ("agent/state/set", {"uid": self.uid, "state": state.to_json()})
+
+class TestBehavior(unittest.TestCase):
+    def setUp(self):
+        ServerDataProvider.cleanup()
+        CommandBuffer.clear()
+
+    def tearDown(self):
+        ServerDataProvider.cleanup()
+        CommandBuffer.clear()
+
+    def test_wait_for_state(self): # Check that behaviors wait for the state from the stream instead of reading it from the simulator
+        npc = StreamedActor("npc")
+        ServerDataProvider.register_actors([npc])
+        transform = lgsvl.Transform(lgsvl.Vector(5, 0, 7), lgsvl.Vector(0, 90, 0))
+        behaviors = [ActorTransformSetter(npc, transform), SetToVelocity(npc, 10, -1.0)]
+        self.assertEqual([b.tick_once() or b.status for b in behaviors], [RUNNING, RUNNING])
+        self.assertEqual(CommandBuffer.pending(), 0)
+
+        ServerDataProvider.on_server_tick(episode(1, 0.5, [record("npc", (0, 0, 0), (3, 0, 0))]))
+        self.assertEqual([b.tick_once() or b.status for b in behaviors], [SUCCESS, SUCCESS])
+        self.assertEqual(CommandBuffer.pending(), 1)
+        command, arguments = list(CommandBuffer._commands.values())[0]
+        self.assertEqual(command, "agent/state/set")
+        self.assertAlmostEqual(arguments["state"]["velocity"]["z"], 10)
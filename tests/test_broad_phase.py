@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import numpy as np
+from scenario import broad_phase, ttc
+from scenario.server_data_provider import ServerDataProvider
+
+from .test_server_data_provider import Actor, episode, record
+
+def traffic(rng, n): # Cars in six lanes along x, driving both ways
+    position = np.c_[rng.uniform(0.0, 2000.0, n), rng.integers(0, 6, n) * 3.5 + rng.normal(0.0, 0.3, n)]
+    velocity = np.c_[rng.uniform(5.0, 30.0, n) * np.where(position[:, 1] > 10.0, -1.0, 1.0), rng.normal(0.0, 0.5, n)]
+    yaw = np.where(velocity[:, 0] > 0.0, 90.0, 270.0) + rng.normal(0.0, 3.0, n)
+    return position, velocity, yaw, np.tile([0.0, 0.2, 1.0, 2.3], (n, 1))
+
+class TestBroadPhase(unittest.TestCase):
+    def setUp(self):
+        ServerDataProvider.cleanup()
+        ttc.TTCEngine.cleanup()
+
+    def tearDown(self):
+        ServerDataProvider.cleanup()
+        ttc.TTCEngine.cleanup()
+
+    def test_swept_bounds(self): # Check the area swept with constant velocity and widened by the acceleration
+        bounds = broad_phase.swept_bounds(np.array([[0.0, 0.0]]), np.array([[2.0, -1.0]]), np.array([1.0]), 2.0)
+        np.testing.assert_array_equal(bounds, [[-1.0, -3.0, 5.0, 1.0]])
+        bounds = broad_phase.swept_bounds(np.array([[0.0, 0.0]]), np.array([[2.0, 0.0]]), np.array([1.0]), 2.0,
+            np.array([[0.0, 2.0]]))
+        np.testing.assert_array_equal(bounds, [[-2.0, -2.0, 6.0, 6.0]])
+        self.assertEqual([len(p) for p in broad_phase.sweep_and_prune(bounds)], [0, 0])
+
+    def test_brute_force(self): # Check that sweep and prune keeps exactly the pairs of overlapping bounds
+        rng = np.random.default_rng(1)
+        n = 300
+        position, velocity, yaw, box = traffic(rng, n)
+        center, _, _, half = ttc.oriented_boxes(position, yaw, box)
+        radius = np.linalg.norm(half, axis=1)
+        i, j = ttc.all_pairs(n)
+        for acceleration in (None, rng.normal(0.0, 2.0, (n, 2))):
+            b = broad_phase.swept_bounds(center, velocity, radius, 5.0, acceleration)
+            overlap = (b[i, 0] <= b[j, 2]) & (b[j, 0] <= b[i, 2]) & (b[i, 1] <= b[j, 3]) & (b[j, 1] <= b[i, 3])
+            pairs = broad_phase.candidate_pairs(center, velocity, radius, 5.0, acceleration)
+            self.assertTrue(np.all(pairs[0] < pairs[1]))
+            self.assertEqual(set(zip(*pairs)), set(zip(i[overlap], j[overlap])))
+            self.assertLess(len(pairs[0]), len(i) // 5)
+
+    def test_same_ttc(self): # Check that the broad phase drops no pair that collides within the horizon
+        rng = np.random.default_rng(2)
+        n = 200
+        position, velocity, yaw, box = traffic(rng, n)
+        for acceleration in (None, rng.normal(0.0, 2.0, (n, 2))):
+            pairs = ttc.predicted_pairs(position, velocity, yaw, box, acceleration)
+            i, j, result, _ = ttc.time_to_collision(position, velocity, yaw, box, acceleration, pairs)
+            ai, aj, expected, _ = ttc.time_to_collision(position, velocity, yaw, box, acceleration)
+            got = {(a, b): t for a, b, t in zip(i, j, result) if np.isfinite(t)}
+            self.assertGreater(len(got), 0)
+            self.assertEqual(got, {(a, b): t for a, b, t in zip(ai, aj, expected) if np.isfinite(t)})
+
+    def test_near_miss(self): # Check that a near miss is counted once while it lasts
+        ego, npc, far = Actor("ego"), Actor("npc"), Actor("far")
+        ServerDataProvider.register_actors([ego, npc, far])
+        counts = []
+        for frame, z in enumerate((30.0, 20.0, 10.0, 6.0)):
+            ServerDataProvider.on_server_tick(episode(frame, frame * 0.5, [record("ego", (0, 0, 0), (0, 0, 10)),
+                record("npc", (0, 0, z), (0, 0, -10), 180.0), record("far", (100, 0, 0))]))
+            ttc.TTCEngine.on_server_tick()
+            counts.append(len(ttc.TTCEngine.near_misses))
+        self.assertEqual(counts, [0, 1, 1, 1])
+        self.assertAlmostEqual(ttc.TTCEngine.get_ttc(ego, npc), (6.0 - 4.6) / 20.0)
+        self.assertEqual(ttc.TTCEngine.near_miss_count(ego), 1)
+        self.assertEqual(ttc.TTCEngine.near_miss_count(ego, far), 0)
+        self.assertEqual(len(ttc.TTCEngine.near_misses), 1)
+        self.assertEqual(ttc.TTCEngine.near_misses[0][1:3], (ego, npc))
+
+    def test_sparse_results(self): # Check that only broad phase candidates are stored and other distances computed on demand
+        actors = [Actor("npc-%d" % k) for k in range(50)]
+        ServerDataProvider.register_actors(actors)
+        # pairs of cars 10 m apart in a row, the pairs 1 km apart
+        ServerDataProvider.on_server_tick(episode(1, 0.5, [record(a.uid, (1000 * (k // 2), 0, 10 * (k % 2)), (0, 0, 5 - 10 * (k % 2)))
+            for k, a in enumerate(actors)]))
+        ttc.TTCEngine.on_server_tick()
+        self.assertEqual(len(ttc.TTCEngine.ttc), 25)
+        self.assertEqual(set(ttc.TTCEngine.distance), set(ttc.TTCEngine.ttc))
+        self.assertAlmostEqual(ttc.TTCEngine.get_ttc(actors[3], actors[2]), (10 - 4.6) / 10)
+        self.assertAlmostEqual(ttc.TTCEngine.get_distance(actors[2], actors[3]), 10 - 4.6)
+        self.assertEqual(ttc.TTCEngine.get_ttc(actors[0], actors[2]), float("inf"))
+        self.assertAlmostEqual(ttc.TTCEngine.get_distance(actors[2], actors[0]), 1000 - 2.0)
+        self.assertEqual(len(ttc.TTCEngine.distance), 26)
+        self.assertEqual(ttc.TTCEngine.get_ttc(actors[0], Actor("unknown")), float("inf"))
@@ -0,0 +1,132 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import io
+import numpy as np
+import lgsvl
+import lgsvl.pcd
+from lgsvl.remote import BinaryFrame
+
+from .common import StandInServer
+
+CAMERA = {"type": "camera", "uid": "camera-0", "name": "Main Camera", "frequency": 15, "width": 4, "height": 2,
+  "fov": 50, "near_plane": 0.1, "far_plane": 2000, "format": "RGB"}
+
+LIDAR = {"type": "lidar", "uid": "lidar-0", "name": "Lidar", "min_distance": 0.5, "max_distance": 100, "rays": 32,
+  "rotations": 10, "measurements": 1500, "fov": 41.33, "angle": 10, "compensated": True}
+
+POINTS = np.zeros(5, dtype=lgsvl.pcd.POINT_DTYPE)
+POINTS["x"] = [1, 2, 3, 4, 5]
+POINTS["intensity"] = [0, 64, 128, 192, 255]
+
+GPS = {"type": "gps", "uid": "gps-0", "name": "GPS", "frequency": 12.5}
+
+IMAGE = np.arange(2 * 4 * 3, dtype=np.uint8).reshape((2, 4, 3))
+
+STATE = {"transform": {"position": {"x": 1, "y": 0, "z": 2}, "rotation": {"x": 0, "y": 90, "z": 0}},
+  "velocity": {"x": 0, "y": 0, "z": 3}, "angular_velocity": {"x": 0, "y": 0, "z": 0}}
+
+BOX = {"min": {"x": -1, "y": 0, "z": -2}, "max": {"x": 1, "y": 1.5, "z": 2}}
+
+def encode_png(image):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.fromarray(image).save(out, format="PNG")
+    return out.getvalue()
+
+def camera_capture(arguments):
+    if arguments["encoding"] == "raw":
+        return BinaryFrame({"encoding": "raw", "width": 4, "height": 2, "channels": 3}, IMAGE.tobytes())
+    return BinaryFrame({"encoding": arguments["encoding"], "width": 4, "height": 2}, encode_png(IMAGE))
+
+def vehicle_capture(arguments):
+    image, points = IMAGE.tobytes(), POINTS.tobytes()
+    sensors = [
+        {"uid": "camera-0", "encoding": "raw", "width": 4, "height": 2, "channels": 3, "offset": 0, "length": len(image)},
+        {"uid": "lidar-0", "points": len(POINTS), "offset": len(image), "length": len(points)},
+        {"uid": "gps-0", "data": {"latitude": 37.4, "longitude": -122.0, "northing": 4140000, "easting": 587000,
+            "altitude": 10, "orientation": 90}},
+    ]
+    sensors = [j for j in sensors if j["uid"] in arguments["sensors"]]
+    agents = [{"uid": "ego-0", "state": STATE, "bounding_box": BOX}, {"uid": "npc-9", "state": STATE, "bounding_box": BOX}]
+    header = {"time": 12.5, "frame": 250, "sensors": sensors, "agents": agents if arguments["ground_truth"] else []}
+    return BinaryFrame(header, image + points)
+
+HANDLERS = {
+    "simulator/add_agent": lambda arguments: "ego-0",
+    "vehicle/sensors/get": lambda arguments: [CAMERA, LIDAR, GPS],
+    "vehicle/capture": vehicle_capture,
+    "sensor/camera/capture": camera_capture,
+    "sensor/lidar/capture": lambda arguments: BinaryFrame({"points": len(POINTS)}, POINTS.tobytes()),
+}
+
+def has_pil():
+    try:
+        import PIL
+        return True
+    except ImportError:
+        return False
+
+class TestCapture(unittest.TestCase):
+    def test_camera_capture_raw(self): # Check that a raw capture is returned as an (H, W, 3) array
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera = ego.get_sensors()[0]
+            image = camera.capture("raw")
+            self.assertEqual(image.shape, (2, 4, 3))
+            self.assertEqual(image.dtype, np.uint8)
+            np.testing.assert_array_equal(image, IMAGE)
+            self.assertEqual(server.commands[-1]["arguments"]["uid"], "camera-0")
+
+    @unittest.skipUnless(has_pil(), "PIL is not installed")
+    def test_camera_capture_encoded(self): # Check that encoded captures return bytes or a decoded array
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera = ego.get_sensors()[0]
+            data = camera.capture("png", compression=1)
+            self.assertIsInstance(data, bytes)
+            self.assertTrue(data.startswith(b"\x89PNG"))
+            self.assertEqual(server.commands[-1]["arguments"]["compression"], 1)
+            np.testing.assert_array_equal(camera.capture("png", decode=True), IMAGE)
+
+    def test_camera_capture_invalid_encoding(self): # Check that unknown encodings are rejected before sending
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera = ego.get_sensors()[0]
+            with self.assertRaises(ValueError):
+                camera.capture("bmp")
+            with self.assertRaises(TypeError):
+                camera.capture("png", "100")
+
+    def test_lidar_capture(self): # Check that a lidar scan is returned as a structured array
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            lidar = ego.get_sensors()[1]
+            points = lidar.capture()
+            self.assertEqual(points.dtype, lgsvl.pcd.POINT_DTYPE)
+            np.testing.assert_array_equal(points, POINTS)
+            self.assertEqual(server.commands[-1], {"command": "sensor/lidar/capture", "arguments": {"uid": "lidar-0"}})
+
+    def test_ego_capture(self): # Check that sensors and ground truth of one frame come back in a single bundle
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera, lidar, gps = ego.get_sensors()
+            count = len(server.commands)
+            bundle = ego.capture([camera, lidar, gps])
+            self.assertEqual(len(server.commands), count + 1)
+            self.assertEqual((bundle.time, bundle.frame), (12.5, 250))
+            np.testing.assert_array_equal(bundle.sensors[camera], IMAGE)
+            np.testing.assert_array_equal(bundle.sensors[lidar], POINTS)
+            self.assertEqual(bundle.sensors[gps].northing, 4140000)
+            self.assertIs(bundle.agents["ego-0"].agent, ego)
+            self.assertIsNone(bundle.agents["npc-9"].agent)
+            self.assertEqual(bundle.agents["npc-9"].state.speed, 3)
+            self.assertEqual(bundle.agents["npc-9"].bounding_box.size.z, 4)
+
+            bundle = ego.capture([lidar], ground_truth=False)
+            self.assertEqual(list(bundle.sensors), [lidar])
+            self.assertEqual(bundle.agents, {})
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import lgsvl
+from scenario.command_buffer import CommandBuffer
+
+from .common import StandInServer
+
+def handlers(batch=True):
+    uids = iter(["npc-0", "npc-1"])
+    result = {
+        "simulator/add_agent": lambda arguments: next(uids),
+        "agent/state/set": lambda arguments: None,
+        "vehicle/follow_closest_lane": lambda arguments: None,
+        "vehicle/change_lane": lambda arguments: None,
+    }
+    if batch:
+        result["simulator/batch"] = lambda arguments: [None] * len(arguments)
+    return result
+
+def state(x):
+    result = lgsvl.AgentState()
+    result.transform.position.x = x
+    return result
+
+class TestCommandBuffer(unittest.TestCase):
+    def setUp(self):
+        CommandBuffer.clear()
+
+    def tearDown(self):
+        CommandBuffer.clear()
+
+    def issue(self, sim):
+        npc0 = sim.add_agent("Sedan", lgsvl.AgentType.NPC)
+        npc1 = sim.add_agent("SUV", lgsvl.AgentType.NPC)
+        CommandBuffer.set_state(npc0, state(1))
+        CommandBuffer.follow_closest_lane(npc1, True, 10)
+        CommandBuffer.change_lane(npc0, True)
+        CommandBuffer.set_state(npc0, state(2))
+        CommandBuffer.set_state(npc1, state(3))
+        CommandBuffer.follow_closest_lane(npc1, True, 12)
+        self.assertEqual(CommandBuffer.pending(), 4)
+
+    def test_flush(self): # Check that the last write per agent and field is sent, in the order of the first writes, as one message
+        with StandInServer(handlers()) as server:
+            self.issue(server.sim)
+            self.assertEqual(len(server.commands), 2)
+            self.assertEqual(CommandBuffer.flush(server.sim), (6, 4))
+            self.assertEqual(len(server.commands), 3)
+            batch = server.commands[-1]
+            self.assertEqual(batch["command"], "simulator/batch")
+            self.assertEqual([(c["command"], c["arguments"]["uid"]) for c in batch["arguments"]], [
+                ("agent/state/set", "npc-0"), ("vehicle/follow_closest_lane", "npc-1"), ("vehicle/change_lane", "npc-0"),
+                ("agent/state/set", "npc-1")])
+            self.assertEqual(batch["arguments"][0]["arguments"]["state"]["transform"]["position"]["x"], 2)
+            self.assertEqual(batch["arguments"][1]["arguments"]["max_speed"], 12)
+            self.assertEqual(CommandBuffer.pending(), 0)
+            self.assertEqual(CommandBuffer.flush(server.sim), (0, 0))
+            self.assertEqual(len(server.commands), 3)
+
+    def test_flush_without_batch(self): # Check that commands are sent one by one to simulators without simulator/batch
+        with StandInServer(handlers(batch=False)) as server:
+            self.issue(server.sim)
+            self.assertEqual(CommandBuffer.flush(server.sim), (6, 4))
+            self.assertEqual([c["command"] for c in server.commands[2:]], ["simulator/batch", "agent/state/set",
+                "vehicle/follow_closest_lane", "vehicle/change_lane", "agent/state/set"])
+            self.assertEqual(server.commands[3]["arguments"]["state"]["transform"]["position"]["x"], 2)
+            CommandBuffer.change_lane(server.sim.agents["npc-1"], False)
+            CommandBuffer.flush(server.sim)
+            self.assertEqual(server.commands[-1], {"command": "vehicle/change_lane", "arguments": {"uid": "npc-1", "isLeftChange": False}})
+            self.assertEqual(len(server.commands), 8)
+
+    def test_batch_error(self): # Check that an error inside simulator/batch is raised without replaying the commands
+        def fail(arguments):
+            raise ValueError("invalid state of agent npc-0")
+        with StandInServer(dict(handlers(), **{"simulator/batch": fail})) as server:
+            self.issue(server.sim)
+            with self.assertRaises(Exception):
+                CommandBuffer.flush(server.sim)
+            self.assertTrue(server.sim.batch_supported)
+            self.assertEqual([c["command"] for c in server.commands[2:]], ["simulator/batch"])
+            CommandBuffer.change_lane(server.sim.agents["npc-1"], False)
+            with self.assertRaises(Exception):
+                CommandBuffer.flush(server.sim)
+            self.assertEqual([c["command"] for c in server.commands[2:]], ["simulator/batch", "simulator/batch"])
+
+    def test_record(self): # Check that buffering builds the commands without calling the simulator
+        with StandInServer(handlers()) as server:
+            npc = server.sim.add_agent("Sedan", lgsvl.AgentType.NPC)
+            remote = npc.remote
+            control = lgsvl.NPCControl()
+            control.target_speed = 5
+            CommandBuffer.apply_control(npc, control)
+            self.assertIs(npc.remote, remote)
+            self.assertEqual(len(server.commands), 1)
+            self.assertEqual(list(CommandBuffer._commands.values()), [npc.control_command(control)])
+            self.assertEqual(npc.control_command(control)[0], "vehicle/apply_npc_control")
+            self.assertEqual(npc.control_command(control)[1]["control"]["target_speed"], 5)
+            with self.assertRaises(TypeError):
+                CommandBuffer.apply_control(npc, lgsvl.VehicleControl())
+            self.assertEqual(CommandBuffer.pending(), 1)
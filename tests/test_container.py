@@ -0,0 +1,98 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import io
+import os
+import tempfile
+import types
+import numpy as np
+from dataset import container
+
+CALIB = b"P2: 1 0 0 0 0 1 0 0 0 0 1 0\nTr_velo_to_cam: 0 -1 0 0 0 0 -1 0 1 0 0 0\n"
+
+def image(idx):
+    data = io.BytesIO()
+    np.save(data, np.full((2, 3, 3), idx, dtype=np.uint8))
+    return data.getvalue()
+
+def scan(idx):
+    return np.arange(8, dtype=np.float32).reshape(2, 4).__add__(idx).tobytes()
+
+def frame(idx):
+    return types.SimpleNamespace(idx=idx, time=idx * 0.1, seed=idx + 100, rig_hash="rig0", files=[
+        ("image_2/{:06d}.npy".format(idx), image(idx)),
+        ("image_2/{:06d}.jpg".format(idx), b"lossy"),
+        ("velodyne/{:06d}.bin".format(idx), scan(idx)),
+        ("label_2/{:06d}.txt".format(idx), "Car 0.00 0 0.1\nVan 0.50 1 0.2\n".encode("ascii")),
+        ("calib/{:06d}.txt".format(idx), CALIB),
+    ])
+
+class TestContainer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "container")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, indices):
+        with container.ContainerWriter(self.path) as writer:
+            for idx in indices:
+                writer.add(frame(idx))
+        return writer
+
+    def test_roundtrip(self): # Check that every modality reads back unchanged as views into the memory maps
+        self.write(range(3))
+        reader = container.ContainerReader(self.path)
+        self.assertEqual(sorted(reader.modalities), sorted(container.MODALITIES))
+        self.assertEqual(reader.meta["rigs"], ["rig0"])
+        self.assertEqual(reader.ext("image_2"), "npy")
+        np.testing.assert_array_equal(reader.frames(), [0, 1, 2])
+        self.assertEqual(len(reader), 3)
+        np.testing.assert_array_equal(reader.image(2), np.full((2, 3, 3), 2, dtype=np.uint8))
+        self.assertIsInstance(reader.velodyne(1).base, np.memmap)
+        np.testing.assert_array_equal(reader.velodyne(1), np.arange(8, dtype=np.float32).reshape(2, 4) + 1)
+        self.assertEqual(reader.labels(0), ["Car 0.00 0 0.1", "Van 0.50 1 0.2"])
+        np.testing.assert_array_equal(reader.calib(0)["P2"], [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0])
+        record = reader.record("velodyne", 2)
+        self.assertAlmostEqual(record["time"], 0.2)
+        self.assertEqual(record["seed"], 102)
+        with self.assertRaises(KeyError):
+            reader.get("label_2", 7)
+
+    def test_shared_calib(self): # Check that identical calibrations are stored once
+        self.write(range(4))
+        self.assertEqual(os.path.getsize(os.path.join(self.path, "calib.dat")), len(CALIB))
+        reader = container.ContainerReader(self.path)
+        self.assertEqual(len(set(reader.index["calib"]["offset"].tolist())), 1)
+
+    def test_resume_after_crash(self): # Check that a partial record is dropped and writing resumes
+        self.write(range(2))
+        with open(os.path.join(self.path, "velodyne.dat"), "ab") as f:
+            f.write(b"partial payload")
+        with open(os.path.join(self.path, "velodyne.idx"), "ab") as f:
+            f.write(b"partial")
+        writer = self.write([2])
+        self.assertIn(1, writer)
+        self.assertNotIn(3, writer)
+        reader = container.ContainerReader(self.path)
+        np.testing.assert_array_equal(reader.frames("velodyne"), [0, 1, 2])
+        np.testing.assert_array_equal(reader.velodyne(2), np.arange(8, dtype=np.float32).reshape(2, 4) + 2)
+
+    def test_kitti_conversion(self): # Check that packing an unpacked container gives back the same files
+        self.write(range(3))
+        kitti = os.path.join(self.dir.name, "kitti")
+        self.assertEqual(container.to_kitti(self.path, kitti), 12)
+        with open(os.path.join(kitti, "label_2", "000001.txt"), "rb") as f:
+            self.assertEqual(f.read(), frame(1).files[3][1])
+        packed = os.path.join(self.dir.name, "packed")
+        self.assertEqual(container.from_kitti(kitti, packed), 12)
+        self.assertEqual(container.from_kitti(kitti, packed), 0)
+        a, b = container.ContainerReader(self.path), container.ContainerReader(packed)
+        for modality in a.modalities:
+            for idx in range(3):
+                np.testing.assert_array_equal(a.get(modality, idx), b.get(modality, idx))
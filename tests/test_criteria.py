@@ -0,0 +1,76 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import py_trees
+from scenario.atomic_scenario_criteria import CollisionTest, MaxAccelerationTest, MaxVelocityTest, SeparationDistanceTest
+from scenario.criteria_engine import CriteriaEngine
+from scenario.server_data_provider import ServerDataProvider
+
+from .test_server_data_provider import Actor, episode, record
+
+RUNNING = py_trees.common.Status.RUNNING
+FAILURE = py_trees.common.Status.FAILURE
+
+class CollidingActor(Actor):
+    def on_collision(self, fn):
+        self.collide = lambda other: fn(self, other, None)
+
+class TestCriteria(unittest.TestCase):
+    def setUp(self):
+        ServerDataProvider.cleanup()
+        CriteriaEngine.cleanup()
+
+    def tearDown(self):
+        ServerDataProvider.cleanup()
+        CriteriaEngine.cleanup()
+
+    def tick(self, criteria, frame, npcs):
+        ServerDataProvider.on_server_tick(episode(frame, frame * 0.5, npcs))
+        return [c.tick_once() or c.status for c in criteria]
+
+    def test_unknown(self): # Check that criteria of actors without a state keep running
+        ego, npc = CollidingActor("ego"), Actor("npc")
+        ServerDataProvider.register_actors([ego, npc])
+        criteria = [MaxVelocityTest(ego, 10), SeparationDistanceTest(ego, npc, 30), MaxAccelerationTest(ego, 3), CollisionTest(ego)]
+        self.assertEqual(self.tick(criteria, 1, [record("npc", (0, 0, 0))]), [RUNNING] * 4)
+        self.assertEqual([c.value for c in criteria], [None, None, None, 0])
+        self.assertEqual(criteria[0].test_status, "INIT")
+
+    def test_thresholds(self): # Check speed, separation and acceleration against their thresholds tick by tick
+        ego, npc = CollidingActor("ego"), Actor("npc")
+        ServerDataProvider.register_actors([ego, npc])
+        criteria = [MaxVelocityTest(ego, 10), SeparationDistanceTest(ego, npc, 30), MaxAccelerationTest(ego, 3)]
+        self.assertEqual(self.tick(criteria, 1, [record("ego", (0, 0, 0), (8, 0, 0)), record("npc", (20, 0, 0))]),
+            [RUNNING, RUNNING, RUNNING])
+        self.assertEqual(criteria[1].value, 20)
+        self.assertEqual(criteria[0].test_status, "SUCCESS")
+        self.assertEqual(self.tick(criteria, 2, [record("ego", (4, 0, 0), (9, 0, 0)), record("npc", (40, 0, 0))]),
+            [RUNNING, FAILURE, RUNNING])
+        self.assertEqual(criteria[2].value, 2)
+        self.assertEqual(self.tick(criteria, 3, [record("ego", (9, 0, 0), (11, 0, 0)), record("npc", (35, 0, 0))]),
+            [FAILURE, RUNNING, FAILURE])
+        self.assertEqual([c.value for c in criteria], [11, 26, 4])
+        self.assertEqual(criteria[0].test_status, "FAILURE")
+
+    def test_collision(self): # Check that a collision reported by the simulator fails only the criterion of that actor
+        ego, npc = CollidingActor("ego"), CollidingActor("npc")
+        ServerDataProvider.register_actors([ego, npc])
+        criteria = [CollisionTest(ego), CollisionTest(npc)]
+        self.assertEqual(self.tick(criteria, 1, [record("ego", (0, 0, 0))]), [RUNNING, RUNNING])
+        ego.collide(npc)
+        self.assertEqual([c.tick_once() or c.status for c in criteria], [FAILURE, RUNNING])
+        self.assertEqual(criteria[0].value, 1)
+
+    def test_late_registration(self): # Check that criteria of actors registered after the first evaluation are resolved
+        ego, npc = CollidingActor("ego"), Actor("npc")
+        ServerDataProvider.register_actor(ego)
+        criteria = [MaxVelocityTest(ego, 10), MaxVelocityTest(npc, 5), SeparationDistanceTest(ego, npc, 10)]
+        self.assertEqual(self.tick(criteria, 1, [record("ego", (0, 0, 0), (1, 0, 0)), record("npc", (50, 0, 0), (6, 0, 0))]),
+            [RUNNING, RUNNING, RUNNING])
+        ServerDataProvider.register_actor(npc)
+        self.assertEqual([c.tick_once() or c.status for c in criteria], [RUNNING, FAILURE, FAILURE])
+        self.assertEqual(criteria[2].value, 50)
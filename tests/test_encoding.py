@@ -0,0 +1,54 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import io
+import types
+import numpy as np
+from lgsvl.sensor import decode_image
+from dataset.encoding import ImageEncoder, WriterStats
+
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+
+class TestEncoding(unittest.TestCase):
+    def test_roundtrip(self): # Check that every lossless codec decodes back to the same pixels
+        for codec in ("png", "webp"):
+            images = ImageEncoder(codec, compression=1).encode(image())
+            self.assertEqual([ext for ext, _ in images], [codec])
+            np.testing.assert_array_equal(decode_image(images[0][1]), image())
+        ext, data = ImageEncoder("npy").encode(image())[0]
+        self.assertEqual(ext, "npy")
+        np.testing.assert_array_equal(np.load(io.BytesIO(data), allow_pickle=False), image())
+
+    def test_png_input(self): # Check that PNG input is kept as is for PNG output and transcoded otherwise
+        png = ImageEncoder("png").encode(image())[0][1]
+        self.assertIs(ImageEncoder("png").encode(png)[0][1], png)
+        data = ImageEncoder("npy").encode(png)[0][1]
+        np.testing.assert_array_equal(np.load(io.BytesIO(data), allow_pickle=False), image())
+        images = ImageEncoder("png", jpg_quality=90).encode(png)
+        self.assertEqual([ext for ext, _ in images], ["png", "jpg"])
+        np.testing.assert_array_equal(decode_image(images[0][1]), image())
+        self.assertEqual(decode_image(images[1][1]).shape, image().shape)
+
+    def test_codecs(self): # Check that unknown codecs are rejected
+        with self.assertRaises(ValueError):
+            ImageEncoder("bmp")
+        self.assertEqual(ImageEncoder("webp").ext, "webp")
+
+    def test_stats(self): # Check the writer counters and their summary
+        stats = WriterStats()
+        self.assertEqual(repr(stats), "no frames written")
+        images, elapsed = ImageEncoder("npy").timed_encode(image())
+        self.assertGreater(elapsed, 0)
+        stats.add(types.SimpleNamespace(bytes_written=len(images[0][1]), encode_time=0.002))
+        stats.add(types.SimpleNamespace(bytes_written=1000000, encode_time=0.004))
+        self.assertEqual(stats.frames, 2)
+        self.assertEqual(stats.bytes_written, len(images[0][1]) + 1000000)
+        self.assertAlmostEqual(stats.encode_time, 0.006)
+        stats.bytes_written = 3000000
+        self.assertEqual(repr(stats), "2 frames, 3.0 MB written (1500.0 kB/frame), encode 3.00 ms/frame")
@@ -0,0 +1,40 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import lgsvl
+
+from .common import StandInServer
+
+def batch(arguments):
+    return ["{} done".format(c["command"]) for c in arguments]
+
+HANDLERS = {
+    "simulator/batch": batch,
+}
+
+class TestEnvironment(unittest.TestCase):
+    def test_batch(self): # Check that commands are sent as one message and results come back in order
+        with StandInServer(HANDLERS) as server:
+            results = server.sim.batch([("a/b", {"x": 1}), ("c/d", None)])
+            self.assertEqual(results, ["a/b done", "c/d done"])
+            self.assertEqual(len(server.commands), 1)
+            self.assertEqual(server.commands[0]["arguments"], [{"command": "a/b", "arguments": {"x": 1}}, {"command": "c/d", "arguments": None}])
+            self.assertEqual(server.sim.batch([]), [])
+            self.assertEqual(len(server.commands), 1)
+
+    def test_set_environment(self): # Check that weather and time of day are set with a single command
+        with StandInServer(HANDLERS) as server:
+            server.sim.set_environment(lgsvl.WeatherState(rain=0.5, fog=0.25, wetness=1), 14.5, fixed=False)
+            self.assertEqual(len(server.commands), 1)
+            self.assertEqual(server.commands[0]["arguments"], [
+                {"command": "environment/weather/set", "arguments": {"rain": 0.5, "fog": 0.25, "wetness": 1}},
+                {"command": "environment/time/set", "arguments": {"time": 14.5, "fixed": False}},
+            ])
+            server.sim.set_environment(time_of_day=6)
+            self.assertEqual([c["command"] for c in server.commands[1]["arguments"]], ["environment/time/set"])
+            with self.assertRaises(TypeError):
+                server.sim.set_environment((0, 0, 0))
@@ -0,0 +1,88 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import os
+import tempfile
+import types
+import numpy as np
+from dataset import export
+from dataset.kitti import LABEL_DTYPE
+
+CALIBRATION = types.SimpleNamespace(camera_intrinsics={"image_width": 1920, "image_height": 1080})
+
+def labels(idx):
+    # a visible car, a pedestrian without 2D box (out of view) and a fully truncated van
+    result = np.zeros(3, dtype=LABEL_DTYPE)
+    result["type"] = ["Car", "Pedestrian", "Van"]
+    result["bbox"] = [(10, 20, 110.5, 70), (0, 0, 0, 0), (1900, 30, 1920, 60)]
+    result["truncated"] = [0.25, 1, 1]
+    result["location"][:, 2] = idx
+    result["rotation_y"] = 0.1
+    return result
+
+def frame(idx):
+    return types.SimpleNamespace(idx=idx, time=idx * 0.5, label_array=labels(idx))
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def export(self, indices, batch_size=2):
+        flushed = []
+        exporter = export.LabelExporter(self.path, CALIBRATION, ("npy", "coco"), "png", batch_size, flushed.append)
+        for idx in indices:
+            exporter.add(frame(idx))
+        exporter.close()
+        return flushed
+
+    def test_label_table(self): # Check that only visible objects are exported, one row per object
+        table = export.label_table([(3, 1.5, labels(3)), (4, 2.0, labels(4)[:0])])
+        self.assertEqual(table["type"].tolist(), ["Car"])
+        self.assertEqual(table["frame"].tolist(), [3])
+        self.assertEqual(table["time"].tolist(), [1.5])
+        self.assertEqual(table["location"][0, 2], 3)
+
+    def test_roundtrip(self): # Check npy and COCO parts read back as one table and one COCO dict
+        flushed = self.export([4, 0, 2, 1, 3])
+        self.assertEqual([f.idx for f in flushed], [0, 4, 1, 2, 3])
+        self.assertIsNone(flushed[0].label_array)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.path, "labels"))), [
+            "part-000000-000004.json", "part-000000-000004.npy", "part-000001-000002.json", "part-000001-000002.npy",
+            "part-000003-000003.json", "part-000003-000003.npy"])
+
+        table = export.read_labels(self.path)
+        self.assertEqual(table["frame"].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(set(table["type"].tolist()), {"Car"})
+
+        coco = export.read_coco(self.path)
+        self.assertEqual(sorted(image["id"] for image in coco["images"]), [0, 1, 2, 3, 4])
+        self.assertEqual(coco["images"][0]["file_name"], os.path.join("image_2", "000000.png"))
+        self.assertEqual(coco["categories"], [{"id": 1, "name": "Car"}])
+        self.assertEqual([a["id"] for a in coco["annotations"]], [1, 2, 3, 4, 5])
+        annotation = coco["annotations"][0]
+        self.assertEqual(annotation["bbox"], [10, 20, 100.5, 50])
+        self.assertEqual(annotation["area"], 5025)
+        self.assertEqual(annotation["truncated"], 0.25)
+
+    def test_regenerated_frames(self): # Check that labels of frames generated again are not exported twice
+        self.export(range(4))
+        self.assertEqual(export.discard_frames(self.path, [1, 2, 3]), 4)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.path, "labels"))), ["part-000000-000001.json", "part-000000-000001.npy"])
+        self.export([2, 1, 3])
+        self.assertEqual(export.read_labels(self.path)["frame"].tolist(), [0, 1, 2, 3])
+        coco = export.read_coco(self.path)
+        self.assertEqual(sorted(image["id"] for image in coco["images"]), [0, 1, 2, 3])
+        self.assertEqual(sorted(a["image_id"] for a in coco["annotations"]), [0, 1, 2, 3])
+        self.assertEqual(export.discard_frames(self.path, [7]), 0)
+
+    def test_formats(self): # Check that unknown formats are rejected
+        with self.assertRaises(ValueError):
+            export.LabelExporter(self.path, CALIBRATION, ("csv",))
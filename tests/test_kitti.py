@@ -0,0 +1,256 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import types
+from unittest import mock
+import numpy as np
+import lgsvl
+from lgsvl.utils import transform_to_matrix
+from dataset import kitti
+
+from .common import StandInServer
+from .test_sensor_rig import SENSORS
+
+WIDTH, HEIGHT = 1920, 1080
+
+def calibration():
+    camera = types.SimpleNamespace(width=WIDTH, height=HEIGHT, fov=50.0)
+    intrinsics, projection, rectification = kitti.get_camera_intrinsics(camera)
+    return kitti.Calibration(intrinsics, projection, rectification, np.zeros(12), np.zeros(12))
+
+def transform(x, z, yaw, y=0.0):
+    return lgsvl.Transform(lgsvl.Vector(x, y, z), lgsvl.Vector(0, yaw, 0))
+
+def car():
+    return lgsvl.BoundingBox(lgsvl.Vector(-1, 0, -2.3), lgsvl.Vector(1, 1.5, 2.3))
+
+def frame(ego, npcs):
+    return kitti.Frame(0, 0.0, 0, None, None, ego, transform(0, 1.5, 0, y=1.7), [(npc, car()) for npc in npcs])
+
+def reference_label(frame, npc_transform, bbox, calibration): # The per NPC computation the batched labels replaced
+    camera_mat = transform_to_matrix(frame.camera_transform)
+    ego_mat = transform_to_matrix(frame.ego_transform)
+    npc_tf = np.dot(transform_to_matrix(npc_transform), np.dot(np.linalg.inv(ego_mat), np.linalg.inv(camera_mat)))
+    location = (npc_tf[3][0], -npc_tf[3][1], npc_tf[3][2])
+    rotation_y = np.arctan2(npc_tf[2][0], npc_tf[0][0]) - (np.pi / 2)
+    if rotation_y < -np.pi:
+        rotation_y += 2 * np.pi
+    v1 = [location[0], 0, location[2]]
+    theta = np.arctan2(np.linalg.norm(np.cross([0, 0, 1], v1)), np.dot([0, 0, 1], v1))
+    alpha = rotation_y + (-theta if location[0] > 0 else theta)
+    h, w, l = bbox.size.y, bbox.size.x, bbox.size.z
+    rot_mat = [[math.cos(rotation_y), 0, math.sin(rotation_y)], [0, 1, 0], [-math.sin(rotation_y), 0, math.cos(rotation_y)]]
+    corners_3D = np.dot(rot_mat, [[l/2, l/2, -l/2, -l/2, l/2, l/2, -l/2, -l/2], [0, 0, 0, 0, -h, -h, -h, -h],
+        [w/2, -w/2, -w/2, w/2, w/2, -w/2, -w/2, w/2]]) + np.array(location)[:, None]
+    corners_2D = np.dot(np.array(calibration.projection_matrix).reshape((3, 4)), np.vstack((corners_3D, np.ones([1, 8]))))
+    corners_2D = corners_2D[:2] / corners_2D[2]
+    bbox_2D = np.concatenate([corners_2D.min(axis=1), corners_2D.max(axis=1)])
+    return alpha, bbox_2D, (h, w, l), location, rotation_y
+
+class TestKitti(unittest.TestCase):
+    def test_reference(self): # Check the batched labels against the per NPC computation in random frames
+        rng = np.random.default_rng(3)
+        calib = calibration()
+        for _ in range(10):
+            ego = transform(rng.uniform(-100, 100), rng.uniform(-100, 100), rng.uniform(0, 360))
+            yaw = math.radians(ego.rotation.y)
+            npcs = []
+            for _ in range(8):
+                ahead, side = rng.uniform(8, 60), rng.uniform(-15, 15)
+                npcs.append(transform(ego.position.x + ahead * math.sin(yaw) + side * math.cos(yaw),
+                    ego.position.z + ahead * math.cos(yaw) - side * math.sin(yaw), rng.uniform(0, 360)))
+            f = frame(ego, npcs)
+            labels = kitti.compute_labels(f, calib)
+            expected = [reference_label(f, npc, bbox, calib) for npc, bbox in f.npcs]
+            self.assertGreater(len(labels), 0)
+            for label in labels:
+                k = int(np.argmin([np.linalg.norm(np.subtract(e[3], label["location"])) for e in expected]))
+                alpha, bbox_2D, dimensions, location, rotation_y = expected[k]
+                np.testing.assert_allclose(label["location"], location, atol=1e-4)
+                np.testing.assert_allclose(label["dimensions"], dimensions, atol=1e-6)
+                self.assertAlmostEqual(float(label["rotation_y"]), rotation_y, places=5)
+                self.assertAlmostEqual(float(label["alpha"]), alpha, places=5)
+                np.testing.assert_allclose(label["bbox"], np.clip(bbox_2D, 0, [WIDTH, HEIGHT, WIDTH, HEIGHT]), atol=1e-2)
+                if label["truncated"] == 0:
+                    np.testing.assert_allclose(label["bbox"], bbox_2D, atol=1e-2)
+            inside = [e for e in expected if e[3][2] > 3 and e[1][0] < WIDTH and e[1][2] > 0]
+            self.assertEqual(len(labels), len(inside))
+
+    def test_outside_view(self): # Check that NPCs behind the camera or beside the image get no label
+        f = frame(transform(0, 0, 0), [transform(0, -20, 0), transform(60, 10, 0), transform(0, 20, 0)])
+        labels = kitti.compute_labels(f, calibration())
+        self.assertEqual(len(labels), 1)
+        self.assertAlmostEqual(float(labels[0]["location"][2]), 20 - 1.5, places=4)
+        self.assertEqual(labels[0]["truncated"], 0)
+        self.assertEqual(labels[0]["occluded"], 0)
+        self.assertEqual(len(kitti.parse_ground_truth(f, calibration())), 1)
+        self.assertEqual(len(kitti.compute_labels(frame(transform(0, 0, 0), []), calibration())), 0)
+
+    def test_truncation(self): # Check that a box crossing the image border is clipped and partly truncated
+        f = frame(transform(0, 0, 0), [transform(14, 20, 0)])
+        calib = calibration()
+        label = kitti.compute_labels(f, calib)[0]
+        _, bbox_2D, _, _, _ = reference_label(f, *f.npcs[0], calib)
+        self.assertGreater(bbox_2D[2], WIDTH)
+        self.assertEqual(label["bbox"][2], WIDTH)
+        self.assertAlmostEqual(float(label["truncated"]), (bbox_2D[2] - WIDTH) / (bbox_2D[2] - bbox_2D[0]), places=4)
+        self.assertEqual(label["occluded"], 0)
+
+    def test_occlusion(self): # Check occlusion levels of cars hidden behind nearer ones
+        ego = transform(0, 0, 0)
+        npcs = [transform(0, 40, 0), transform(0, 15, 0), transform(5.5, 60, 0), transform(8, 60, 0)]
+        labels = kitti.compute_labels(frame(ego, npcs), calibration())
+        np.testing.assert_allclose(labels["location"][:, 2], [38.5, 13.5, 58.5, 58.5], atol=1e-4)
+        self.assertEqual(list(labels["occluded"]), [2, 0, 1, 0])
+
+def lane_handlers(): # Lanes every 3.5 m along z, objects farther than 60 m from the lidar are hidden
+    def point_on_lane(arguments):
+        point = arguments["point"]
+        return {"position": dict(point, x=round(point["x"] / 3.5) * 3.5), "rotation": {"x": 0, "y": 0, "z": 0}}
+
+    def raycast(arguments):
+        return [{"distance": 60, "point": {"x": 0, "y": 0, "z": 60}, "normal": {"x": 0, "y": 0, "z": -1}}
+            if a["max_distance"] > 60 else None for a in arguments]
+
+    result = {"map/point_on_lane": point_on_lane, "simulator/raycast": raycast}
+    result["simulator/batch"] = lambda arguments: [result[c["command"]](c["arguments"]) for c in arguments]
+    return result
+
+def placement(sim, yaw=0.0):
+    parser = kitti.KittiParser()
+    parser.sim = sim
+    parser.calibration = calibration()
+    parser.sensor_lidar = types.SimpleNamespace(transform=transform(0, 0, 0, y=2))
+    parser.ego_state = lgsvl.AgentState(transform(0, 0, yaw))
+    parser.reset_npcs()
+    return parser
+
+class TestPlacement(unittest.TestCase):
+    def test_stats(self): # Check the acceptance rate and summary of the placement counters
+        stats = kitti.PlacementStats()
+        self.assertEqual(stats.acceptance_rate, 0.0)
+        stats.rounds, stats.drawn, stats.in_fov, stats.spaced, stats.visible, stats.accepted = 2, 20, 12, 9, 6, 5
+        self.assertEqual(stats.acceptance_rate, 0.25)
+        self.assertEqual(repr(stats), "20 candidates in 2 rounds: 12 in view, 9 spaced, 6 visible, 5 placed (25.0% accepted)")
+
+    def test_in_fov(self): # Check the camera view across the 0/360 degree heading boundary
+        parser = placement(None, yaw=350.0)
+        hfov = parser.calibration.camera_intrinsics["horizontal_fov"]
+        headings = np.radians([350.0, 20.0, 350.0 - hfov / 2 + 1, 350.0 + hfov / 2 + 1, 170.0])
+        positions = np.stack([10 * np.sin(headings), np.zeros(5), 10 * np.cos(headings)], axis=1)
+        self.assertEqual(list(parser.are_npcs_in_fov(positions)), [True, True, True, False, False])
+
+    def test_too_close(self): # Check spacing along both axes to the EGO and placed NPCs
+        parser = placement(None)
+        parser.occupied = np.vstack([parser.occupied, [(20.0, 30.0)]])
+        positions = np.array([[4, 0, 4], [4, 0, 6], [16, 0, 26], [20, 0, 24], [-20, 0, 30]], dtype=float)
+        self.assertEqual(list(parser.are_npcs_too_close(positions)), [True, False, True, False, False])
+        self.assertTrue(parser.is_npc_too_close(transform(19, 31, 0)))
+
+    def test_draw(self): # Check that a batch of candidates costs one lane projection and one raycast round trip
+        with StandInServer(lane_handlers()) as server:
+            parser = placement(server.sim)
+            random.seed(5)
+            candidates = parser.draw_npc_candidates(16)
+            self.assertEqual([c["command"] for c in server.commands], ["simulator/batch", "simulator/raycast"])
+            self.assertEqual(len(server.commands[0]["arguments"]), 16)
+        stats = parser.placement_stats
+        self.assertEqual((stats.rounds, stats.drawn), (1, 16))
+        self.assertTrue(16 >= stats.in_fov >= stats.spaced >= stats.visible == len(candidates) > 0)
+        self.assertEqual(len(server.commands[1]["arguments"]), stats.spaced)
+        positions = np.array([(c.position.x, c.position.y, c.position.z) for c in candidates])
+        self.assertTrue(parser.are_npcs_in_fov(positions).all())
+        self.assertFalse(parser.are_npcs_too_close(positions).any())
+        self.assertTrue((np.linalg.norm(positions - [0, 2, 0], axis=1) <= 60).all())
+        self.assertTrue(np.allclose(positions[:, 0] / 3.5, np.round(positions[:, 0] / 3.5)))
+
+def rig_sensors(lidar_height=2.3):
+    sensors = [lgsvl.sensor.Sensor.create(None, j) for j in SENSORS]
+    sensors[1]._transform.position.y = lidar_height
+    return sensors
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_rig_hash(self): # Check that identical rigs hash the same and a moved sensor does not
+        calibration = kitti.calibrate(*rig_sensors())
+        self.assertEqual(calibration.rig_hash, kitti.calibrate(*rig_sensors()).rig_hash)
+        self.assertEqual(len(calibration.rig_hash), 16)
+        self.assertNotEqual(calibration.rig_hash, kitti.calibrate(*rig_sensors(2.4)).rig_hash)
+        self.assertIs(calibration.blob, calibration.blob)
+        self.assertEqual(calibration.checksum, hashlib.sha1(calibration.blob).hexdigest())
+        self.assertTrue(calibration.blob.decode("ascii").startswith("P0: "))
+
+        copy = kitti.Calibration.from_json(json.loads(json.dumps(calibration.to_json())))
+        self.assertEqual((copy.rig_hash, copy.blob), (calibration.rig_hash, calibration.blob))
+
+    def test_write_rig(self): # Check that every rig is written once to its blob and rig.json
+        layout = kitti.KittiLayout(self.path)
+        calibration = kitti.calibrate(*rig_sensors())
+        layout.write_rig(calibration)
+        blob = layout.rig_calib(calibration.rig_hash)
+        written = os.stat(blob).st_mtime_ns
+        os.utime(blob, ns=(written - 10 ** 9, written - 10 ** 9))
+        layout.write_rig(kitti.calibrate(*rig_sensors()))
+        self.assertEqual(os.stat(blob).st_mtime_ns, written - 10 ** 9)
+        layout.write_rig(kitti.calibrate(*rig_sensors(2.4)))
+
+        self.assertEqual(sorted(name for name in os.listdir(self.path) if name.startswith("rig_")),
+            sorted("rig_{}.txt".format(h) for h in (calibration.rig_hash, kitti.calibrate(*rig_sensors(2.4)).rig_hash)))
+        with open(os.path.join(self.path, "rig.json")) as f:
+            rigs = json.load(f)
+        self.assertEqual(len(rigs), 2)
+        self.assertEqual(rigs[calibration.rig_hash]["calib"], calibration.to_text())
+        with open(blob, "rb") as f:
+            self.assertEqual(f.read(), calibration.blob)
+
+    def test_link_or_copy(self): # Check hard links, the copy fallback and replacement of an existing target
+        source, target = os.path.join(self.path, "rig.txt"), os.path.join(self.path, "000000.txt")
+        with open(source, "wb") as f:
+            f.write(b"P0: 1 0 0\n")
+        with open(target, "wb") as f:
+            f.write(b"stale")
+        kitti.link_or_copy(source, target)
+        self.assertTrue(os.path.samefile(source, target))
+
+        with mock.patch("os.link", side_effect=OSError("cross-device link")):
+            kitti.link_or_copy(source, target)
+        self.assertFalse(os.path.samefile(source, target))
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"P0: 1 0 0\n")
+
+        kitti.link_or_copy(source, os.path.join(self.path, "000001.txt"), link=False)
+        self.assertFalse(os.path.samefile(source, os.path.join(self.path, "000001.txt")))
+        self.assertEqual(os.stat(source).st_nlink, 1)
+
+    def test_extrinsics(self): # Check that the velodyne and IMU transforms follow the sensor rig, in Kitti axes
+        camera, lidar, imu = rig_sensors()
+        for sensor in (camera, lidar, imu):
+            sensor._transform.rotation = lgsvl.Vector(0, 0, 0)
+        calibration = kitti.calibrate(camera, lidar, imu)
+        c, l, i = camera.transform.position, lidar.transform.position, imu.transform.position
+        np.testing.assert_array_equal(calibration.tr_velo_to_cam, [0, -1, 0, l.x - c.x, 0, 0, -1, c.y - l.y, 1, 0, 0, l.z - c.z])
+        np.testing.assert_array_equal(calibration.tr_imu_to_velo, [1, 0, 0, i.z - l.z, 0, 1, 0, l.x - i.x, 0, 0, 1, i.y - l.y])
+
+        camera, lidar, imu = rig_sensors()
+        calibration = kitti.calibrate(camera, lidar, imu)
+        rig = lgsvl.SensorRig([camera, lidar, imu])
+        velo = np.array([4.0, 1.0, 0.5])  # forward, left, up of the lidar
+        unity = np.array([-velo[1], velo[2], velo[0], 1.0]).dot(rig.extrinsic(lidar, camera))
+        cam = calibration.tr_velo_to_cam.reshape(3, 4).dot(np.append(velo, 1.0))
+        np.testing.assert_allclose(cam, [unity[0], -unity[1], unity[2]], atol=1e-9)
@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import io
+import os
+import tempfile
+import numpy as np
+import lgsvl.pcd
+
+def make_points(count=100):
+    points = np.zeros(count, dtype=lgsvl.pcd.POINT_DTYPE)
+    points["x"] = np.linspace(-10, 10, count)
+    points["y"] = np.linspace(0, 1, count)
+    points["z"] = np.linspace(5, -5, count)
+    points["intensity"] = np.arange(count) % 256
+    return points
+
+class TestPcd(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "scan.pcd")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_binary_roundtrip(self): # Check that binary PCD files are read back memory mapped and unchanged
+        points = make_points()
+        lgsvl.pcd.write(self.path, points)
+        result = lgsvl.pcd.read(self.path)
+        self.assertIsInstance(result, np.memmap)
+        self.assertEqual(result.dtype, lgsvl.pcd.POINT_DTYPE)
+        np.testing.assert_array_equal(result, points)
+        del result
+
+    def test_ascii_roundtrip(self): # Check that ascii PCD files are parsed into the same structured array
+        points = make_points()
+        lgsvl.pcd.write(self.path, points, binary=False)
+        np.testing.assert_array_equal(lgsvl.pcd.read(self.path), points)
+
+    def test_read_file_object(self): # Check that an open file (as used by the KITTI parser) can be read
+        points = make_points(3)
+        lgsvl.pcd.write(self.path, points)
+        with open(self.path, "rb") as f:
+            np.testing.assert_array_equal(lgsvl.pcd.read(f), points)
+
+    def test_header_comments(self): # Check that comments and multi-count fields are supported
+        data = b"# .PCD v0.7\nVERSION 0.7\nFIELDS x rgb\nSIZE 4 1\nTYPE F U\nCOUNT 1 3\nWIDTH 2\nHEIGHT 1\nPOINTS 2\nDATA ascii\n1.5 1 2 3\n-2 4 5 6\n"
+        result = lgsvl.pcd.read(io.BytesIO(data))
+        np.testing.assert_array_equal(result["x"], [1.5, -2])
+        np.testing.assert_array_equal(result["rgb"], [[1, 2, 3], [4, 5, 6]])
+
+    def test_truncated(self): # Check that truncated binary data is reported
+        data = b"FIELDS x y z intensity\nSIZE 4 4 4 1\nTYPE F F F U\nPOINTS 2\nDATA binary\n" + make_points(1).tobytes()
+        with self.assertRaises(ValueError):
+            lgsvl.pcd.read(io.BytesIO(data))
+
+    def test_to_xyzi(self): # Check that intensity is rescaled to [0, 1] as KITTI expects
+        points = make_points()
+        result = lgsvl.pcd.to_xyzi(points)
+        self.assertEqual(result.shape, (100, 4))
+        self.assertEqual(result.dtype, np.float32)
+        np.testing.assert_allclose(result[:, 0], points["x"])
+        np.testing.assert_allclose(result[:, 3], points["intensity"] / 255, rtol=1e-6)
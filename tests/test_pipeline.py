@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataset.pipeline import Pipeline, Stage
+
+def slow_square(x): # Later frames finish first
+    time.sleep(0.002 * (10 - x % 10))
+    return x * x
+
+def drop_odd(x):
+    return None if x % 2 else x
+
+def fail_on_five(x):
+    if x == 5:
+        raise ValueError("frame 5")
+    return x
+
+class TestPipeline(unittest.TestCase):
+    def test_order(self): # Check that frames leave every stage in source order, dropped ones excepted
+        collected = []
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            pipeline = Pipeline([Stage("square", slow_square, workers=4), Stage("drop", drop_odd, workers=3)], 2, executor)
+            stats = pipeline.run(range(30), sink=[collected.append])
+        self.assertEqual(collected, [x * x for x in range(30) if x % 2 == 0])
+        self.assertEqual([(s.name, s.frames) for s in stats.values()], [("simulator", 30), ("square", 30), ("drop", 30)])
+        self.assertEqual(len(pipeline.report().split("\n")), 3)
+
+    def test_process_pool(self): # Check the default process pool and that it is shut down after the run
+        collected = []
+        stats = Pipeline([Stage("square", slow_square, workers=2)]).run(range(10), sink=collected.append)
+        self.assertEqual(collected, [x * x for x in range(10)])
+        self.assertEqual(stats["square"].workers, 2)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_stage_error(self): # Check that an error of a stage stops the source and is raised by run
+        consumed = []
+        def source():
+            for x in range(1000):
+                consumed.append(x)
+                yield x
+        collected = []
+        threads = threading.active_count()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with self.assertRaises(ValueError):
+                Pipeline([Stage("fail", fail_on_five, workers=2)], 2, executor).run(source(), sink=collected.append)
+            self.assertEqual(executor.submit(abs, -1).result(), 1)  # an executor given to the pipeline stays open
+        self.assertLess(len(consumed), 1000)
+        self.assertEqual(collected, list(range(len(collected))))  # frames done before the error, in order
+        self.assertLessEqual(len(collected), 5)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_sink_error(self): # Check that an error of the sink is raised and later frames are not passed on
+        collected = []
+        def sink(x):
+            if x == 3:
+                raise RuntimeError("disk full")
+            collected.append(x)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with self.assertRaises(RuntimeError):
+                Pipeline([Stage("copy", abs)], 2, executor).run(range(100), sink=sink)
+        self.assertEqual(collected, [0, 1, 2])
@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import os
+import tempfile
+import py_trees
+from lgsvl.remote import Remote
+from scenario.command_buffer import CommandBuffer
+from scenario.profiler import TreeProfiler
+
+from .common import StandInServer
+from .test_server_data_provider import Actor
+
+class Send(py_trees.behaviour.Behaviour):
+    def __init__(self, name, remote):
+        super().__init__(name)
+        self.remote = remote
+
+    def update(self):
+        self.remote.command("simulator/ping")
+        return py_trees.common.Status.SUCCESS
+
+class Buffer(py_trees.behaviour.Behaviour):
+    def __init__(self, name, actor):
+        super().__init__(name)
+        self.actor = actor
+
+    def update(self):
+        CommandBuffer.record(self.actor, "state", ("agent/state/set", {"uid": self.actor.uid, "x": 1}))
+        CommandBuffer.record(self.actor, "state", ("agent/state/set", {"uid": self.actor.uid, "x": 2}))
+        return py_trees.common.Status.SUCCESS
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        CommandBuffer.clear()
+
+    def tearDown(self):
+        CommandBuffer.clear()
+
+    def tree(self, remote):
+        root = py_trees.composites.Sequence("root;main")
+        root.add_child(Send("send", remote))
+        root.add_child(Buffer("buffer", Actor("npc")))
+        return root
+
+    def test_attach_detach(self): # Check that nodes and only the given remote are wrapped until detach
+        with StandInServer({"simulator/ping": lambda arguments: None}) as server:
+            remote = server.sim.remote
+            command = Remote.command
+            tree = self.tree(remote)
+            profiler = TreeProfiler(tree, remote)
+            profiler.attach()
+            profiler.attach()
+            self.assertIn("update", tree.children[0].__dict__)
+            self.assertIn("command", remote.__dict__)
+            self.assertIs(Remote.command, command)
+            tree.tick_once()
+            profiler.detach()
+            for node in [tree] + tree.children:
+                self.assertFalse(set(node.__dict__) & {"initialise", "update", "terminate"})
+            self.assertNotIn("command", remote.__dict__)
+            self.assertIs(Remote.command, command)
+            tree.tick_once()
+            self.assertEqual(len(server.commands), 2)
+            self.assertEqual(profiler.stats[(("root,main[Sequence]", "send[Send]"), "update")].calls, 1)
+
+    def test_report(self): # Check per node calls, commands sent or buffered and the ranked report
+        with StandInServer({"simulator/ping": lambda arguments: None}) as server:
+            tree = self.tree(server.sim.remote)
+            profiler = TreeProfiler(tree, server.sim.remote)
+            profiler.attach()
+            for _ in range(3):
+                tree.tick_once()
+            profiler.detach()
+        send = profiler.stats[(("root,main[Sequence]", "send[Send]"), "update")]
+        buffer = profiler.stats[(("root,main[Sequence]", "buffer[Buffer]"), "update")]
+        self.assertEqual((send.calls, send.commands), (3, 3))
+        self.assertEqual((buffer.calls, buffer.commands), (3, 6))
+        self.assertAlmostEqual(send.total, sum(send.times))
+        rows = profiler.ranked()
+        self.assertEqual([row[2].total for row in rows], sorted([row[2].total for row in rows], reverse=True))
+        self.assertIn((("root,main[Sequence]", "buffer[Buffer]"), "terminate"), [row[0:2] for row in rows])
+        lines = profiler.report().split("\n")
+        self.assertEqual(len(lines), len(rows) + 1)
+        self.assertEqual(lines[0].split(), ["node", "method", "calls", "total", "ms", "mean", "us", "p99", "us", "commands"])
+        self.assertEqual(len(profiler.report(limit=2).split("\n")), 3)
+        row = lines[[r[0:2] for r in rows].index((("root,main[Sequence]", "send[Send]"), "update")) + 1].split()
+        self.assertEqual((row[0], row[1], row[2], row[-1]), ("send[Send]", "update", "3", "3"))
+
+    def test_flamegraph(self): # Check the collapsed stacks of the called node methods
+        with StandInServer({"simulator/ping": lambda arguments: None}) as server:
+            tree = self.tree(server.sim.remote)
+            profiler = TreeProfiler(tree, server.sim.remote)
+            profiler.attach()
+            tree.tick_once()
+            profiler.detach()
+        with tempfile.TemporaryDirectory() as path:
+            profiler.write_flamegraph(os.path.join(path, "tree.folded"))
+            with open(os.path.join(path, "tree.folded")) as f:
+                lines = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+        stacks = [stack for stack, _ in lines]
+        self.assertIn("root,main[Sequence];send[Send];update", stacks)
+        self.assertIn("root,main[Sequence];buffer[Buffer];initialise", stacks)
+        self.assertEqual(len(stacks), len(profiler.ranked()))
+        self.assertTrue(all(int(us) >= 0 for _, us in lines))
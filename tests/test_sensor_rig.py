@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import numpy as np
+import lgsvl
+from lgsvl.utils import transform_to_matrix
+
+from .common import StandInServer
+
+def mount(x, y, z, ry):
+    return {"position": {"x": x, "y": y, "z": z}, "rotation": {"x": 0, "y": ry, "z": 0}}
+
+SENSORS = [
+    {"type": "camera", "uid": "camera-0", "name": "Main Camera", "frequency": 15, "width": 1920, "height": 1080,
+        "fov": 50, "near_plane": 0.1, "far_plane": 2000, "format": "RGB", "transform": mount(0, 1.7, 1.0, 0)},
+    {"type": "lidar", "uid": "lidar-0", "name": "Lidar", "min_distance": 0.5, "max_distance": 100, "rays": 32,
+        "rotations": 10, "measurements": 1500, "fov": 41.33, "angle": 10, "compensated": True,
+        "transform": mount(0, 2.3, -0.3, 90)},
+    {"type": "imu", "uid": "imu-0", "name": "IMU", "transform": mount(0, 0.5, 0, 0)},
+]
+
+HANDLERS = {
+    "simulator/add_agent": lambda arguments: "ego-0",
+    "vehicle/sensors/get": lambda arguments: SENSORS,
+}
+
+class TestSensorRig(unittest.TestCase):
+    def test_cached_metadata(self): # Check that sensors and their transforms are fetched once
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            sensors = ego.get_sensors()
+            count = len(server.commands)
+            for _ in range(3):
+                for sensor in ego.get_sensors():
+                    sensor.transform
+            self.assertEqual(len(server.commands), count)
+            self.assertEqual(sensors[1].transform.position.y, 2.3)
+            self.assertEqual(sensors[0].width, 1920)
+
+            ego.get_sensors(refresh=True)
+            self.assertEqual(len(server.commands), count + 1)
+
+    def test_extrinsics(self): # Check that rig extrinsics map points between sensor frames
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            rig = ego.sensor_rig
+            self.assertIs(rig, ego.sensor_rig)
+            self.assertEqual(rig["Lidar"].uid, "lidar-0")
+
+            lidar_to_camera = rig.extrinsic("Lidar", "Main Camera")
+            np.testing.assert_allclose(lidar_to_camera @ rig.extrinsic(rig["Main Camera"], "Lidar"), np.eye(4), atol=1e-12)
+            np.testing.assert_allclose(rig.extrinsic("IMU", "IMU"), np.eye(4), atol=1e-12)
+
+            # the lidar origin seen from the camera is the difference of the mount positions
+            origin = np.array([0, 0, 0, 1.0]) @ lidar_to_camera
+            np.testing.assert_allclose(origin[:3], [0, 0.6, -1.3], atol=1e-12)
+
+            point = np.array([1.0, 2.0, 3.0, 1.0])
+            vehicle = point @ np.array(transform_to_matrix(rig["Lidar"].transform))
+            np.testing.assert_allclose(point @ lidar_to_camera @ rig.mount("Main Camera"), vehicle, atol=1e-12)
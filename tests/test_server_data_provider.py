@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import numpy as np
+from scenario.server_data_provider import ServerDataProvider, decode_states, HISTORY_LENGTH, STATE_SIZE
+
+class Actor:
+    def __init__(self, uid):
+        self.uid = uid
+        self.name = uid
+
+def record(uid, position, velocity=(0, 0, 0), yaw=0.0, angular_velocity=(0, 0, 0)):
+    xyz = lambda v: {"x": v[0], "y": v[1], "z": v[2]}
+    return {"agent_id": uid, "transform": {"position": xyz(position), "rotation": xyz((0, yaw, 0))},
+        "velocity": xyz(velocity), "angular_velocity": xyz(angular_velocity)}
+
+def episode(frame, time, npcs, egos=None):
+    state = {"game_time": {"current_time": time, "current_frame": frame}, "npcs_state": npcs}
+    if egos is not None:
+        state["egos_state"] = egos
+    return state
+
+class TestServerDataProvider(unittest.TestCase):
+    def setUp(self):
+        ServerDataProvider.cleanup()
+
+    def tearDown(self):
+        ServerDataProvider.cleanup()
+
+    def test_decode_states(self): # Check the state row layout and missing velocities
+        states = decode_states([record("a", (1, 2, 3), (4, 5, 6), 90, (0, 0.5, 0)),
+            {"transform": {"position": {"x": 1, "y": 1, "z": 1}, "rotation": {"x": 0, "y": 0, "z": 0}}}])
+        self.assertEqual(states.shape, (2, STATE_SIZE))
+        np.testing.assert_array_equal(states[0], [1, 2, 3, 4, 5, 6, 0, 90, 0, 0, 0.5, 0])
+        np.testing.assert_array_equal(states[1, 3:6], [0, 0, 0])
+        self.assertEqual(decode_states([]).shape, (0, STATE_SIZE))
+
+    def test_state_store(self): # Check that states land in the slots of their actors, also past the initial capacity
+        actors = [Actor("npc-{}".format(i)) for i in range(40)]
+        ServerDataProvider.register_actors(actors)
+        with self.assertRaises(KeyError):
+            ServerDataProvider.register_actor(actors[0])
+        ServerDataProvider.on_server_tick(episode(1, 0.5, [record(a.uid, (i, 0, -i), (3, 0, 4)) for i, a in enumerate(actors[:30])]))
+
+        location = ServerDataProvider.get_location(actors[25])
+        self.assertEqual((location.x, location.z), (25, -25))
+        self.assertEqual(ServerDataProvider.get_velocity(actors[25]), 5)
+        self.assertEqual(ServerDataProvider.get_velocity_vector(actors[3]).z, 4)
+        self.assertEqual(ServerDataProvider.get_state(actors[7]).transform.position.x, 7)
+        self.assertIsNone(ServerDataProvider.get_location(actors[35]))
+        self.assertIsNone(ServerDataProvider.get_state(actors[35]))
+        self.assertEqual(ServerDataProvider.get_velocity(actors[35]), 0)
+        self.assertEqual(ServerDataProvider.get_frame(actors[0]), 1)
+
+        ServerDataProvider.cleanup()
+        self.assertIsNone(ServerDataProvider.get_location(actors[25]))
+
+    def test_records_by_uid(self): # Check uid matching, actors missing from a frame and records of agents registered later
+        ego, npc, late = Actor("ego"), Actor("npc"), Actor("late")
+        ServerDataProvider.register_actors([npc, ego])
+        ServerDataProvider.on_server_tick(episode(1, 0.1, [record("late", (9, 0, 9)), record("npc", (1, 0, 0)), record(None, (5, 5, 5))],
+            [record("ego", (2, 0, 0))]))
+        self.assertEqual(ServerDataProvider.get_location(npc).x, 1)
+        self.assertEqual(ServerDataProvider.get_location(ego).x, 2)
+
+        ServerDataProvider.on_server_tick({"game_time": {"current_time": 0.2, "current_frame": 2},
+            "npcs_state": [record("npc", (1.5, 0, 0))], "ego_state": record("ego", (3, 0, 0))})
+        self.assertEqual(ServerDataProvider.get_location(ego).x, 3)
+        self.assertEqual(ServerDataProvider.get_frame(ego), 2)
+
+        ServerDataProvider.on_server_tick(episode(3, 0.3, [], [record("ego", (4, 0, 0))]))
+        self.assertEqual(ServerDataProvider.get_location(npc).x, 1.5)
+        self.assertEqual(ServerDataProvider.get_frame(npc), 2)
+
+        ServerDataProvider.register_actor(late)
+        self.assertEqual(ServerDataProvider.get_location(late).z, 9)
+        self.assertEqual(ServerDataProvider.get_frame(late), 1)
+        self.assertNotIn("late", ServerDataProvider._unregistered)
+
+    def test_derived_quantities(self): # Check finite difference acceleration and jerk, heading wrap and odometer
+        car = Actor("car")
+        ServerDataProvider.register_actor(car)
+        self.assertIsNone(ServerDataProvider.get_acceleration(car))
+        # v = 0, 1, 3, 6 m/s at 0.5 s steps: a = 2, 4, 6 m/s^2 and a jerk of 4 m/s^3
+        for frame, (x, v, yaw) in enumerate([(0, 0, 170), (0.25, 1, 178), (1, 3, -176), (2.5, 6, -174)]):
+            ServerDataProvider.on_server_tick(episode(frame, frame * 0.5, [record("car", (x, 0, 0), (v, 0, 0), yaw)]))
+            if frame == 1:
+                self.assertAlmostEqual(ServerDataProvider.get_acceleration(car).x, 2)
+                self.assertIsNone(ServerDataProvider.get_jerk(car))
+        self.assertAlmostEqual(ServerDataProvider.get_acceleration(car).x, 6)
+        self.assertAlmostEqual(ServerDataProvider.get_jerk(car).x, 4)
+        self.assertAlmostEqual(ServerDataProvider.get_heading_rate(car), 4)
+        self.assertAlmostEqual(ServerDataProvider.get_odometer(car), 2.5)
+
+        # heading from 178 to -176 degrees turns by +6, not -354
+        ServerDataProvider.history.clear()
+        for frame, yaw in enumerate([178, -176]):
+            ServerDataProvider.on_server_tick(episode(10 + frame, 5 + frame * 0.5, [record("car", (0, 0, 0), yaw=yaw)]))
+        self.assertAlmostEqual(ServerDataProvider.get_heading_rate(car), 12)
+
+    def test_missing_tick(self): # Check that derived quantities are unknown when the actor was missing from a tick
+        car, other = Actor("car"), Actor("other")
+        ServerDataProvider.register_actors([car, other])
+        ServerDataProvider.on_server_tick(episode(1, 0.5, [record("car", (0, 0, 0), (1, 0, 0)), record("other", (0, 0, 0))]))
+        ServerDataProvider.on_server_tick(episode(2, 1.0, [record("other", (1, 0, 0))]))
+        self.assertIsNone(ServerDataProvider.get_acceleration(car))
+        self.assertIsNotNone(ServerDataProvider.get_acceleration(other))
+        ServerDataProvider.on_server_tick(episode(3, 1.5, [record("car", (5, 0, 0), (2, 0, 0)), record("other", (2, 0, 0))]))
+        self.assertIsNone(ServerDataProvider.get_acceleration(car))
+        self.assertEqual(ServerDataProvider.get_odometer(car), 0)
+        self.assertEqual(ServerDataProvider.get_odometer(other), 2)
+
+    def test_history_wraparound(self): # Check the history window and odometer after more ticks than HISTORY_LENGTH
+        car = Actor("car")
+        ServerDataProvider.register_actor(car)
+        ticks = HISTORY_LENGTH + 36
+        for frame in range(ticks):
+            ServerDataProvider.on_server_tick(episode(frame, frame * 0.1, [record("car", (2.0 * frame, 0, 0), (20, 0, 0))]))
+        time, position, velocity, _ = ServerDataProvider.get_history(car)
+        self.assertEqual(len(time), HISTORY_LENGTH)
+        np.testing.assert_allclose(time, np.arange(ticks - HISTORY_LENGTH, ticks) * 0.1)
+        np.testing.assert_allclose(position[:, 0], np.arange(ticks - HISTORY_LENGTH, ticks) * 2.0)
+        self.assertEqual(len(ServerDataProvider.get_history(car, 5)[0]), 5)
+        self.assertAlmostEqual(ServerDataProvider.history.path_length(0, 11), 20)
+        self.assertAlmostEqual(ServerDataProvider.get_odometer(car), 2.0 * (ticks - 1))
+        self.assertAlmostEqual(ServerDataProvider.get_acceleration(car).x, 0)
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import os
+import tempfile
+from dataset import shard
+
+def write_frame(base_path, idx, content=b"image"): # Writes the files of a frame and returns its manifest entry
+    files = {}
+    for folder, ext in (("image_2", "png"), ("label_2", "txt")):
+        name = os.path.join(folder, "{:06d}.{}".format(idx, ext))
+        os.makedirs(os.path.join(base_path, folder), exist_ok=True)
+        with open(os.path.join(base_path, name), "wb") as f:
+            f.write(content + str(idx).encode())
+        files[name] = shard.file_checksum(os.path.join(base_path, name))
+    return {"idx": idx, "seed": shard.frame_seed(0, idx), "files": files}
+
+class TestShard(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def make_shard(self, name, indices, written):
+        result = shard.Shard(name, indices, ("127.0.0.1", 8181), os.path.join(self.path, "shards", name))
+        os.makedirs(result.base_path)
+        manifest = shard.Manifest(result.manifest_path)
+        for idx in written:
+            manifest.append(write_frame(result.base_path, idx))
+        return result
+
+    def test_plan(self): # Check that index ranges are split contiguously and seeds do not depend on the shard
+        self.assertEqual(shard.split_range(10, 7, 3), [range(10, 12), range(12, 14), range(14, 17)])
+        self.assertEqual(shard.parse_endpoint("sim-1:9090"), ("sim-1", 9090))
+        self.assertEqual(shard.parse_endpoint("sim-2"), ("sim-2", 8181))
+        shards = shard.plan(["a:1", "b:2"], 0, 5, self.path, seed=3)
+        self.assertEqual([list(s.indices) for s in shards], [[0, 1], [2, 3, 4]])
+        self.assertEqual(shards[1].base_path, os.path.join(self.path, "shards", "shard_001"))
+        self.assertEqual(shard.frame_seed(3, 4), shard.frame_seed(3, 4))
+        self.assertNotEqual(shard.frame_seed(3, 4), shard.frame_seed(4, 4))
+
+    def test_manifest_partial_line(self): # Check that a line cut short by a crash is ignored on load
+        manifest = shard.Manifest(os.path.join(self.path, shard.MANIFEST))
+        manifest.append({"idx": 1, "files": {}})
+        with open(manifest.path, "a") as f:
+            f.write('{"idx": 2, "fil')
+        manifest = shard.Manifest(manifest.path)
+        self.assertIn(1, manifest)
+        self.assertNotIn(2, manifest)
+        self.assertEqual(len(manifest), 1)
+
+    def test_resume(self): # Check that completed frames are skipped and corrupted ones regenerated with --verify
+        s = self.make_shard("shard_000", range(0, 5), [0, 1, 3])
+        self.assertEqual(s.pending(), [2, 4])
+        with open(os.path.join(s.base_path, "image_2", "000001.png"), "wb") as f:
+            f.write(b"corrupted")
+        self.assertEqual(s.pending(), [2, 4])
+        self.assertEqual(s.pending(verify=True), [1, 2, 4])
+        self.assertNotIn(1, shard.Manifest(s.manifest_path))
+
+    def test_merge(self): # Check that shard trees merge into one tree with a combined manifest
+        shards = [self.make_shard("shard_000", range(0, 2), [0, 1]), self.make_shard("shard_001", range(2, 4), [2, 3])]
+        merged = shard.merge(shards, self.path, link=False)
+        self.assertEqual(sorted(merged.entries), [0, 1, 2, 3])
+        self.assertEqual(shard.Manifest(os.path.join(self.path, shard.MANIFEST)).entries, merged.entries)
+        with open(os.path.join(self.path, "image_2", "000003.png"), "rb") as f:
+            self.assertEqual(f.read(), b"image3")
+        self.assertEqual(merged.verify(self.path), [])
+
+        with open(os.path.join(shards[0].base_path, "label_2", "000000.txt"), "wb") as f:
+            f.write(b"corrupted")
+        with self.assertRaises(RuntimeError):
+            shard.merge(shards, self.path)
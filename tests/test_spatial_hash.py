@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import random
+import lgsvl
+from scenario.spatial_hash import SpatialHash
+
+class TestSpatialHash(unittest.TestCase):
+    def test_query(self): # Check euclidean and box queries, also across cell borders and negative coordinates
+        grid = SpatialHash(5.0)
+        grid.insert("a", lgsvl.Vector(0, 10, 0))
+        grid.insert("b", (4.9, 4.9))
+        grid.insert("c", (-5.1, 0.2))
+        self.assertEqual(len(grid), 3)
+        self.assertEqual(sorted(grid.query((0, 0), 5)), ["a"])
+        self.assertEqual(sorted(grid.query((0, 0), 6)), ["a", "c"])
+        self.assertEqual(sorted(grid.query((0, 0), 7)), ["a", "b", "c"])
+        self.assertEqual(sorted(grid.query((0, 0), 5, box=True)), ["a", "b"])
+        self.assertEqual(grid.query(lgsvl.Vector(0, -3, 0), 1, exclude="a"), [])
+        self.assertTrue(grid.any_within((-4, 0), 1.2))
+        self.assertFalse(grid.any_within((-4, 0), 1.2, exclude="c"))
+
+    def test_move_remove(self): # Check that inserting a present key moves it and removed keys are not found
+        grid = SpatialHash(2.0)
+        grid.insert("a", (0, 0))
+        grid.insert("a", (100, 100))
+        self.assertEqual(len(grid), 1)
+        self.assertEqual(grid.query((0, 0), 1), [])
+        self.assertEqual(grid.query((100, 100), 1), ["a"])
+        grid.remove("a")
+        self.assertNotIn("a", grid)
+        self.assertFalse(grid.any_within((100, 100), 1))
+        grid.insert("b", (1, 1))
+        grid.clear()
+        self.assertEqual(len(grid), 0)
+
+    def test_brute_force(self): # Check random queries against a linear scan
+        rng = random.Random(0)
+        points = {i: (rng.uniform(-50, 50), rng.uniform(-50, 50)) for i in range(300)}
+        grid = SpatialHash(4.0)
+        for key, point in points.items():
+            grid.insert(key, point)
+        for _ in range(100):
+            x, z, radius = rng.uniform(-60, 60), rng.uniform(-60, 60), rng.uniform(0.5, 15)
+            expected = [k for k, (px, pz) in points.items() if (px - x) ** 2 + (pz - z) ** 2 < radius ** 2]
+            self.assertEqual(sorted(grid.query((x, z), radius)), expected)
+            self.assertEqual(grid.any_within((x, z), radius), bool(expected))
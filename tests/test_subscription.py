@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import numpy as np
+import lgsvl
+from lgsvl.remote import BinaryFrame
+
+from .common import StandInServer
+
+CAMERA = {"type": "camera", "uid": "camera-0", "name": "Main Camera", "frequency": 15, "width": 2, "height": 1,
+  "fov": 50, "near_plane": 0.1, "far_plane": 2000, "format": "RGB"}
+
+GPS = {"type": "gps", "uid": "gps-0", "name": "GPS", "frequency": 12.5}
+
+HANDLERS = {
+    "simulator/add_agent": lambda arguments: "ego-0",
+    "vehicle/sensors/get": lambda arguments: [CAMERA, GPS],
+    "sensor/subscribe": lambda arguments: None,
+    "sensor/unsubscribe": lambda arguments: None,
+}
+
+def gps_reading(time, frame):
+    return {"type": "sensor", "uid": "gps-0", "time": time, "frame": frame,
+        "result": {"latitude": 37.4, "longitude": -122.0, "northing": 4140000 + frame, "easting": 587000,
+        "altitude": 10, "orientation": 90}}
+
+def camera_reading(time, frame):
+    image = np.full((1, 2, 3), frame, dtype=np.uint8)
+    return {"type": "sensor", "uid": "camera-0", "time": time, "frame": frame,
+        "result": BinaryFrame({"encoding": "raw", "width": 2, "height": 1, "channels": 3}, image.tobytes())}
+
+class TestSubscription(unittest.TestCase):
+    def test_buffer(self): # Check ring buffer ordering, overwrite and time queries
+        buffer = lgsvl.SensorBuffer(3)
+        self.assertIsNone(buffer.latest())
+        for frame in range(5):
+            buffer.append(frame * 0.1, frame, "reading {}".format(frame))
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.latest(), lgsvl.SensorReading(0.4, 4, "reading 4"))
+        self.assertEqual([r.frame for r in buffer.since(0.25)], [3, 4])
+        self.assertEqual([r.frame for r in buffer.since(0.0)], [2, 3, 4])
+        self.assertEqual(buffer.at(0.35).frame, 3)
+        self.assertIsNone(buffer.at(0.1))
+
+    def test_snapshot(self): # Check that a snapshot aligns sensors on the newest common time
+        fast, slow = lgsvl.SensorBuffer(8), lgsvl.SensorBuffer(8)
+        self.assertIsNone(lgsvl.snapshot([fast, slow]))
+        for frame in range(6):
+            fast.append(frame * 0.25, frame, frame)
+        slow.append(0.0, 0, "a")
+        slow.append(0.75, 3, "b")
+        result = lgsvl.snapshot([fast, slow])
+        self.assertEqual(result[fast].frame, 3)
+        self.assertEqual(result[slow].data, "b")
+        self.assertIsNotNone(lgsvl.snapshot([fast, slow], tolerance=0.01))
+        slow.append(1.125, 4, "c")
+        self.assertIsNone(lgsvl.snapshot([fast, slow], tolerance=0.01))
+
+    def test_subscribe(self): # Check that pushed readings end up parsed in the sensor buffers
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera, gps = ego.get_sensors()
+            camera.subscribe(4)
+            gps.subscribe(4)
+            self.assertEqual(server.commands[-2]["arguments"]["encoding"], "raw")
+            for frame in range(6):
+                server.push(camera_reading(frame * 0.05, frame))
+                server.push(gps_reading(frame * 0.05, frame))
+
+            reading = gps.buffer.wait_for(5, timeout=5)
+            self.assertEqual(reading.data.northing, 4140005)
+            image = camera.buffer.wait_for(5, timeout=5)
+            np.testing.assert_array_equal(image.data, np.full((1, 2, 3), 5, dtype=np.uint8))
+            self.assertEqual(len(camera.buffer), 4)
+            self.assertEqual(lgsvl.snapshot([camera, gps])[gps].frame, 5)
+
+            gps.unsubscribe()
+            self.assertEqual(server.commands[-1], {"command": "sensor/unsubscribe", "arguments": {"uid": "gps-0"}})
+
+    def test_subscriber_error(self): # Check that a reading the subscriber cannot parse does not stop command replies
+        with StandInServer(HANDLERS) as server:
+            ego = server.sim.add_agent("Jaguar2015XE (Apollo 3.0)", lgsvl.AgentType.EGO)
+            camera, gps = ego.get_sensors()
+            camera.subscribe(4)
+            gps.subscribe(4)
+            with self.assertLogs("lgsvl.remote", level="ERROR"):
+                server.push({"type": "sensor", "uid": "camera-0", "time": 0.0, "frame": 0, "result": "not an image"})
+                server.push(gps_reading(0.05, 1))
+                self.assertEqual(gps.buffer.wait_for(1, timeout=5).frame, 1)
+            self.assertEqual(len(camera.buffer), 0)
+            self.assertEqual(ego.get_sensors()[1].uid, "gps-0")
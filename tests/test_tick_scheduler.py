@@ -0,0 +1,49 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+from scenario.tick_scheduler import TickScheduler
+
+class TestTickScheduler(unittest.TestCase):
+    def steps(self, scheduler, estimates):
+        result = []
+        for estimate in estimates:
+            if estimate is not None:
+                TickScheduler.report(estimate)
+            result.append(round(scheduler.next_step(), 6))
+        return result
+
+    def test_base_step(self): # Check that without estimates the step stays at base_step
+        scheduler = TickScheduler(0.5)
+        self.assertEqual(scheduler.max_step, 0.5)
+        self.assertEqual(self.steps(scheduler, [None] * 4), [0.5] * 4)
+        self.assertEqual(scheduler.tightened, 0)
+
+    def test_tighten_relax(self): # Check that the step shrinks as a trigger approaches and grows back to base_step after
+        scheduler = TickScheduler(0.5, 0.05)
+        self.assertEqual(self.steps(scheduler, [3.0, 0.6, 0.2, 0.04, None, None, None, None, None]),
+            [0.5, 0.3, 0.1, 0.05, 0.075, 0.1125, 0.16875, 0.253125, 0.379688])
+        self.assertEqual(self.steps(scheduler, [None, None]), [0.5, 0.5])
+        self.assertEqual(scheduler.tightened, 8)
+        self.assertEqual(scheduler.smallest_step, 0.05)
+        self.assertAlmostEqual(scheduler.simulated, 2.9390625)
+
+    def test_smallest_estimate(self): # Check that the closest of several triggers sets the step and invalid estimates are ignored
+        scheduler = TickScheduler(0.5, 0.05)
+        for estimate in (2.0, 0.4, float("inf"), float("nan"), -1.0):
+            TickScheduler.report(estimate)
+        self.assertEqual(scheduler.next_step(), 0.05)
+        TickScheduler.report(0.4)
+        TickScheduler.report(float("nan"))
+        self.assertAlmostEqual(scheduler.next_step(), 0.075)
+
+    def test_max_step(self): # Check that a larger max_step lets quiet stretches run with longer steps
+        scheduler = TickScheduler(0.5, 0.05, 1.0)
+        self.assertEqual(self.steps(scheduler, [None, None, None, 1.2]), [0.75, 1.0, 1.0, 0.6])
+        scheduler.restart()
+        self.assertEqual((scheduler.step, scheduler.ticks), (0.5, 0))
+        with self.assertRaises(ValueError):
+            TickScheduler(0.5, 0.05, 0.25)
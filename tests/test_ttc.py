@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2019 LG Electronics, Inc.
+#
+# This software contains code licensed as described in LICENSE.
+#
+
+import unittest
+import numpy as np
+from scenario import ttc
+
+CAR = [0.0, 0.0, 1.0, 2.3]
+
+def dense_ttc(position, velocity, yaw, box, acceleration, i, j, horizon=5.0, samples=20001): # First overlapping sample of a pair
+    center, right, forward, half = ttc.oriented_boxes(position, yaw, box)
+    t = np.linspace(0.0, horizon, samples)[:, np.newaxis]
+    move = lambda k: center[k] + velocity[k] * t + 0.5 * acceleration[k] * t * t
+    hits = ttc.boxes_overlap(move(i), right[i], forward[i], half[i], move(j), right[j], forward[j], half[j])
+    return t[hits.argmax(), 0] if hits.any() else np.inf
+
+class TestTTC(unittest.TestCase):
+    def test_head_on(self): # Check that cars driving at each other collide when their gap closes
+        position = np.array([[0.0, 0.0], [0.0, 30.0], [10.0, 0.0]])
+        velocity = np.array([[0.0, 10.0], [0.0, -10.0], [0.0, 0.0]])
+        yaw = np.array([0.0, 180.0, 90.0])
+        i, j, result, distance = ttc.time_to_collision(position, velocity, yaw, np.tile(CAR, (3, 1)))
+        self.assertEqual((list(i), list(j)), ([0, 0, 1], [1, 2, 2]))
+        self.assertAlmostEqual(result[0], (30.0 - 4.6) / 20.0)
+        self.assertEqual(list(result[1:]), [np.inf, np.inf])
+        self.assertAlmostEqual(distance[0], 25.4)
+        self.assertAlmostEqual(distance[1], 10.0 - 1.0 - 2.3)
+
+    def test_crossing(self): # Check crossing paths that meet, pass behind each other and only graze a corner
+        position = np.array([[0.0, -20.0], [-20.0, 0.0]])
+        yaw = np.array([0.0, 90.0])
+        box = np.tile(CAR, (2, 1))
+        result = ttc.time_to_collision(position, np.array([[0.0, 10.0], [10.0, 0.0]]), yaw, box)[2]
+        self.assertAlmostEqual(result[0], (20.0 - 2.3 - 1.0) / 10.0)
+        result = ttc.time_to_collision(position, np.array([[0.0, 10.0], [5.0, 0.0]]), yaw, box)[2]
+        self.assertEqual(result[0], np.inf)
+        # the corner of a small box crosses the corner of the path of the car within one sample step
+        position = np.array([[0.0, -20.0], [-3.0, 2.6]])
+        box = np.array([CAR, [0.0, 0.0, 0.3, 0.3]])
+        velocity = np.array([[0.0, 10.0], [0.0, -10.0]])
+        result = ttc.time_to_collision(position, velocity, np.array([0.0, 0.0]), box, steps=4)[2]
+        self.assertEqual(result[0], np.inf)
+        position[1, 0] = -1.2
+        result = ttc.time_to_collision(position, velocity, np.array([0.0, 0.0]), box, steps=4)[2]
+        self.assertAlmostEqual(result[0], (22.6 - 2.3 - 0.3) / 20.0)
+
+    def test_constant_acceleration(self): # Check that an actor accelerating from rest hits the one waiting ahead
+        position = np.array([[0.0, 0.0], [0.0, 20.0]])
+        acceleration = np.array([[0.0, 0.0], [0.0, -2.0]])
+        yaw = np.array([0.0, 180.0])
+        result = ttc.time_to_collision(position, np.zeros((2, 2)), yaw, np.tile(CAR, (2, 1)), acceleration)[2]
+        self.assertAlmostEqual(result[0], np.sqrt(20.0 - 4.6), places=3)
+
+    def test_dense_sampling(self): # Check random scenes against dense sampling with both motion models
+        rng = np.random.default_rng(7)
+        n = 40
+        position = rng.uniform(-40.0, 40.0, (n, 2))
+        velocity = rng.normal(0.0, 10.0, (n, 2))
+        yaw = rng.uniform(0.0, 360.0, n)
+        box = np.tile(CAR, (n, 1))
+        box[::3] = [0.0, 0.0, 0.3, 0.3]
+        box[1::3, 1] = 0.5
+        for acceleration in (np.zeros((n, 2)), rng.normal(0.0, 3.0, (n, 2))):
+            i, j, result, _ = ttc.time_to_collision(position, velocity, yaw, box, acceleration)
+            dense = np.array([dense_ttc(position, velocity, yaw, box, acceleration, a, b) for a, b in zip(i, j)])
+            self.assertGreater(np.isfinite(dense).sum(), 20)
+            self.assertTrue(np.array_equal(np.isfinite(result), np.isfinite(dense)))
+            finite = np.isfinite(dense)
+            self.assertLess(np.abs(result[finite] - dense[finite]).max(), 5e-3)
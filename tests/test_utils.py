@@ -24,6 +24,18 @@ class TestUtils(unittest.TestCase): # Check that transform_to_matrix calculates
             for j in range(4):
                     self.assertAlmostEqual(matrix[i][j], expectedMatrix[i][j])
 
+    def test_transforms_to_matrices(self): # Check that batched matrices match transform_to_matrix
+        transforms = [lgsvl.Transform(lgsvl.Vector(1,2,3), lgsvl.Vector(4,5,6)), lgsvl.Transform(lgsvl.Vector(-7,0,2), lgsvl.Vector(0,270,-30))]
+        position = [[t.position.x, t.position.y, t.position.z] for t in transforms]
+        rotation = [[t.rotation.x, t.rotation.y, t.rotation.z] for t in transforms]
+        matrices = lgsvl.utils.transforms_to_matrices(position, rotation)
+        self.assertEqual(matrices.shape, (2, 4, 4))
+        for matrix, transform in zip(matrices, transforms):
+            expected = lgsvl.utils.transform_to_matrix(transform)
+            for i in range(4):
+                for j in range(4):
+                    self.assertAlmostEqual(matrix[i][j], expected[i][j])
+
     def test_matrix_multiply(self): # Check that matrix_multiply calculates the right values
         inputMatrix = lgsvl.utils.transform_to_matrix(lgsvl.Transform(lgsvl.Vector(1,2,3), lgsvl.Vector(4,5,6)))
         expectedMatrix = [[0.9656881042915112, 0.21236393599051254, -0.1494926216255657, 0.0], \